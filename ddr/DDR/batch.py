@@ -86,7 +86,7 @@ class Exporter():
             for n,json_path in enumerate(json_paths):
                 i = identifier.Identifier(json_path)
                 logging.info('%s/%s - %s' % (n+1, json_paths_len, i.id))
-                obj = object_class.from_identifier(i)
+                obj = object_class.from_identifier(i, lazy=True)
                 if obj:
                     writer.writerow(obj.dump_csv(headers=headers))
         
@@ -274,12 +274,9 @@ class Checker():
         metadata_paths = util.find_meta_files(
             collection_path,
             model=model,
-            recursive=True, force_read=True
+            recursive=True
         )
-        existing_ids = [
-            identifier.Identifier(path=path)
-            for path in metadata_paths
-        ]
+        existing_ids = set(identifier.parse_batch(metadata_paths)['id'])
         new_ids = [rowd['id'] for rowd in rowds]
         already = [i for i in new_ids if i in existing_ids]
         return already
@@ -510,7 +507,6 @@ class Importer():
         git_files = []
         updated = []
         elapsed_rounds = []
-        obj_metadata = None
         
         if dryrun:
             logging.info('Dry run - no modifications')
@@ -524,13 +520,11 @@ class Importer():
             if not entity:
                 entity = models.Entity.create(eidentifier.path_abs(), eidentifier)
             modified = entity.load_csv(rowd)
-            # Getting obj_metadata takes about 1sec each time
-            # TODO caching works as long as all objects have same metadata...
-            if not obj_metadata:
-                obj_metadata = models.object_metadata(
-                    eidentifier.fields_module(),
-                    repository.working_dir
-                )
+            # cached by models.object_metadata after the first call
+            obj_metadata = models.object_metadata(
+                eidentifier.fields_module(),
+                repository.working_dir
+            )
             
             if dryrun:
                 pass
@@ -653,7 +647,6 @@ class Importer():
         updated = []
         elapsed_rounds_updates = []
         staged = []
-        obj_metadata = None
         for n,rowd in enumerate(rowds_existing):
             logging.info('+ %s/%s - %s (%s)' % (n+1, len(rowds), rowd['id'], rowd['basename_orig']))
             start_round = datetime.now()
@@ -663,13 +656,11 @@ class Importer():
             entity = entities[eidentifier.id]
             file_ = fidentifier.object()
             modified = file_.load_csv(rowd)
-            # Getting obj_metadata takes about 1sec each time
-            # TODO caching works as long as all objects have same metadata...
-            if not obj_metadata:
-                obj_metadata = models.object_metadata(
-                    fidentifier.fields_module(),
-                    repository.working_dir
-                )
+            # cached by models.object_metadata after the first call
+            obj_metadata = models.object_metadata(
+                fidentifier.fields_module(),
+                repository.working_dir
+            )
             
             if dryrun:
                 pass
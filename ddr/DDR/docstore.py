@@ -1,5 +1,6 @@
 """
-TODO pass ES connection object to docstore.* instead of HOSTS,INDEX
+NOTE: docstore.* functions accept either HOSTS or an Elasticsearch client.
+Clients are shared per HOSTS; see _get_connection().
 
 example walkthrough:
 ------------------------------------------------------------------------
@@ -36,21 +37,53 @@ docstore.index(HOSTS, INDEX, PATH, recursive=True, public=True )
 ------------------------------------------------------------------------
 """
 from __future__ import print_function
+from collections import OrderedDict
+from copy import deepcopy
 from datetime import datetime
+from functools import partial
+import hashlib
+from itertools import islice
 import json
 import logging
 logger = logging.getLogger(__name__)
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import os
+import threading
+import time
 
 from elasticsearch import Elasticsearch, TransportError
 
 from DDR import config
+from DDR import dvcs
 from DDR.identifier import Identifier, MODULES
 from DDR import util
 
 MAX_SIZE = 1000000
 DEFAULT_PAGE_SIZE = 20
 
+# Limits for batches sent to the _bulk API
+BULK_MAX_DOCS = 500
+BULK_MAX_BYTES = 5 * 1024 * 1024
+
+# Number of paths handed to each index() worker process at a time
+INDEX_WORKER_CHUNKSIZE = 50
+
+# Number of file documents index() holds in memory before posting them
+INDEX_BATCH_SIZE = 1000
+
+# Commit last indexed for each collection, keyed by index name.
+# Kept in a separate index so watermarks don't turn up in searches.
+WATERMARK_INDEX = 'ddr-watermarks'
+WATERMARK_DOCTYPE = 'watermark'
+
+# Hits per request and scroll context lifetime for search_pages/search_iter
+SCROLL_PAGE_SIZE = 500
+SCROLL_KEEPALIVE = '1m'
+
+# Each document carries a hash of its own contents; see index(skip_unchanged)
+CONTENT_HASH_FIELD = 'content_hash'
+
 SUCCESS_STATUSES = [200, 201]
 STATUS_OK = ['completed']
 PUBLIC_OK = [1,'1']
@@ -74,8 +107,92 @@ results = elasticsearch.facet_terms(settings.ELASTICSEARCH_HOST_PORT,
 """
 
 
+# Elasticsearch clients, shared by all docstore functions in the process.
+# Each client keeps a pool of keep-alive connections to each host.
+# Use configure_connections() to change these settings.
+CONNECTION_SETTINGS = {
+    'timeout': 10,      # seconds per request
+    'max_retries': 3,   # retries on another node before giving up
+    'maxsize': 10,      # keep-alive connections per host
+}
+_CONNECTIONS = {}
+_CONNECTIONS_LOCK = threading.Lock()
+
+# facet_terms() results are cached in-process and optionally on disk.
+# Cached terms are tagged with the index's generation number, which
+# goes up whenever the index (or an alias to it) is written to.
+# Without a shared cache path other processes' writes cannot be seen,
+# so in-memory terms expire after FACET_CACHE_TTL seconds.
+# See configure_facet_cache and invalidate_facets.
+FACET_CACHE_SIZE = 256
+FACET_CACHE_TTL = 300
+FACET_GENERATION_FILE = 'GENERATION'
+_FACET_CACHE = util.LRUCache(FACET_CACHE_SIZE)
+_FACET_CACHE_SETTINGS = {'path': None, 'ttl': FACET_CACHE_TTL}
+_FACET_GENERATIONS = {}
+_FACET_LOCK = threading.Lock()
+# (index,alias) pairs per hosts; dropped when aliases change.
+_ALIAS_MAPS = {}
+
+def _hosts_key( hosts ):
+    """Hashable version of a hosts list, for looking up clients.
+    
+    >>> _hosts_key([{'host':'127.0.0.1', 'port':9200}])
+    (('host', '127.0.0.1'), ('port', '9200'))
+    
+    @param hosts: list of dicts containing host information.
+    @returns: tuple
+    """
+    if isinstance(hosts, basestring):
+        hosts = [hosts]
+    key = []
+    for host in hosts:
+        if isinstance(host, dict):
+            key.append(tuple(sorted([(k,str(v)) for k,v in host.iteritems()])))
+        else:
+            key.append(str(host))
+    return tuple(sorted(key))
+
+def configure_connections( **kwargs ):
+    """Change settings for Elasticsearch clients; existing clients are dropped.
+    
+    >>> docstore.configure_connections(timeout=30, max_retries=5, maxsize=25)
+    
+    @param timeout: int Seconds per request.
+    @param max_retries: int Retries before an exception is raised.
+    @param maxsize: int Number of keep-alive connections kept per host.
+    """
+    with _CONNECTIONS_LOCK:
+        CONNECTION_SETTINGS.update(kwargs)
+        _CONNECTIONS.clear()
+
+def set_connection( hosts, es ):
+    """Register an existing Elasticsearch client for the specified hosts.
+    
+    All docstore functions called with these hosts will use this client.
+    You can also pass an Elasticsearch client instead of hosts to any
+    docstore function.
+    
+    @param hosts: list of dicts containing host information.
+    @param es: Elasticsearch
+    """
+    with _CONNECTIONS_LOCK:
+        _CONNECTIONS[_hosts_key(hosts)] = es
+
 def _get_connection( hosts ):
-    es = Elasticsearch(hosts)
+    """Returns the shared Elasticsearch client for hosts, creating if necessary.
+    
+    @param hosts: list of dicts containing host information, or an Elasticsearch client.
+    @returns: Elasticsearch
+    """
+    if isinstance(hosts, Elasticsearch):
+        return hosts
+    key = _hosts_key(hosts)
+    with _CONNECTIONS_LOCK:
+        es = _CONNECTIONS.get(key, None)
+        if not es:
+            es = Elasticsearch(hosts, **CONNECTION_SETTINGS)
+            _CONNECTIONS[key] = es
     return es
 
 def make_index_name( text ):
@@ -175,6 +292,8 @@ def set_alias( hosts, alias, index, remove=False, create=True ):
     if not remove:
         # set the alias
         es.indices.put_alias(index=index, name=alias, body='')
+    _forget_alias_map(hosts)
+    invalidate_facets(hosts, alias)
 
 def target_index( hosts, alias ):
     """Get the name of the index to which the alias points
@@ -235,7 +354,10 @@ def delete_index( hosts, index ):
     logger.debug('_delete_index(%s, %s)' % (hosts, index))
     es = _get_connection(hosts)
     if index_exists( hosts, index ):
+        # look up aliases before they disappear with the index
+        invalidate_facets(hosts, index)
         status = es.indices.delete(index=index)
+        _forget_alias_map(hosts)
         return status
     return '{"status":500, "message":"Index does not exist"}'
 
@@ -276,12 +398,14 @@ def _make_mappings( mappings ):
     @return: List of mappings dicts.
     """
     ID_PROPERTIES = {'type':'string', 'index':'not_analyzed', 'store':True}
+    HASH_PROPERTIES = {'type':'string', 'index':'not_analyzed'}
     for mapping in mappings['documents']:
         model = mapping.keys()[0]
         module = MODULES[model]
         for field in module.FIELDS:
             fname = field['name']
             mapping[model]['properties'][fname] = field['elasticsearch']['properties']
+        mapping[model]['properties'][CONTENT_HASH_FIELD] = HASH_PROPERTIES
         # mappings for parent_id, etc
         if model == 'collection':
             mapping[model]['properties']['parent_id'] = ID_PROPERTIES
@@ -356,7 +480,158 @@ def list_facets( path=config.FACETS_PATH ):
             facets.append(fn)
     return facets
 
-def facet_terms( hosts, index, facet, order='term', all_terms=True, model=None ):
+def configure_facet_cache( size=FACET_CACHE_SIZE, path=None, ttl=FACET_CACHE_TTL ):
+    """Resize and empty the facet_terms cache; optionally keep it on disk.
+    
+    If path is set, terms are also written as JSON under path/INDEX/ so
+    they survive restarts and are shared between processes.  The
+    generation number is then kept in path/INDEX/GENERATION, which is
+    how a ddr-index run in one process invalidates the caches of the
+    processes serving the public site.
+    Without a path, terms expire after ttl seconds.
+    
+    @param size: int Maximum number of facets kept in memory; 0 disables.
+    @param path: str Absolute path to cache directory (optional).
+    @param ttl: int Seconds in-memory terms are kept if no path.
+    """
+    global _FACET_CACHE
+    with _FACET_LOCK:
+        _FACET_CACHE = util.LRUCache(size)
+        _FACET_CACHE_SETTINGS['path'] = path
+        _FACET_CACHE_SETTINGS['ttl'] = ttl
+        _FACET_GENERATIONS.clear()
+
+def _facet_generation( index ):
+    """Current generation number of index's facet_terms cache.
+    """
+    cache_dir = _FACET_CACHE_SETTINGS['path']
+    if cache_dir:
+        try:
+            with open(os.path.join(cache_dir, index, FACET_GENERATION_FILE), 'r') as f:
+                return int(f.read().strip())
+        except (IOError, ValueError):
+            return 0
+    return _FACET_GENERATIONS.get(index, 0)
+
+def _write_atomic( path, text ):
+    """Write text to a temp file and rename it into place.
+    """
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # another process got there first
+            pass
+    tmp = '%s.%s.%s' % (path, os.getpid(), threading.current_thread().ident)
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.rename(tmp, path)
+
+def _alias_map( hosts ):
+    """(index,alias) pairs for hosts, looked up once and remembered.
+    
+    @param hosts: list of dicts containing host information.
+    @returns: list of (index,alias) tuples
+    """
+    key = _hosts_key(hosts)
+    if key not in _ALIAS_MAPS:
+        _ALIAS_MAPS[key] = aliases(hosts)
+    return _ALIAS_MAPS[key]
+
+def _forget_alias_map( hosts ):
+    _ALIAS_MAPS.pop(_hosts_key(hosts), None)
+
+def _facet_names( pairs, name ):
+    """Names whose facet caches a write to name affects.
+    
+    >>> _facet_names([('ddr-1','ddr'), ('ddr-1','public')], 'ddr')
+    ['ddr', 'ddr-1', 'public']
+    
+    @param pairs: list of (index,alias) tuples
+    @param name: Name of an index or alias.
+    @returns: list
+    """
+    # the index itself, or the indices an alias points to
+    indices = set([name] + [i for i,a in pairs if a == name])
+    names = set(indices)
+    names.update([a for i,a in pairs if i in indices])
+    return sorted(names)
+
+def invalidate_facets( hosts, index ):
+    """Forget cached facet_terms for index and its aliases, or for an
+    alias and the indices it points to (and their other aliases).
+    
+    Called by functions that write to an index.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index or alias.
+    """
+    try:
+        names = _facet_names(_alias_map(hosts), index)
+    except Exception:
+        # no server: nothing worth caching either
+        names = [index]
+    cache_dir = _FACET_CACHE_SETTINGS['path']
+    with _FACET_LOCK:
+        for name in names:
+            generation = _facet_generation(name) + 1
+            _FACET_GENERATIONS[name] = generation
+            if cache_dir:
+                _write_atomic(
+                    os.path.join(cache_dir, name, FACET_GENERATION_FILE),
+                    str(generation)
+                )
+
+def _facet_cache_path( key ):
+    index,facet,model,order,all_terms = key
+    filename = '%s-%s-%s-%s.json' % (facet, model or 'all', order, int(bool(all_terms)))
+    return os.path.join(_FACET_CACHE_SETTINGS['path'], index, filename)
+
+def _get_cached_facet( key, generation ):
+    """Get cached facet_terms output if from the current generation.
+    
+    Returns a copy so callers can't change what later callers get.
+    
+    @param key: tuple (index, facet, model, order, all_terms)
+    @param generation: int Output of _facet_generation
+    @returns: dict or None
+    """
+    cached = _FACET_CACHE.get(key)
+    if cached and (cached[0] == generation):
+        generation,results,stored = cached
+        if _FACET_CACHE_SETTINGS['path'] \
+        or (time.time() - stored < _FACET_CACHE_SETTINGS['ttl']):
+            return deepcopy(results)
+        return None
+    if _FACET_CACHE_SETTINGS['path']:
+        try:
+            with open(_facet_cache_path(key), 'r') as f:
+                data = json.loads(f.read())
+        except (IOError, ValueError):
+            return None
+        if data.get('generation') == generation:
+            _FACET_CACHE.set(key, (generation, data['results'], time.time()))
+            return deepcopy(data['results'])
+    return None
+
+def _set_cached_facet( key, generation, results ):
+    _FACET_CACHE.set(key, (generation, deepcopy(results), time.time()))
+    if _FACET_CACHE_SETTINGS['path']:
+        try:
+            _write_atomic(
+                _facet_cache_path(key),
+                json.dumps({'generation': generation, 'results': results})
+            )
+        except (IOError, OSError) as err:
+            logger.error('Could not write facet cache: %s' % err)
+
+def facet_cache_stats():
+    """Hits, misses, and size of the in-process facet_terms cache.
+    """
+    return _FACET_CACHE.stats()
+
+def facet_terms( hosts, index, facet, order='term', all_terms=True, model=None, cache=True ):
     """Gets list of terms for the facet.
     
     $ curl -XGET 'http://192.168.56.101:9200/ddr/entity/_search?format=yaml' -d '{
@@ -396,8 +671,15 @@ def facet_terms( hosts, index, facet, order='term', all_terms=True, model=None )
     @param facet: Name of field
     @param order: term, count, reverse_term, reverse_count
     @param model: (optional) Type of object ('collection', 'entity', 'file')
+    @param cache: boolean Use the facet cache (see configure_facet_cache).
     @returns raw output of facet query
     """
+    key = (index, facet, model, order, all_terms)
+    if cache:
+        generation = _facet_generation(index)
+        cached = _get_cached_facet(key, generation)
+        if cached is not None:
+            return cached
     payload = {
         "fields": ["id"],
         "query": { "match_all": {} },
@@ -414,6 +696,8 @@ def facet_terms( hosts, index, facet, order='term', all_terms=True, model=None )
     }
     es = _get_connection(hosts)
     results = es.search(index=index, doc_type=model, body=payload)
+    if cache:
+        _set_cached_facet(key, generation, results['facets']['results'])
     return results['facets']['results']
 
 def repo( hosts, index, path ):
@@ -722,16 +1006,38 @@ def post( hosts, index, document, public_fields=[], additional_fields={}, privat
     """
     logger.debug('post(%s, %s, %s, %s, %s, %s)' % (hosts, index, document, public_fields, additional_fields, private_ok))
     
-    document_id = None
-    for field in document:
-        for k,v in field.iteritems():
-            if k == 'id':
-                document_id = v
-    identifier = Identifier(document_id)
-    
     # die if document is public=False or status=incomplete
     if (not _is_publishable(document)) and (not private_ok):
         return {'status':403, 'response':'object not publishable'}
+    identifier,data = _make_document(document, public_fields, additional_fields)
+    data[CONTENT_HASH_FIELD] = _content_hash(data)
+    
+    if identifier.id:
+        es = _get_connection(hosts)
+        result = es.index(index=index, doc_type=identifier.model, id=identifier.id, body=data)
+        invalidate_facets(hosts, index)
+        return result
+    return {'status':4, 'response':'unknown problem'}
+
+def _make_document( document, public_fields=[], additional_fields={}, identifier=None ):
+    """Filter, clean, and restructure a DDR document for ElasticSearch.
+    
+    Used by post() and by the indexer.
+    
+    @param document: Standard DDR list-of-dicts data structure.
+    @param public_fields: List of field names; if present, fields not in list will be removed.
+    @param additional_fields: dict of fields added during indexing process
+    @param identifier: Identifier (optional) Skips parsing the document's id.
+    @returns: Identifier,dict
+    """
+    if not identifier:
+        document_id = None
+        for field in document:
+            for k,v in field.iteritems():
+                if k == 'id':
+                    document_id = v
+        identifier = Identifier(document_id)
+    
     # remove non-public fields
     _filter_payload(document, public_fields)
     # normalize field contents
@@ -762,11 +1068,115 @@ def post( hosts, index, document, public_fields=[], additional_fields={}, privat
     for key,val in additional_fields.iteritems():
         data[key] = val
     logger.debug('identifier.id %s' % identifier.id)
+    return identifier,data
+
+def _bulk_batches( actions, max_docs=BULK_MAX_DOCS, max_bytes=BULK_MAX_BYTES ):
+    """Groups bulk actions into batches no larger than max_docs/max_bytes.
     
-    if identifier.id:
-        es = _get_connection(hosts)
-        return es.index(index=index, doc_type=identifier.model, id=identifier.id, body=data)
-    return {'status':4, 'response':'unknown problem'}
+    Each action is a (path, model, document_id, data) tuple.
+    A document that is larger than max_bytes by itself is sent alone.
+    
+    >>> actions = [('/a.json','entity','ddr-test-123-1',{'title':'a'}), ...]
+    >>> for batch in _bulk_batches(actions, max_docs=2):
+    ...     print([path for path,lines in batch])
+    ['/a.json', '/b.json']
+    ['/c.json']
+    
+    @param actions: Iterable of (path, model, document_id, data) tuples.
+    @param max_docs: int Maximum number of documents per batch.
+    @param max_bytes: int Maximum size of batch body in bytes.
+    @returns: generator yielding lists of (path, body_lines) tuples
+    """
+    batch = []
+    batch_bytes = 0
+    for path,model,document_id,data in actions:
+        header = json.dumps({'index': {'_type':model, '_id':document_id}})
+        body = json.dumps(data)
+        size = len(header) + len(body) + 2
+        if batch and ((len(batch) >= max_docs) or (batch_bytes + size > max_bytes)):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append( (path, [header, body]) )
+        batch_bytes += size
+    if batch:
+        yield batch
+
+def _parse_bulk_response( batch, response ):
+    """Matches items in an ES _bulk response to the paths that produced them.
+    
+    >>> batch = [('/a.json', [...]), ('/b.json', [...])]
+    >>> response = {'errors': True, 'items': [
+    ...     {'index': {'_id': 'a', 'status': 201}},
+    ...     {'index': {'_id': 'b', 'status': 400, 'error': 'MapperParsingException'}},
+    ... ]}
+    >>> _parse_bulk_response(batch, response)
+    (1, [('/b.json', 400, 'MapperParsingException')])
+    
+    @param batch: list of (path, body_lines) tuples
+    @param response: dict Raw output of es.bulk
+    @returns: successful,bad_paths
+    """
+    successful = 0
+    bad_paths = []
+    items = response.get('items', [])
+    for n,(path,lines) in enumerate(batch):
+        if n < len(items):
+            result = items[n].values()[0]
+        else:
+            result = {'status': 500, 'error': 'missing from bulk response'}
+        status = result.get('status', None)
+        if result.get('error', None) or (status not in SUCCESS_STATUSES):
+            bad_paths.append((path, status, str(result.get('error', ''))))
+        else:
+            successful += 1
+    return successful,bad_paths
+
+def post_bulk( hosts, index, actions, max_docs=BULK_MAX_DOCS, max_bytes=BULK_MAX_BYTES ):
+    """Add or update many prepared documents using the ES _bulk API.
+    
+    Documents must already be filtered/cleaned (see _make_document).
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param actions: Iterable of (path, model, document_id, data) tuples.
+    @param max_docs: int Maximum number of documents per request.
+    @param max_bytes: int Maximum size of request body in bytes.
+    @returns: successful,bad_paths
+    """
+    logger.debug('post_bulk(%s, %s, %s, %s)' % (hosts, index, max_docs, max_bytes))
+    successful = 0
+    bad_paths = []
+    for batch in _bulk_batches(actions, max_docs, max_bytes):
+        s,b = _post_bulk_batch(hosts, index, batch)
+        successful += s
+        bad_paths.extend(b)
+    invalidate_facets(hosts, index)
+    return successful,bad_paths
+
+def _post_bulk_batch( hosts, index, batch ):
+    """Send one batch from _bulk_batches to the ES _bulk API.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param batch: list of (path, body_lines) tuples
+    @returns: successful,bad_paths
+    """
+    lines = []
+    for path,pathlines in batch:
+        lines.extend(pathlines)
+    body = '\n'.join(lines) + '\n'
+    es = _get_connection(hosts)
+    try:
+        response = es.bulk(index=index, body=body)
+    except TransportError as err:
+        response = {
+            'items': [
+                {'index': {'status': err.status_code, 'error': err.error}}
+                for path,pathlines in batch
+            ]
+        }
+    return _parse_bulk_response(batch, response)
 
 def post_json( hosts, index, doc_type, document_id, path ):
     """POST the specified JSON document as-is.
@@ -782,7 +1192,9 @@ def post_json( hosts, index, doc_type, document_id, path ):
     with open(path, 'r') as f:
         json_text = f.read()
     es = _get_connection(hosts)
-    return es.index(index=index, doc_type=doc_type, id=document_id, body=json_text)
+    result = es.index(index=index, doc_type=doc_type, id=document_id, body=json_text)
+    invalidate_facets(hosts, index)
+    return result
 
 def exists( hosts, index, model, document_id ):
     """
@@ -912,11 +1324,6 @@ def massage_query_results( results, thispage, page_size ):
     @param page_size: Number of objects per page
     @returns: list of hit dicts, with empty "hits" fore and aft of current page
     """
-    def unlistify(o, fieldname):
-        if o.get(fieldname, None):
-            if isinstance(o[fieldname], list):
-                o[fieldname] = o[fieldname][0]
-    
     objects = []
     if results and results['hits']:
         total = results['hits']['total']
@@ -927,22 +1334,124 @@ def massage_query_results( results, thispage, page_size ):
                  'id': hit['_id'],
                  'placeholder': True}
             if (n >= bottom) and (n < top):
-                # if we tell ES to only return certain fields, the object is in 'fields'
-                if hit.get('fields', None):
-                    o = hit['fields']
-                elif hit.get('_source', None):
-                    o = hit['_source']
-                # copy ES results info to individual object source
-                o['index'] = hit['_index']
-                o['type'] = hit['_type']
-                o['model'] = hit['_type']
-                o['id'] = hit['_id']
-                # ElasticSearch wraps field values in lists when you use a 'fields' array in a query
-                for fieldname in all_list_fields():
-                    unlistify(o, fieldname)
+                o = _massage_hit(hit)
             objects.append(o)
     return objects
 
+def _massage_hit( hit, list_fields=None ):
+    """Makes facsimile of original object from an ElasticSearch hit.
+    
+    @param hit: dict One item from results['hits']['hits']
+    @param list_fields: list Output of all_list_fields() (optional)
+    @returns: dict
+    """
+    def unlistify(o, fieldname):
+        if o.get(fieldname, None):
+            if isinstance(o[fieldname], list):
+                o[fieldname] = o[fieldname][0]
+    
+    if list_fields is None:
+        list_fields = all_list_fields()
+    o = {}
+    # if we tell ES to only return certain fields, the object is in 'fields'
+    if hit.get('fields', None):
+        o = hit['fields']
+    elif hit.get('_source', None):
+        o = hit['_source']
+    # copy ES results info to individual object source
+    o['index'] = hit['_index']
+    o['type'] = hit['_type']
+    o['model'] = hit['_type']
+    o['id'] = hit['_id']
+    # ElasticSearch wraps field values in lists when you use a 'fields' array in a query
+    for fieldname in list_fields:
+        unlistify(o, fieldname)
+    return o
+
+def massage_page( pages, thispage, page_size ):
+    """Like massage_query_results but only materializes the requested page.
+    
+    Consumes pages (e.g. from search_pages) only until the requested page
+    is complete; hits before it are counted and thrown away, hits after
+    it are never fetched.  No placeholders are made.
+    
+    @param pages: Iterable of ElasticSearch result sets (see search_pages).
+    @param thispage: Value of GET['page'] or 1
+    @param page_size: Number of objects per page
+    @returns: total,list of hit dicts for the current page
+    """
+    total = 0
+    objects = []
+    list_fields = all_list_fields()
+    n = 0
+    bottom = top = None
+    for results in pages:
+        if bottom is None:
+            total = results['hits']['total']
+            if not total:
+                break
+            bottom,top,num_pages = _page_bottom_top(total, thispage, page_size)
+        hits = results['hits']['hits']
+        for hit in hits[max(bottom - n, 0):max(top - n, 0)]:
+            objects.append(_massage_hit(hit, list_fields))
+        n += len(hits)
+        if n >= top:
+            break
+    return total,objects
+
+class QueryPage(object):
+    """Sequence the length of a whole result set holding only one page of objects.
+    
+    Django's Paginator only needs len() and a slice for the current page.
+    Objects outside the current page are placeholder dicts made on demand,
+    as in massage_query_results, so nothing but the current page is ever
+    fetched or kept in memory.
+    """
+    
+    def __init__( self, objects, total, bottom ):
+        """
+        @param objects: list Hit dicts for the current page
+        @param total: int Number of hits in the whole result set
+        @param bottom: int Index of the first object on the current page
+        """
+        self.objects = objects
+        self.total = total
+        self.bottom = bottom
+    
+    def __len__( self ):
+        return self.total
+    
+    def __getitem__( self, key ):
+        if isinstance(key, slice):
+            return [self[n] for n in range(*key.indices(self.total))]
+        if key < 0:
+            key += self.total
+        if (key < 0) or (key >= self.total):
+            raise IndexError('QueryPage index out of range')
+        n = key - self.bottom
+        if (n >= 0) and (n < len(self.objects)):
+            return self.objects[n]
+        return {'n':key, 'id':None, 'placeholder':True}
+
+def massage_query_page( results, thispage, page_size ):
+    """Like massage_query_results, for results containing only the current page.
+    
+    @param results: ElasticSearch result set from search_page()
+    @param thispage: Value of GET['page'] or 1
+    @param page_size: Number of objects per page
+    @returns: QueryPage
+    """
+    total = 0
+    objects = []
+    if results and results['hits']:
+        total = results['hits']['total']
+    if not total:
+        return QueryPage([], 0, 0)
+    bottom,top,num_pages = _page_bottom_top(total, thispage, page_size)
+    list_fields = all_list_fields()
+    objects = [_massage_hit(hit, list_fields) for hit in results['hits']['hits']]
+    return QueryPage(objects, total, bottom)
+
 def _clean_sort( sort ):
     """Take list of [a,b] lists, return comma-separated list of a:b pairs
     
@@ -958,9 +1467,36 @@ def _clean_sort( sort ):
             cleaned = ','.join([':'.join(x) for x in sort])
     return cleaned
 
+def _search_params( model='', query='', term={}, filters={}, sort=[], fields=[] ):
+    """Arguments for Elasticsearch.search common to search() and search_pages().
+    
+    @returns: dict
+    """
+    _clean_dict(filters)
+    _clean_dict(sort)
+    body = {}
+    if term:
+        body['query'] = {}
+        body['query']['term'] = term
+    if filters:
+        body['filter'] = {'term':filters}
+    logger.debug(json.dumps(body))
+    params = {
+        'doc_type': model,
+        'body': body,
+        'sort': _clean_sort(sort),
+        '_source_include': ','.join(fields),
+    }
+    if query:
+        params['q'] = query
+    return params
+
 def search( hosts, index, model='', query='', term={}, filters={}, sort=[], fields=[], first=0, size=MAX_SIZE ):
     """Run a query, get a list of zero or more hits.
     
+    NOTE: size defaults to MAX_SIZE, returning the entire result set in
+    one response.  Use search_pages or search_iter for large result sets.
+    
     @param hosts: list of dicts containing host information.
     @param index: Name of the target index.
     @param model: Type of object ('collection', 'entity', 'file')
@@ -974,39 +1510,97 @@ def search( hosts, index, model='', query='', term={}, filters={}, sort=[], fiel
     @returns raw ElasticSearch query output
     """
     logger.debug('search( hosts=%s, index=%s, model=%s, query=%s, term=%s, filters=%s, sort=%s, fields=%s, first=%s, size=%s' % (hosts, index, model, query, term, filters, sort, fields, first, size))
-    _clean_dict(filters)
-    _clean_dict(sort)
-    body = {}
-    if term:
-        body['query'] = {}
-        body['query']['term'] = term
-    if filters:
-        body['filter'] = {'term':filters}
-    logger.debug(json.dumps(body))
-    sort_cleaned = _clean_sort(sort)
-    fields = ','.join(fields)
+    params = _search_params(model, query, term, filters, sort, fields)
     es = _get_connection(hosts)
-    if query:
-        results = es.search(
-            index=index,
-            doc_type=model,
-            q=query,
-            body=body,
-            sort=sort_cleaned,
-            size=size,
-            _source_include=fields,
-        )
-    else:
-        results = es.search(
-            index=index,
-            doc_type=model,
-            body=body,
-            sort=sort_cleaned,
-            size=size,
-            _source_include=fields,
-        )
+    results = es.search(
+        index=index,
+        from_=first,
+        size=size,
+        **params
+    )
     return results
 
+def search_page( hosts, index, thispage=1, page_size=DEFAULT_PAGE_SIZE, model='', query='', term={}, filters={}, sort=[], fields=[] ):
+    """Run a query, get only the hits for the current page.
+    
+    ElasticSearch does the paging (from/size) so the cost of a page view
+    does not depend on the size of the result set.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param thispage: Value of GET['page'] or 1
+    @param page_size: Number of objects per page
+    @param model: Type of object ('collection', 'entity', 'file')
+    @param query: User's search text
+    @param term: dict
+    @param filters: dict
+    @param sort: list of (fieldname,direction) tuples
+    @param fields: list of field names to return
+    @returns: QueryPage
+    """
+    # number of pages is not known until ES responds; massage_query_page checks it
+    number = _validate_number(thispage, MAX_SIZE)
+    results = search(
+        hosts, index, model=model, query=query, term=term, filters=filters,
+        sort=sort, fields=fields, first=(number - 1) * page_size, size=page_size
+    )
+    return massage_query_page(results, number, page_size)
+
+def search_pages( hosts, index, model='', query='', term={}, filters={}, sort=[], fields=[], page_size=SCROLL_PAGE_SIZE, keepalive=SCROLL_KEEPALIVE ):
+    """Run a query, yield result sets of at most page_size hits using scroll.
+    
+    Each result set has the same format as search() output, including
+    hits.total.  The scroll context is cleared when the generator is
+    exhausted or closed, so it is safe to stop iterating early.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param model: Type of object ('collection', 'entity', 'file')
+    @param query: User's search text
+    @param term: dict
+    @param filters: dict
+    @param sort: list of (fieldname,direction) tuples
+    @param fields: list of field names to return
+    @param page_size: int Number of hits per request.
+    @param keepalive: str How long ES keeps the scroll context between requests.
+    @returns: generator yielding raw ElasticSearch query output
+    """
+    logger.debug('search_pages( hosts=%s, index=%s, model=%s, query=%s, term=%s, filters=%s, sort=%s, fields=%s, page_size=%s' % (hosts, index, model, query, term, filters, sort, fields, page_size))
+    params = _search_params(model, query, term, filters, sort, fields)
+    es = _get_connection(hosts)
+    results = es.search(
+        index=index,
+        size=page_size,
+        scroll=keepalive,
+        **params
+    )
+    scroll_id = results.get('_scroll_id')
+    try:
+        while results['hits']['hits']:
+            yield results
+            if not scroll_id:
+                break
+            results = es.scroll(scroll_id=scroll_id, scroll=keepalive)
+            scroll_id = results.get('_scroll_id', scroll_id)
+    finally:
+        if scroll_id:
+            try:
+                es.clear_scroll(scroll_id=scroll_id)
+            except TransportError:
+                # context will expire on its own after keepalive
+                pass
+
+def search_iter( hosts, index, model='', query='', term={}, filters={}, sort=[], fields=[], page_size=SCROLL_PAGE_SIZE, keepalive=SCROLL_KEEPALIVE ):
+    """Run a query, yield hits one at a time without loading the whole result set.
+    
+    See search_pages.
+    
+    @returns: generator yielding hit dicts
+    """
+    for results in search_pages(hosts, index, model, query, term, filters, sort, fields, page_size, keepalive):
+        for hit in results['hits']['hits']:
+            yield hit
+
 def delete( hosts, index, document_id, recursive=False ):
     """Delete a document and optionally its children.
     
@@ -1017,20 +1611,23 @@ def delete( hosts, index, document_id, recursive=False ):
     """
     identifier = Identifier(id=document_id)
     es = _get_connection(hosts)
+    result = None
     if recursive:
         if identifier.model == 'collection': doc_type = 'collection,entity,file'
         elif identifier.model == 'entity': doc_type = 'entity,file'
         elif identifier.model == 'file': doc_type = 'file'
         query = 'id:"%s"' % identifier.id
         try:
-            return es.delete_by_query(index=index, doc_type=doc_type, q=query)
+            result = es.delete_by_query(index=index, doc_type=doc_type, q=query)
         except TransportError:
             pass
     else:
         try:
-            return es.delete(index=index, doc_type=identifier.model, id=identifier.id)
+            result = es.delete(index=index, doc_type=identifier.model, id=identifier.id)
         except TransportError:
             pass
+    invalidate_facets(hosts, index)
+    return result
 
 
 # index ----------------------------------------------------------------
@@ -1103,6 +1700,31 @@ def _file_parent_ids(identifier):
         return [identifier.collection_id()]
     return []
 
+# Metadata files that are not list-of-fields documents; see repo(), org().
+BASE_RECORD_FILES = ['repository.json', 'organization.json']
+
+def _is_container( path ):
+    """Indicates whether path is a collection or entity JSON file.
+    """
+    return os.path.basename(path) in ['collection.json', 'entity.json']
+
+def _unpublishable_parents( parent_ids, parents ):
+    """Lists the parents that are incomplete or nonpublic.
+    
+    @param parent_ids: list Output of _file_parent_ids().
+    @param parents: dict Output of _parents_status().
+    @returns: list of parent IDs
+    """
+    # TODO Bad! Bad! Generalize this...
+    unpublishable = []
+    for parent_id in parent_ids:
+        parent = parents.get(parent_id, {})
+        for x in parent.itervalues():
+            if (x not in STATUS_OK) and (x not in PUBLIC_OK):
+                if parent_id not in unpublishable:
+                    unpublishable.append(parent_id)
+    return unpublishable
+
 def _publishable_or_not( paths, parents ):
     """Determines which paths represent publishable paths and which do not.
     
@@ -1115,15 +1737,7 @@ def _publishable_or_not( paths, parents ):
     for path in paths:
         identifier = Identifier(path=path)
         # see if item's parents are incomplete or nonpublic
-        # TODO Bad! Bad! Generalize this...
-        UNPUBLISHABLE = []
-        parent_ids = _file_parent_ids(identifier)
-        for parent_id in parent_ids:
-            parent = parents.get(parent_id, {})
-            for x in parent.itervalues():
-                if (x not in STATUS_OK) and (x not in PUBLIC_OK):
-                    if parent_id not in UNPUBLISHABLE:
-                        UNPUBLISHABLE.append(parent_id)
+        UNPUBLISHABLE = _unpublishable_parents(_file_parent_ids(identifier), parents)
         if UNPUBLISHABLE:
             response = 'parent unpublishable: %s' % UNPUBLISHABLE
             bad_paths.append((path,403,response))
@@ -1134,68 +1748,169 @@ def _publishable_or_not( paths, parents ):
                 logger.error('missing information!: %s' % path)
     return successful_paths,bad_paths
 
-def _has_access_file( identifier ):
+def _has_access_file( identifier, listing=None ):
     """Determines whether the path has a corresponding access file.
     
-    @param path: Absolute or relative path to JSON file.
-    @param suffix: Suffix that is applied to File ID to get access file.
+    @param identifier: Identifier of a File.
+    @param listing: set (optional) Names in the file's directory (see _dir_listing).
     @returns: True,False
     """
     access_abs = identifier.path_abs('access')
+    if listing is not None:
+        return os.path.basename(access_abs) in listing
     if os.path.exists(access_abs) or os.path.islink(access_abs):
         return True
     return False
 
-def _store_signature_file( signatures, identifier, master_substitute ):
-    """Store signature file for collection,entity if it is "earlier" than current one.
-    
-    IMPORTANT: remember to change 'zzzzzz' back to 'master'
-    """
-    if _has_access_file(identifier):
-        # replace 'master' with something so mezzanine wins in sort
-        thumbfile_mezzfirst = identifier.id.replace('master', master_substitute)
-        # # nifty little bit of code that extracts the sort field from file.json
-        # import re
-        # sort = ''
-        # with open(path, 'r') as f:
-        #     for line in f.readlines():
-        #         if '"sort":' in line:
-        #             sort = re.findall('\d+', line)[0]
-        
-        # if this entity_id is "earlier" than the existing one, add it
-        def _store( signatures, object_id, file_id ):
-            if signatures.get(object_id,None):
-                filenames = [signatures[object_id], file_id]
-                first = util.natural_sort(filenames)[0]
-                if file_id == first:
-                    signatures[object_id] = file_id
-            else:
-                signatures[object_id] = file_id
-        
-        _store(signatures, identifier.collection_id(), thumbfile_mezzfirst)
-        _store(signatures, identifier.parent_id(), thumbfile_mezzfirst)
+def _dir_listing( dirname ):
+    """Names of everything in dirname, for batched _has_access_file checks.
+    
+    @param dirname: Absolute path to directory.
+    @returns: set
+    """
+    try:
+        return set(os.listdir(dirname))
+    except OSError:
+        return set()
 
-def _choose_signatures( paths ):
-    """Iterate through paths, storing signature_url for each collection, entity.
-    paths listed files first, then entities, then collections
+# replaced 'master' with something so mezzanine wins in sort
+SIGNATURE_MASTER_SUBSTITUTE = 'zzzzzz'
+
+# Per-directory signature files are saved here, relative to collection.
+SIGNATURES_CACHE_PATH = os.path.join('.git', 'ddr', 'signatures.json')
+
+def _signature_key( file_id ):
+    """Sort key used to pick signature files.
     
-    @param paths
-    @returns: dict signature_files
+    Natural sort order, with mezzanines ahead of masters.
+    
+    >>> _signature_key('ddr-test-123-1-master-a1b2') < _signature_key('ddr-test-123-10-master-a1b2')
+    True
+    >>> _signature_key('ddr-test-123-1-mezzanine-a1b2') < _signature_key('ddr-test-123-1-master-a1b2')
+    True
     """
-    SIGNATURE_MASTER_SUBSTITUTE = 'zzzzzz'
-    signature_files = {}
+    return util.natural_sort_key(file_id.replace('master', SIGNATURE_MASTER_SUBSTITUTE))
+
+def _store_signature( signatures, object_id, file_id, key=None ):
+    """Store file_id as signature for object_id if it is "earlier" than current one.
+    
+    @param signatures: dict of (key, file_id) tuples keyed by object ID
+    @param object_id: str Collection or entity ID.
+    @param file_id: str
+    @param key: (optional) Output of _signature_key(file_id)
+    """
+    if key is None:
+        key = _signature_key(file_id)
+    current = signatures.get(object_id, None)
+    if (current is None) or (key < current[0]):
+        signatures[object_id] = (key, file_id)
+
+def _signature_files( signatures ):
+    """Strip sort keys from the output of _store_signature.
+    
+    @param signatures: dict of (key, file_id) tuples keyed by object ID
+    @returns: dict of file IDs keyed by object ID
+    """
+    return {
+        object_id: file_id
+        for object_id,(key,file_id) in signatures.iteritems()
+    }
+
+def _dir_signature( dirname, paths ):
+    """Picks the earliest file in a directory that has an access file.
+    
+    The directory is listed once rather than stat-ing every access file.
+    
+    @param dirname: Absolute path to directory.
+    @param paths: list of absolute paths to file JSONs in dirname.
+    @returns: dict with file_id and parent_ids, or None
+    """
+    listing = _dir_listing(dirname)
+    best = None
     for path in paths:
         identifier = Identifier(path=path)
-        if identifier.model == 'file':
-            # decide whether to store this as a collection/entity signature
-            _store_signature_file(signature_files, identifier, SIGNATURE_MASTER_SUBSTITUTE)
+        if _has_access_file(identifier, listing):
+            key = _signature_key(identifier.id)
+            if (best is None) or (key < best[0]):
+                best = (key, identifier.id, _file_parent_ids(identifier))
+    if best:
+        return {'file_id': best[1], 'parent_ids': best[2]}
+    return None
+
+def load_signatures_cache( path ):
+    """Load per-directory signatures saved by save_signatures_cache.
+    
+    @param path: Absolute path to collection repository.
+    @returns: dict
+    """
+    cache_path = os.path.join(path, SIGNATURES_CACHE_PATH)
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as f:
+                return json.loads(f.read())
+        except ValueError:
+            logger.error('Bad signatures cache: %s' % cache_path)
+    return {}
+
+def save_signatures_cache( path, cache ):
+    """Save per-directory signatures inside the repository's .git directory.
+    
+    Does nothing if path is not a repository or cannot be written to.
+    
+    @param path: Absolute path to collection repository.
+    @param cache: dict Output of _choose_signatures
+    """
+    if not os.path.isdir(os.path.join(path, '.git')):
+        return
+    cache_path = os.path.join(path, SIGNATURES_CACHE_PATH)
+    try:
+        _write_atomic(cache_path, json.dumps(cache))
+    except (IOError, OSError):
+        # read-only repository: just don't cache
+        pass
+
+def _choose_signatures( paths, parents={}, cache=None, basepath=None ):
+    """Picks a signature file for each collection and entity in one pass.
+    
+    Files are grouped by directory.  For each directory the earliest file
+    (see _signature_key) with an access file is found using a single
+    directory listing; the result is reused from cache if the directory's
+    mtime has not changed.  Each directory's pick is then offered to its
+    entity and collection, unless they are unpublishable.
+    
+    @param paths: list of absolute paths, listed files first.
+    @param parents: dict Output of _parents_status().
+    @param cache: dict (optional) Per-directory results from an earlier run.
+    @param basepath: str (optional) Cache keys are relative to this path.
+    @returns: signature_files,cache
+    """
+    if cache is None:
+        cache = {}
+    dirs = OrderedDict()
+    for path in paths:
+        if not _is_container(path):
+            dirs.setdefault(os.path.dirname(path), []).append(path)
+    signatures = {}
+    new_cache = {}
+    for dirname,dirpaths in dirs.iteritems():
+        key = dirname
+        if basepath:
+            key = os.path.relpath(dirname, basepath)
+        try:
+            mtime = os.path.getmtime(dirname)
+        except OSError:
+            mtime = None
+        cached = cache.get(key)
+        if cached and (cached['mtime'] == mtime) and (cached['count'] == len(dirpaths)):
+            pick = cached['pick']
         else:
-            # signature_urls will be waiting for collections,entities below
-            pass
-    # restore substituted roles
-    for key,value in signature_files.iteritems():
-        signature_files[key] = value.replace(SIGNATURE_MASTER_SUBSTITUTE, 'master')
-    return signature_files
+            pick = _dir_signature(dirname, dirpaths)
+        new_cache[key] = {'mtime': mtime, 'count': len(dirpaths), 'pick': pick}
+        if pick and not _unpublishable_parents(pick['parent_ids'], parents):
+            sort_key = _signature_key(pick['file_id'])
+            for object_id in pick['parent_ids']:
+                _store_signature(signatures, object_id, pick['file_id'], sort_key)
+    return _signature_files(signatures),new_cache
 
 def load_document_json( json_path, model, object_id ):
     """Load object from JSON and add some essential fields.
@@ -1206,89 +1921,733 @@ def load_document_json( json_path, model, object_id ):
         document.append( {'id':object_id} )
     return document
 
-def index( hosts, index, path, recursive=False, public=True ):
+def _additional_fields( identifier ):
+    """Fields not in the model that index() adds to each document.
+    
+    signature_file is added later, once all the files have been seen.
+    
+    @param identifier: Identifier
+    @returns: dict
+    """
+    parent_id = identifier.parent_id()
+    additional_fields = {'parent_id': parent_id}
+    if identifier.model == 'collection': additional_fields['organization_id'] = parent_id
+    if identifier.model == 'entity': additional_fields['collection_id'] = parent_id
+    if identifier.model == 'file': additional_fields['entity_id'] = parent_id
+    return additional_fields
+
+def _index_record( path, publicfields=None ):
+    """Parse a metadata file once into everything index() needs to know about it.
+    
+    The record contains the object's identity, public/status/sort values,
+    and the document already filtered, cleaned, and restructured for
+    ElasticSearch.
+    
+    @param path: Absolute path to the document's JSON file.
+    @param publicfields: dict Output of public_fields(); None to keep all fields.
+    @returns: dict
+    """
+    identifier = Identifier(path=path)
+    record = {
+        'path': path,
+        'model': identifier.model,
+        'id': identifier.id,
+        'parent_ids': _file_parent_ids(identifier),
+        'public': None,
+        'status': None,
+        'sort': None,
+    }
+    document = load_document_json(path, identifier.model, identifier.id)
+    for field in document:
+        for key in ['public', 'status', 'sort']:
+            if key in field:
+                record[key] = field[key]
+    record['publishable'] = _is_publishable(document)
+    document_pub_fields = []
+    if publicfields and identifier.model:
+        document_pub_fields = publicfields[identifier.model]
+    identifier,data = _make_document(
+        document, document_pub_fields, _additional_fields(identifier), identifier
+    )
+    record['data'] = data
+    return record
+
+# Per-process state for index() worker processes; see _index_worker_init.
+_INDEX_WORKER = {}
+
+def _index_worker_init( publicfields ):
+    """Stores data shared by all documents in an index() worker process.
+    
+    Passed to multiprocessing.Pool as initializer so that it is sent
+    to each process once rather than pickled with every path.
+    """
+    _INDEX_WORKER['publicfields'] = publicfields
+
+def _index_worker_record( path ):
+    """Run _index_record in an index() worker process.
+    
+    Exceptions are re-raised in the parent by Pool.imap, so a bad file
+    stops index() just as it does without workers.
+    
+    @param path: Absolute path to the document's JSON file.
+    @returns: dict record
+    """
+    return _index_record(path, _INDEX_WORKER['publicfields'])
+
+def _index_records( paths, publicfields=None, procs=None ):
+    """Turns paths into records, in worker processes if available.
+    
+    @param paths: list of absolute paths
+    @param publicfields: dict Output of public_fields(); None to keep all fields.
+    @param procs: multiprocessing.Pool (optional)
+    @returns: iterator of records
+    """
+    if procs:
+        return procs.imap(_index_worker_record, paths, INDEX_WORKER_CHUNKSIZE)
+    return (_index_record(path, publicfields) for path in paths)
+
+def _record_action( record, parents ):
+    """Decides whether an _index_record can be posted.
+    
+    @param record: dict Output of _index_record().
+    @param parents: dict public,status of collections,entities keyed by ID.
+    @returns: (path, model, document_id, data) or (path, status, response)
+    """
+    unpublishable = _unpublishable_parents(record['parent_ids'], parents)
+    if unpublishable:
+        return (record['path'], 403, 'parent unpublishable: %s' % unpublishable)
+    if not record['publishable']:
+        return (record['path'], 403, 'object not publishable')
+    if not record['id']:
+        return (record['path'], 4, 'unknown problem')
+    record['data'][CONTENT_HASH_FIELD] = _content_hash(record['data'])
+    return (record['path'], record['model'], record['id'], record['data'])
+
+def _content_hash( data ):
+    """SHA1 of a cleaned document, not counting its own content hash.
+    
+    @param data: dict Document as posted to ElasticSearch.
+    @returns: str
+    """
+    payload = {
+        key: val for key,val in data.iteritems() if key != CONTENT_HASH_FIELD
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True)).hexdigest()
+
+def _existing_hashes( hosts, index, actions ):
+    """Gets content hashes of documents already in the index with a single mget.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param actions: list of (path, model, document_id, data) tuples.
+    @returns: dict of hashes keyed by (model, document_id)
+    """
+    docs = [
+        {'_type':model, '_id':document_id}
+        for path,model,document_id,data in actions
+    ]
+    es = _get_connection(hosts)
+    try:
+        response = es.mget(
+            index=index, body={'docs':docs}, _source_include=CONTENT_HASH_FIELD
+        )
+    except TransportError as err:
+        logger.error('mget failed, posting everything: %s' % err)
+        return {}
+    hashes = {}
+    for doc in response.get('docs', []):
+        if doc.get('found') and doc.get('_source'):
+            hashes[(doc['_type'], doc['_id'])] = doc['_source'].get(CONTENT_HASH_FIELD)
+    return hashes
+
+def _skip_unchanged( hosts, index, actions, skipped, chunk_size=BULK_MAX_DOCS ):
+    """Drops actions whose content hash matches the one already in the index.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param actions: Iterable of (path, model, document_id, data) tuples.
+    @param skipped: list Paths of unchanged documents are appended here.
+    @param chunk_size: int Number of documents per mget request.
+    @returns: generator yielding (path, model, document_id, data) tuples
+    """
+    for chunk in _batches(actions, chunk_size):
+        hashes = _existing_hashes(hosts, index, chunk)
+        for action in chunk:
+            path,model,document_id,data = action
+            if hashes.get((model, document_id)) == data[CONTENT_HASH_FIELD]:
+                skipped.append(path)
+            else:
+                yield action
+
+def _split_prepped( prepped, bad_paths ):
+    """Passes prepared documents through; errors go in bad_paths.
+    
+    >>> prepped = [('/a.json', 'entity', 'ddr-test-123-1', {}), ('/b.json', 403, 'nope')]
+    >>> bad = []
+    >>> list(_split_prepped(prepped, bad))
+    [('/a.json', 'entity', 'ddr-test-123-1', {})]
+    >>> bad
+    [('/b.json', 403, 'nope')]
+    
+    @param prepped: Iterable of _record_action results.
+    @param bad_paths: list (path,status,response) tuples are appended here.
+    @returns: generator yielding (path, model, document_id, data) tuples
+    """
+    for item in prepped:
+        if len(item) == 4:
+            yield item
+        else:
+            bad_paths.append(item)
+
+def _post_prepped( hosts, index, action ):
+    """POST one prepared document (see _index_record).
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param action: (path, model, document_id, data)
+    @returns: successful,bad_paths
+    """
+    path,model,document_id,data = action
+    es = _get_connection(hosts)
+    try:
+        result = es.index(index=index, doc_type=model, id=document_id, body=data)
+    except TransportError as err:
+        return 0,[(path, err.status_code, str(err.error))]
+    if result.get('_id', None):
+        return 1,[]
+    return 0,[(path, result.get('status', None), result.get('response', ''))]
+
+def _post_actions( hosts, index, actions, bulk=False, bulk_docs=BULK_MAX_DOCS, bulk_bytes=BULK_MAX_BYTES, threads=None, skipped=None ):
+    """POST prepared documents singly or in _bulk batches, in threads if available.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param actions: Iterable of (path, model, document_id, data) tuples.
+    @param bulk: Use the ElasticSearch _bulk API.
+    @param bulk_docs: int Maximum number of documents per _bulk request.
+    @param bulk_bytes: int Maximum size of _bulk request body in bytes.
+    @param threads: multiprocessing.pool.ThreadPool (optional)
+    @param skipped: list (optional) If present, skip unchanged documents and list them here.
+    @returns: successful,bad_paths
+    """
+    if skipped is not None:
+        actions = _skip_unchanged(hosts, index, actions, skipped, bulk_docs)
+    if bulk:
+        post = partial(_post_bulk_batch, hosts, index)
+        work = _bulk_batches(actions, bulk_docs, bulk_bytes)
+    else:
+        post = partial(_post_prepped, hosts, index)
+        work = actions
+    if threads:
+        results = threads.imap_unordered(post, work)
+    else:
+        results = (post(w) for w in work)
+    successful = 0
+    bad_paths = []
+    for s,b in results:
+        successful += s
+        bad_paths.extend(b)
+    return successful,bad_paths
+
+def _batches( items, size ):
+    """Splits list or iterable into lists of at most size items.
+    
+    >>> list(_batches([1,2,3,4,5], 2))
+    [[1, 2], [3, 4], [5]]
+    """
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            break
+        yield batch
+
+def _watermark_id( index, collection_id ):
+    return '%s:%s' % (make_index_name(index), collection_id)
+
+def get_watermark( hosts, index, collection_id ):
+    """Gets the collection repo commit that was last indexed into index.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param collection_id: str
+    @returns: str commit hash or None
+    """
+    es = _get_connection(hosts)
+    document_id = _watermark_id(index, collection_id)
+    try:
+        if es.exists(index=WATERMARK_INDEX, doc_type=WATERMARK_DOCTYPE, id=document_id):
+            document = es.get(index=WATERMARK_INDEX, doc_type=WATERMARK_DOCTYPE, id=document_id)
+            return document['_source'].get('commit', None)
+    except TransportError:
+        pass
+    return None
+
+def set_watermark( hosts, index, collection_id, commit ):
+    """Records the collection repo commit that was last indexed into index.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param collection_id: str
+    @param commit: str commit hash
+    @returns: JSON dict with status code and response
+    """
+    es = _get_connection(hosts)
+    body = {
+        'index': index,
+        'collection_id': collection_id,
+        'commit': commit,
+        'indexed': datetime.now().strftime(config.DATETIME_FORMAT),
+    }
+    return es.index(
+        index=WATERMARK_INDEX, doc_type=WATERMARK_DOCTYPE,
+        id=_watermark_id(index, collection_id), body=body
+    )
+
+def _incremental_paths( paths, basepath, changed ):
+    """Picks the paths that must be (re)posted given a list of changed files.
+    
+    - Changed metadata files are posted.
+    - Changes under an entity (new access file, new/removed file JSON)
+      re-post the entity and collection so their signature files are updated.
+    - A changed entity.json re-posts everything under the entity, since
+      its public/status values are inherited by its files.
+    - A changed collection.json means a full reindex of the collection.
+    
+    >>> paths = ['/c/files/c-1/files/c-1-master-a.json', '/c/files/c-1/entity.json', '/c/collection.json']
+    >>> _incremental_paths(paths, '/c', ['files/c-1/files/c-1-master-a.json'])
+    ['/c/files/c-1/files/c-1-master-a.json', '/c/files/c-1/entity.json', '/c/collection.json']
+    
+    @param paths: list Absolute paths to all metadata files in the collection.
+    @param basepath: str Absolute path to the collection repo.
+    @param changed: list Paths relative to basepath (added, modified, or deleted).
+    @returns: list of paths, in the same order as paths
+    """
+    basepath = os.path.normpath(basepath)
+    all_paths = set(paths)
+    selected = set()
+    for path_rel in changed:
+        path_abs = os.path.normpath(os.path.join(basepath, path_rel))
+        filename = os.path.basename(path_abs)
+        if filename == 'collection.json':
+            return [path for path in paths]
+        if path_abs in all_paths:
+            selected.add(path_abs)
+        if filename == 'entity.json':
+            prefix = os.path.dirname(path_abs) + os.sep
+            selected.update([path for path in paths if path.startswith(prefix)])
+        # ancestor entities and collection
+        dirname = os.path.dirname(path_abs)
+        while dirname.startswith(basepath):
+            for name in ['entity.json', 'collection.json']:
+                candidate = os.path.join(dirname, name)
+                if candidate in all_paths:
+                    selected.add(candidate)
+            if dirname == basepath:
+                break
+            dirname = os.path.dirname(dirname)
+    return [path for path in paths if path in selected]
+
+def _index_changes( hosts, index, path ):
+    """Determines what in a collection repo has changed since it was last indexed.
+    
+    Falls back to a full reindex (changed=None) if the collection has
+    never been indexed or if the watermark commit is no longer in the
+    repo's history (e.g. history was rewritten).
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param path: Absolute path to collection repo.
+    @returns: collection_id,head,changed,deleted
+    """
+    collection_id = Identifier(path=path).id
+    repo = dvcs.repository(path)
+    head = repo.head.commit.hexsha
+    watermark = get_watermark(hosts, index, collection_id)
+    if not (watermark and dvcs.is_ancestor(repo, watermark, head)):
+        logger.debug('%s: no usable watermark (%s), full reindex' % (collection_id, watermark))
+        return collection_id,head,None,[]
+    changes = dvcs.diff_name_status(repo, watermark)
+    changed = changes['added'] + changes['modified'] + changes['deleted']
+    deleted = [
+        os.path.join(path, path_rel)
+        for path_rel in changes['deleted']
+        if path_rel.endswith('.json')
+    ]
+    return collection_id,head,changed,deleted
+
+def _index_incremental( hosts, index, path, public=True, bulk=False, bulk_docs=BULK_MAX_DOCS, bulk_bytes=BULK_MAX_BYTES, workers=1, skip_unchanged=False ):
+    """Index only what changed in a collection repo since the last run.
+    
+    See index().
+    
+    @returns: number successful,list of paths that didn't work out
+    """
+    collection_id,head,changed,deleted = _index_changes(hosts, index, path)
+    results = _index(
+        hosts, index, path, recursive=True, public=public,
+        bulk=bulk, bulk_docs=bulk_docs, bulk_bytes=bulk_bytes, workers=workers,
+        skip_unchanged=skip_unchanged, changed=changed
+    )
+    for path_abs in deleted:
+        try:
+            document_id = Identifier(path=path_abs).id
+        except Exception:
+            continue
+        delete(hosts, index, document_id)
+    # Don't move the watermark past commits that didn't make it in.
+    if not [bad for bad in results['bad'] if bad[1] != 403]:
+        set_watermark(hosts, index, collection_id, head)
+    return results
+
+def index( hosts, index, path, recursive=False, public=True, bulk=False, bulk_docs=BULK_MAX_DOCS, bulk_bytes=BULK_MAX_BYTES, workers=1, incremental=False, skip_unchanged=False ):
     """(Re)index with data from the specified directory.
     
-    After receiving a list of metadata files, index() iterates through the list several times.  The first pass weeds out paths to objects that can not be published (e.g. object or its parent is unpublished).
+    After receiving a list of metadata files, index() reads each file exactly once.  Collections and entities are read first so that their public/status values are known.  Files are then read in batches; objects that can not be published (e.g. object or its parent is unpublished) are weeded out, and the rest are posted and discarded before the next batch is read.
     
-    The second pass goes through the files and assigns a signature file to each entity or collection ID.
+    While going through the files index() assigns a signature file to each entity or collection ID.
     There is some logic that tries to pick the first file of the first entity to be the collection signature, and so on.  Mezzanine files are preferred over master files.
     
-    In the final pass, a list of public/publishable fields is chosen based on the model.  Additional fields not in the model (e.g. parent ID, parent organization/collection/entity ID, the signature file) are packaged.  Then everything is sent off to post().
+    A list of public/publishable fields is chosen based on the model.  Additional fields not in the model (e.g. parent ID, parent organization/collection/entity ID, the signature file) are packaged.  Collections and entities are posted last, once their signature files are known.
+    If bulk is True, documents are instead batched into ElasticSearch _bulk requests of at most bulk_docs documents or bulk_bytes bytes.
+    If workers > 1, documents are prepared in a pool of worker processes and POSTed from a pool of threads.
+    
+    If incremental is True, each collection repo records the commit that was last indexed, and on the next run only objects affected by the git diff since that commit are posted (deleted objects are removed from the index).  If the commit is missing from history the collection is fully reindexed.
+    
+    Every document carries a hash of its contents.  If skip_unchanged is True, the hashes of documents already in the index are fetched in bulk and only documents whose hash differs are posted.  The count of unchanged documents is returned as 'skipped'.
 
     @param hosts: list of dicts containing host information.
     @param index: Name of the target index.
     @param path: Absolute path to directory containing object metadata files.
     @param recursive: Whether or not to recurse into subdirectories.
     @param public: For publication (fields not marked public will be ommitted).
-    @param paths: Absolute paths to directory containing collections.
+    @param bulk: Use the ElasticSearch _bulk API.
+    @param bulk_docs: int Maximum number of documents per _bulk request.
+    @param bulk_bytes: int Maximum size of _bulk request body in bytes.
+    @param workers: int Number of worker processes/threads.
+    @param incremental: Only index changes since the last indexed commit.
+    @param skip_unchanged: Don't post documents that are unchanged in the index.
     @returns: number successful,list of paths that didn't work out
     """
     logger.debug('index(%s, %s, %s)' % (hosts, index, path))
     
-    publicfields = public_fields()
+    if incremental and os.path.isdir(path):
+        kwargs = {
+            'public':public, 'bulk':bulk, 'bulk_docs':bulk_docs,
+            'bulk_bytes':bulk_bytes, 'workers':workers,
+            'skip_unchanged':skip_unchanged,
+        }
+        if os.path.exists(os.path.join(path, '.git')):
+            return _index_incremental(hosts, index, path, **kwargs)
+        results = {'total':0, 'successful':0, 'bad':[]}
+        if skip_unchanged:
+            results['skipped'] = 0
+        for repo_path in sorted(dvcs.repos(path)):
+            r = _index_incremental(hosts, index, repo_path, **kwargs)
+            results['total'] += r['total']
+            results['successful'] += r['successful']
+            results['bad'].extend(r['bad'])
+            if skip_unchanged:
+                results['skipped'] += r['skipped']
+        return results
+    return _index(
+        hosts, index, path, recursive=recursive, public=public,
+        bulk=bulk, bulk_docs=bulk_docs, bulk_bytes=bulk_bytes, workers=workers,
+        skip_unchanged=skip_unchanged
+    )
+
+def _index( hosts, index, path, recursive=False, public=True, bulk=False, bulk_docs=BULK_MAX_DOCS, bulk_bytes=BULK_MAX_BYTES, workers=1, skip_unchanged=False, changed=None ):
+    """Does the work for index() and _index_incremental().
+    
+    Each metadata file is read and parsed exactly once (see _index_record).
+    Collections and entities are read first so that files can inherit
+    their public/status values.  Signature files are chosen from directory
+    listings (see _choose_signatures).  Files are then streamed through in
+    batches of INDEX_BATCH_SIZE: parsed, checked, posted, and discarded.
+    Collections and entities are posted last, with their signature files.
+    
+    @param changed: list Paths relative to path; if set, post only these (see _incremental_paths).
+    @returns: number successful,list of paths that didn't work out
+    """
+    publicfields = None
+    if public:
+        publicfields = public_fields()
     
     # process a single file if requested
     if os.path.isfile(path):
         paths = [path]
+    elif recursive and util.repo_dirs(path) and not os.path.exists(os.path.join(path, '.git')):
+        # a Store: walk its repositories in parallel
+        paths = util.files_first_order(sorted([
+            p for cid,p,model in util.discover_meta_files(path)
+        ]))
     else:
         # files listed first, then entities, then collections
         paths = util.find_meta_files(path, recursive, files_first=1)
-    
-    # Store value of public,status for each collection,entity.
-    # Values will be used by entities and files to inherit these values from their parent.
-    parents = _parents_status(paths)
-    
-    # Determine if paths are publishable or not
-    successful_paths,bad_paths = _publishable_or_not(paths, parents)
-    
-    # iterate through paths, storing signature_url for each collection, entity
-    # paths listed files first, then entities, then collections
-    signature_files = _choose_signatures(successful_paths)
-    print('Signature files')
-    keys = signature_files.keys()
-    keys.sort()
-    for key in keys:
-        print(key, signature_files[key])
+    # repository/organization records are added by repo() and org()
+    paths = [p for p in paths if os.path.basename(p) not in BASE_RECORD_FILES]
+    
+    # incremental: only post what changed (signatures still need all paths)
+    selected = None
+    total = len(paths)
+    if changed is not None:
+        selected = set(_incremental_paths(paths, path, changed))
+        total = len(selected)
+    
+    container_paths = [p for p in paths if _is_container(p)]
+    file_paths = [
+        p for p in paths
+        if (not _is_container(p)) and ((selected is None) or (p in selected))
+    ]
     
     successful = 0
-    for path in successful_paths:
-        identifier = Identifier(path=path)
-        parent_id = identifier.parent_id()
+    bad_paths = []
+    skipped = None
+    if skip_unchanged:
+        skipped = []
+    procs = None
+    threads = None
+    if workers > 1:
+        procs = multiprocessing.Pool(workers, _index_worker_init, (publicfields,))
+        threads = ThreadPool(workers)
+    try:
+        # Store value of public,status for each collection,entity.
+        # Values will be used by entities and files to inherit these values from their parent.
+        containers = []
+        parents = {}
+        for record in _index_records(container_paths, publicfields, procs):
+            containers.append(record)
+            parents[record['id']] = {'public':record['public'], 'status':record['status']}
         
-        document_pub_fields = []
-        if public and identifier.model:
-            document_pub_fields = publicfields[identifier.model]
+        # paths listed files first, then entities, then collections
+        signature_files,signatures_cache = _choose_signatures(
+            paths, parents, load_signatures_cache(path), path
+        )
+        save_signatures_cache(path, signatures_cache)
+        print('Signature files')
+        keys = signature_files.keys()
+        keys.sort()
+        for key in keys:
+            print(key, signature_files[key])
         
-        additional_fields = {'parent_id': parent_id}
-        if identifier.model == 'collection': additional_fields['organization_id'] = parent_id
-        if identifier.model == 'entity': additional_fields['collection_id'] = parent_id
-        if identifier.model == 'file': additional_fields['entity_id'] = parent_id
-        if identifier.model in ['collection', 'entity']:
-            additional_fields['signature_file'] = signature_files.get(identifier.id, '')
+        for batch in _batches(file_paths, INDEX_BATCH_SIZE):
+            actions = []
+            for record in _index_records(batch, publicfields, procs):
+                actions.append(_record_action(record, parents))
+            s,b = _post_actions(
+                hosts, index, _split_prepped(actions, bad_paths),
+                bulk, bulk_docs, bulk_bytes, threads, skipped
+            )
+            successful += s
+            bad_paths.extend(b)
         
-        # HERE WE GO!
-        document = load_document_json(path, identifier.model, identifier.id)
-        try:
-            existing = get(hosts, index, identifier.model, identifier.id, fields=[])
-        except:
-            existing = None
-        result = post(hosts, index, document, document_pub_fields, additional_fields)
-        # success: created, or version number incremented
-        if result.get('_id', None):
-            if existing:
-                existing_version = existing.get('version', None)
-                if not existing_version:
-                    existing_version = existing.get('_version', None)
-            else:
-                existing_version = None
-            result_version = result.get('version', None)
-            if not result_version:
-                result_version = result.get('_version', None)
-            if result['created'] or (existing_version and (result_version > existing_version)):
-                successful += 1
-        else:
-            bad_paths.append((path, result['status'], result['response']))
-            #print(status_code)
+        actions = []
+        for record in containers:
+            if (selected is not None) and (record['path'] not in selected):
+                continue
+            record['data']['signature_file'] = signature_files.get(record['id'], '')
+            actions.append(_record_action(record, parents))
+        s,b = _post_actions(
+            hosts, index, _split_prepped(actions, bad_paths),
+            bulk, bulk_docs, bulk_bytes, threads, skipped
+        )
+        successful += s
+        bad_paths.extend(b)
+    except:
+        # don't parse the rest of the paths
+        if procs:
+            procs.terminate()
+        raise
+    finally:
+        if procs:
+            procs.close()
+            threads.close()
+            procs.join()
+            threads.join()
+    invalidate_facets(hosts, index)
     logger.debug('INDEXING COMPLETED')
-    return {'total':len(paths), 'successful':successful, 'bad':bad_paths}
+    results = {'total':total, 'successful':successful, 'bad':bad_paths}
+    if skip_unchanged:
+        results['skipped'] = len(skipped)
+    return results
+
+
+# rebuild --------------------------------------------------------------
+
+# Format of the timestamp appended to alias to make rebuild() index names
+GENERATION_FORMAT = '%Y%m%d%H%M%S'
+
+# Document types counted by rebuild() when verifying a new index
+REBUILD_DOCTYPES = ['collection', 'entity', 'file']
+
+def generation_name( alias, timestamp=None ):
+    """Name of a timestamped index for alias.
+    
+    >>> generation_name('ddrpublic', datetime(2015,1,2,3,4,5))
+    'ddrpublic-20150102030405'
+    
+    @param alias: Name of the alias
+    @param timestamp: datetime (optional) Defaults to now.
+    @returns: str
+    """
+    if not timestamp:
+        timestamp = datetime.now()
+    return make_index_name('%s-%s' % (alias, timestamp.strftime(GENERATION_FORMAT)))
+
+def _generations( names, alias ):
+    """Picks rebuild() generations of alias from a list of index names.
+    
+    >>> _generations(['ddrpublic-20150102030405', 'ddrpublic', 'ddrpublic-20140102030405', 'other-20150102030405'], 'ddrpublic')
+    ['ddrpublic-20140102030405', 'ddrpublic-20150102030405']
+    
+    @param names: list of index names
+    @param alias: Name of the alias
+    @returns: list of index names, oldest first
+    """
+    prefix = '%s-' % make_index_name(alias)
+    width = len(datetime.now().strftime(GENERATION_FORMAT))
+    return sorted([
+        name for name in names
+        if name.startswith(prefix)
+        and (len(name) == len(prefix) + width)
+        and name[len(prefix):].isdigit()
+    ])
+
+def _swap_alias_actions( alias, index, current ):
+    """update_aliases body that moves alias from current indices to index.
+    
+    >>> _swap_alias_actions('ddr', 'ddr-2', ['ddr-1'])
+    {'actions': [{'remove': {'index': 'ddr-1', 'alias': 'ddr'}}, {'add': {'index': 'ddr-2', 'alias': 'ddr'}}]}
+    
+    @param alias: Name of the alias
+    @param index: Name of the alias' new target index.
+    @param current: list Names of indices alias currently points to.
+    @returns: dict
+    """
+    actions = [
+        {'remove': {'index': i, 'alias': alias}}
+        for i in current if i != index
+    ]
+    actions.append({'add': {'index': index, 'alias': alias}})
+    return {'actions': actions}
+
+def swap_alias( hosts, alias, index ):
+    """Atomically point alias at index, removing it from any other indices.
+    
+    Unlike set_alias, other aliases are left alone.
+    
+    @param hosts: list of dicts containing host information.
+    @param alias: Name of the alias
+    @param index: Name of the alias' new target index.
+    @returns: list of indices alias used to point to
+    """
+    es = _get_connection(hosts)
+    current = [i for i,a in aliases(hosts) if a == alias]
+    es.indices.update_aliases(body=_swap_alias_actions(alias, index, current))
+    _forget_alias_map(hosts)
+    invalidate_facets(hosts, alias)
+    return current
+
+def _index_base_records( hosts, index, path ):
+    """Add repository and organization records found directly under path.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param path: Absolute path to directory containing repo/org directories.
+    @returns: list of statuses
+    """
+    statuses = []
+    repo_file,org_file = BASE_RECORD_FILES
+    for name in sorted(os.listdir(path)):
+        repo_json = os.path.join(path, name, repo_file)
+        org_json = os.path.join(path, name, org_file)
+        if os.path.exists(repo_json):
+            statuses.append(repo(hosts, index, repo_json))
+        elif os.path.exists(org_json):
+            statuses.append(org(hosts, index, org_json))
+    return statuses
+
+def _verify_count( hosts, index, expected ):
+    """Compares number of documents in index with number expected.
+    
+    @param hosts: list of dicts containing host information.
+    @param index: Name of the target index.
+    @param expected: int
+    @returns: count,error or None
+    """
+    es = _get_connection(hosts)
+    es.indices.refresh(index=index)
+    count = es.count(index=index, doc_type=','.join(REBUILD_DOCTYPES))['count']
+    if count != expected:
+        return count,'%s documents in index, expected %s' % (count, expected)
+    return count,None
+
+def gc_generations( hosts, alias, keep=1 ):
+    """Delete old rebuild() generations of alias.
+    
+    Indices that alias currently points to are never deleted.
+    
+    @param hosts: list of dicts containing host information.
+    @param alias: Name of the alias
+    @param keep: int Number of non-live generations to keep for rollback.
+    @returns: list of deleted index names
+    """
+    live = [i for i,a in aliases(hosts) if a == alias]
+    old = [name for name in _generations(index_names(hosts), alias) if name not in live]
+    if keep > 0:
+        old = old[:-keep]
+    for name in old:
+        delete_index(hosts, name)
+    return old
+
+def rebuild( hosts, alias, path, repo_path, public=True, workers=1, bulk_docs=BULK_MAX_DOCS, bulk_bytes=BULK_MAX_BYTES, keep=1 ):
+    """Build a fresh index beside the live one, then swap alias to it.
+    
+    - creates a timestamped index (see generation_name) with mappings and facets
+    - adds repository/organization records found under path
+    - bulk-loads the store (see index())
+    - checks that nothing failed except unpublishable objects, and that
+      the number of collections, entities, and files in the new index
+      matches the number of publishable metadata files on disk
+    - atomically moves alias to the new index
+    - deletes all but keep older generations
+    
+    If verification fails the alias is not touched and the new index
+    is left in place for inspection.
+    
+    @param hosts: list of dicts containing host information.
+    @param alias: Name of the alias the public site reads from.
+    @param path: Absolute path to directory containing collections.
+    @param repo_path: Absolute path to "ddr repo" (mappings, facets).
+    @param public: For publication (fields not marked public will be ommitted).
+    @param workers: int Number of worker processes/threads.
+    @param bulk_docs: int Maximum number of documents per _bulk request.
+    @param bulk_bytes: int Maximum size of _bulk request body in bytes.
+    @param keep: int Number of old generations to keep for rollback.
+    @returns: dict of statuses; 'error' is set if the alias was not swapped.
+    """
+    logger.debug('rebuild(%s, %s, %s, %s)' % (hosts, alias, path, repo_path))
+    alias = make_index_name(alias)
+    new_index = generation_name(alias)
+    statuses = {'index': new_index, 'error': None}
+    statuses['init'] = init_index(hosts, new_index, repo_path)
+    statuses['base'] = _index_base_records(hosts, new_index, path)
+    results = index(
+        hosts, new_index, path, recursive=True, public=public,
+        bulk=True, bulk_docs=bulk_docs, bulk_bytes=bulk_bytes, workers=workers
+    )
+    statuses['results'] = results
+    failed = [bad for bad in results['bad'] if bad[1] != 403]
+    if failed:
+        statuses['error'] = '%s documents could not be indexed' % len(failed)
+        return statuses
+    # every metadata file found, minus the unpublishable ones
+    unpublishable = [bad for bad in results['bad'] if bad[1] == 403]
+    statuses['count'],statuses['error'] = _verify_count(
+        hosts, new_index, results['total'] - len(unpublishable)
+    )
+    if statuses['error']:
+        return statuses
+    statuses['previous'] = swap_alias(hosts, alias, new_index)
+    statuses['deleted'] = gc_generations(hosts, alias, keep)
+    return statuses
@@ -75,6 +75,60 @@ def latest_commit(path):
         return repo.git.log('--pretty=format:%H %d %ad', '--date=iso', '-1')
     return None
 
+def git_dir(path):
+    """Returns the .git directory of the repository containing path.
+    
+    Follows "gitdir: ..." files (submodules, worktrees).
+    
+    @param path: Absolute path to repo or file within.
+    @returns: str Absolute path, or None if not in a repository
+    """
+    path = os.path.abspath(path)
+    while True:
+        dotgit = os.path.join(path, '.git')
+        if os.path.isdir(dotgit):
+            return dotgit
+        if os.path.isfile(dotgit):
+            with open(dotgit, 'r') as f:
+                line = f.read().strip()
+            if line.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(path, line[7:].strip()))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def head_fingerprint(path):
+    """Cheaply identifies the commit checked out in a repository.
+    
+    Reads HEAD and the ref it points to straight from the .git directory
+    instead of running git.  Changes whenever HEAD moves (commit, checkout,
+    reset, pull).  Use it to tell when latest_commit() output is stale.
+    
+    @param path: Absolute path to repo or file within.
+    @returns: tuple, or None if not in a repository
+    """
+    gitdir = git_dir(path)
+    if not gitdir:
+        return None
+    def read(filename):
+        try:
+            with open(os.path.join(gitdir, filename), 'r') as f:
+                return f.read().strip()
+        except IOError:
+            return None
+    def stat(filename):
+        try:
+            st = os.stat(os.path.join(gitdir, filename))
+            return (st.st_mtime, st.st_size)
+        except OSError:
+            return None
+    head = read('HEAD')
+    ref = None
+    if head and head.startswith('ref:'):
+        ref = read(head[4:].strip())
+    return (gitdir, head, ref, stat('packed-refs'))
+
 def _parse_cmp_commits(gitlog, a, b):
     """
     If abbrev == True:
@@ -189,6 +243,65 @@ def list_committed(repo, commit):
     entry = repo.git.log('-1', '--stat', commit.hexsha)
     return _parse_list_committed(entry)
 
+def _parse_diff_name_status( diff ):
+    """Parses output of "git diff --name-status".
+    
+    Renames and copies are split into a deletion and an addition.
+    
+    >>> _parse_diff_name_status('M\tcollection.json\nD\tfiles/a.json\nR100\tb.json\tc.json\n')
+    {'added': ['c.json'], 'modified': ['collection.json'], 'deleted': ['files/a.json', 'b.json']}
+    
+    @param diff: str
+    @returns: dict of lists of paths
+    """
+    changes = {'added': [], 'modified': [], 'deleted': [],}
+    for line in diff.strip().split('\n'):
+        if not line.strip():
+            continue
+        parts = line.split('\t')
+        status = parts[0][0]
+        if status in ['R', 'C']:
+            if status == 'R':
+                changes['deleted'].append(parts[1])
+            changes['added'].append(parts[2])
+        elif status == 'A':
+            changes['added'].append(parts[1])
+        elif status == 'D':
+            changes['deleted'].append(parts[1])
+        else:
+            changes['modified'].append(parts[1])
+    return changes
+
+def diff_name_status(repo, commit):
+    """Lists files added, modified, or deleted since the specified commit.
+    
+    Compares the commit against the working tree, so uncommitted changes
+    to tracked files are included.
+    
+    @param repo: A Gitpython Repo object
+    @param commit: str A commit hash.
+    @returns: dict {'added': [], 'modified': [], 'deleted': []}
+    """
+    return _parse_diff_name_status(
+        repo.git.diff('--name-status', '-M', commit)
+    )
+
+def is_ancestor(repo, a, b='HEAD'):
+    """Indicates whether commit A is an ancestor of (or same as) commit B.
+    
+    Returns False if A does not exist, e.g. if history was rewritten.
+    
+    @param repo: A Gitpython Repo object
+    @param a: str A commit hash.
+    @param b: str A commit hash.
+    @returns: boolean
+    """
+    try:
+        repo.git.merge_base('--is-ancestor', a, b)
+    except git.exc.GitCommandError:
+        return False
+    return True
+
 def _parse_list_conflicted( ls_unmerged ):
     files = []
     for line in ls_unmerged.strip().split('\n'):
@@ -748,6 +861,30 @@ def annex_version(repo):
     """
     return repo.git.annex('version')
 
+def annex_repo_version(path):
+    """Reads annex.version from a repository's .git/config, without git.
+    
+    @param path: Absolute path to repo or file within.
+    @returns: str, or None if repo is not annexed or not a repository
+    """
+    gitdir = git_dir(path)
+    if not gitdir:
+        return None
+    section = None
+    try:
+        with open(os.path.join(gitdir, 'config'), 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('['):
+                    section = line.strip('[]').strip().lower()
+                elif (section == 'annex') and ('=' in line):
+                    key,val = line.split('=', 1)
+                    if key.strip().lower() == 'version':
+                        return val.strip()
+    except IOError:
+        pass
+    return None
+
 def _annex_parse_description(annex_status, uuid):
     for key in annex_status.iterkeys():
         if 'repositories' in key:
@@ -1,12 +1,17 @@
 # coding: utf-8
 
+from array import array
+from bisect import bisect_left
 from collections import OrderedDict
 import importlib
+import multiprocessing
 import os
 import re
 import string
 from urlparse import urlparse
 
+from DDR import util
+
 
 # IDENTIFIERS are defined in ddr-defs
 try:
@@ -179,7 +184,149 @@ ADDITIONAL_PATHS = {
     i['model']: i['files']
     for i in IDENTIFIERS
 }
+
+_SIMPLE_FIELD = re.compile(r'^\w+$')
+
+def compile_template(template):
+    """Precompiles a str.format template into a function of a kwargs dict.
+    
+    Templates whose fields are plain names (e.g. '{repo}-{org}-{cid}') are
+    rewritten as %-format strings, which skip str.format's parsing on every
+    call.  Anything fancier falls back to template.format.
+    
+    >>> compile_template('{repo}-{org}-{cid}')({'repo':'ddr', 'org':'test', 'cid':123})
+    'ddr-test-123'
+    
+    @param template: str
+    @returns: function(kwargs) -> str
+    """
+    chunks = []
+    for literal,field,spec,conversion in string.Formatter().parse(template):
+        chunks.append(literal.replace('%', '%%'))
+        if field is None:
+            continue
+        if spec or conversion or not _SIMPLE_FIELD.match(field):
+            return lambda kwargs: template.format(**kwargs)
+        chunks.append('%%(%s)s' % field)
+    fmt = ''.join(chunks)
+    return lambda kwargs: fmt % kwargs
+
+ID_FORMATTERS = {
+    model: compile_template(template)
+    for model,template in ID_TEMPLATES.iteritems()
+}
+
+PATH_FORMATTERS = {
+    key: compile_template(template)
+    for key,template in PATH_TEMPLATES.iteritems()
+}
+
+URL_FORMATTERS = {
+    url_type: {
+        model: compile_template(template)
+        for model,template in templates.iteritems()
+    }
+    for url_type,templates in URL_TEMPLATES.iteritems()
+}
+
+# Parsed IDs, paths, and URLs, keyed by (method, text, base_path).
+# Values are immutable (model, keys, values, basepath, id) tuples shared by
+# all Identifiers made from the same text.  See configure_parse_cache.
+PARSE_CACHE_SIZE = 50000
+_PARSE_CACHE = util.LRUCache(PARSE_CACHE_SIZE)
+
+# parse_batch: texts per worker task, and min texts before using a pool
+BATCH_CHUNKSIZE = 5000
+BATCH_POOL_MIN = 50000
+
+# parse_batch columns; after 'raw', same order as _parse results
+BATCH_COLUMNS = ['raw', 'model', 'keys', 'values', 'basepath', 'id']
+
+
+def configure_parse_cache(size=PARSE_CACHE_SIZE):
+    """Resize (and empty) the identifier parse cache.
+    
+    @param size: int Max number of parsed texts to keep; 0 disables the cache.
+    """
+    _PARSE_CACHE.clear()
+    _PARSE_CACHE.maxsize = size
+
+def parse_cache_stats():
+    """Hit/miss statistics for the identifier parse cache.
     
+    @returns: dict {'hits', 'misses', 'size', 'maxsize'}
+    """
+    return _PARSE_CACHE.stats()
+
+# Python 2 re allows at most 100 groups (including group 0) per pattern.
+DISPATCH_MAX_GROUPS = 99
+
+# Regex features that can't survive being merged into one alternation.
+_UNDISPATCHABLE = re.compile(r'\\[1-9]|\(\?P=|\(\?[iLmsux]')
+_GROUP_NAME = re.compile(r'\(\?P<(\w+)>')
+
+def compile_dispatcher(patterns, max_groups=DISPATCH_MAX_GROUPS):
+    """Merges (regex, memo, model) patterns into as few regexes as possible.
+    
+    Each pattern becomes one alternative wrapped in a named group; its
+    named groups are renamed so they can coexist.  Alternatives are tried
+    left to right so the first pattern to match wins, as in the loop in
+    identify_object.  Patterns are split into chunks to stay under the
+    Python 2 limit on groups per regex.
+    
+    @param patterns: list of (regex, memo, model) tuples; regex may be str
+    @param max_groups: int Max capturing groups per combined regex
+    @returns: list of (regex, {wrapper: (tpl, [(group, name), ...])}) or
+        None if the patterns can't be combined
+    """
+    chunks = []
+    alternatives = []
+    table = {}
+    ngroups = 0
+    for n,tpl in enumerate(patterns):
+        regex = tpl[0]
+        if hasattr(regex, 'pattern'):
+            if regex.flags & ~re.UNICODE:
+                return None
+            regex = regex.pattern
+        if _UNDISPATCHABLE.search(regex):
+            return None
+        groups = re.compile(regex).groups + 1
+        if groups > max_groups:
+            return None
+        if alternatives and (ngroups + groups > max_groups):
+            chunks.append((re.compile('|'.join(alternatives)), table))
+            alternatives = []
+            table = {}
+            ngroups = 0
+        wrapper = '_p%s' % n
+        names = []
+        def rename(m):
+            group = '_p%s_%s' % (n, m.group(1))
+            names.append((group, m.group(1)))
+            return '(?P<%s>' % group
+        alternatives.append('(?P<%s>%s)' % (wrapper, _GROUP_NAME.sub(rename, regex)))
+        table[wrapper] = (tpl, names)
+        ngroups += groups
+    if alternatives:
+        chunks.append((re.compile('|'.join(alternatives)), table))
+    return chunks
+
+# id(patterns): (patterns, len(patterns), dispatcher)
+_DISPATCHERS = {}
+
+def _dispatcher(patterns):
+    """Combined-regex dispatcher for patterns, built once per list.
+    """
+    cached = _DISPATCHERS.get(id(patterns))
+    if cached and (cached[0] is patterns) and (cached[1] == len(patterns)):
+        return cached[2]
+    dispatcher = compile_dispatcher(patterns)
+    _DISPATCHERS[id(patterns)] = (patterns, len(patterns), dispatcher)
+    return dispatcher
+
+for patterns in [ID_PATTERNS, PATH_PATTERNS, URL_PATTERNS]:
+    _dispatcher(patterns)
 
 def identify_object(text, patterns):
     """Split ID, path, or URL into model and tokens and assign to Identifier
@@ -189,11 +336,33 @@ def identify_object(text, patterns):
     a legal object ID.
     Component names and values are assigned as attributes of the object.
     
+    Patterns are merged into a single regex (see compile_dispatcher) so
+    the text is scanned once rather than once per pattern.
+    
     @param i: Identifier object
     @param text: str Text string to look for
     @param patterns: list Patterns in which to look
     @returns: dict groupdict resulting from successful regex match
     """
+    dispatcher = _dispatcher(patterns)
+    if dispatcher is None:
+        return _identify_object_loop(text, patterns)
+    for regex,table in dispatcher:
+        m = regex.match(text)
+        if m:
+            tpl,names = table[m.lastgroup]
+            pattern,memo,model = tpl
+            groupdict = {name: m.group(group) for group,name in names}
+            return model,memo,groupdict
+    return None,None,None
+
+def _identify_object_loop(text, patterns):
+    """Tries each pattern in turn; see identify_object.
+    
+    @param text: str Text string to look for
+    @param patterns: list Patterns in which to look
+    @returns: model,memo,groupdict
+    """
     model = None
     memo = None
     groupdict = None
@@ -232,19 +401,49 @@ def set_idparts(i, groupdict, components=ID_COMPONENTS):
     @param groupdict: dict
     @param components: list [optional]
     """
-    i.basepath = groupdict.get('basepath', None)
-    if i.basepath:
-        i.basepath = os.path.normpath(i.basepath)
-    # list of object ID components
-    i.parts = OrderedDict([
-        (key, groupdict[key])
+    i.basepath,parts = _idparts(groupdict, components)
+    i.parts = OrderedDict(parts)
+
+def _idparts(groupdict, components=ID_COMPONENTS):
+    """Extracts basepath and ID components from regex groupdict.
+    
+    @param groupdict: dict
+    @param components: list [optional]
+    @returns: basepath,parts where parts is a tuple of (key,val) pairs
+    """
+    basepath = groupdict.get('basepath', None)
+    if basepath:
+        basepath = os.path.normpath(basepath)
+    # object ID components with numbers as ints
+    parts = tuple([
+        (key, int(groupdict[key]) if groupdict[key].isdigit() else groupdict[key])
         for key in components
         if groupdict.get(key)
     ])
-    # set object attributes with numbers as ints
-    for key,val in i.parts.items():
-        if val.isdigit():
-            i.parts[key] = int(val)
+    return basepath,parts
+
+# Shared tuples of ID component names, e.g. ('repo','org','cid')
+_PARTS_KEYS = {}
+
+def _intern(value):
+    """Interns str values so repeated components share one object.
+    """
+    if type(value) == str:
+        return intern(value)
+    return value
+
+def _split_parts(parts):
+    """Splits ID parts into shared keys tuple and interned values tuple.
+    
+    @param parts: dict or list of (key,val) pairs
+    @returns: keys,values
+    """
+    if hasattr(parts, 'items'):
+        parts = parts.items()
+    keys = tuple([_intern(key) for key,val in parts])
+    keys = _PARTS_KEYS.setdefault(keys, keys)
+    values = tuple([_intern(val) for key,val in parts])
+    return keys,values
 
 def format_id(i, model, templates=ID_TEMPLATES):
     """Format ID for the requested model using ID_TEMPLATES.
@@ -256,8 +455,17 @@ def format_id(i, model, templates=ID_TEMPLATES):
     @param templates: [optional] dict of str templates keyed to models
     @returns: str
     """
+    if templates is ID_TEMPLATES:
+        return ID_FORMATTERS[model](_format_kwargs(i))
     return templates[model].format(**i.parts)
 
+def _format_kwargs(i):
+    """Identifier's parts as a plain dict, for formatters.
+    """
+    if hasattr(i, '_keys'):
+        return dict(zip(i._keys, i._values))
+    return dict(i.parts)
+
 def format_path(i, model, path_type, templates=PATH_TEMPLATES):
     """Format absolute or relative path using PATH_TEMPLATES.
     
@@ -272,8 +480,10 @@ def format_path(i, model, path_type, templates=PATH_TEMPLATES):
     key = '-'.join([model, path_type])
     template = templates.get(key, None)
     if template:
-        kwargs = {key: val for key,val in i.parts.items()}
+        kwargs = _format_kwargs(i)
         kwargs['basepath'] = i.basepath
+        if templates is PATH_TEMPLATES:
+            return PATH_FORMATTERS[key](kwargs)
         return template.format(**kwargs)
     return None
 
@@ -287,6 +497,8 @@ def format_url(i, model, url_type, templates=URL_TEMPLATES):
     @returns: str
     """
     try:
+        if templates is URL_TEMPLATES:
+            return URL_FORMATTERS[url_type][model](_format_kwargs(i))
         template = templates[url_type][model]
         return template.format(**i.parts)
     except KeyError:
@@ -405,6 +617,28 @@ def first_id(i, model):
     new = Identifier(parts=parts)
     return new
 
+def _id_numbers(model, identifiers):
+    """Sorted array of the model's incrementing ID component.
+    
+    @param model: str
+    @param identifiers: list of Identifiers
+    @returns: array.array of int, sorted, may contain duplicates
+    """
+    # Get name of the ID component from the model's ID_TEMPLATE
+    # e.g. for Entity we want 'eid'
+    component = _field_names(ID_TEMPLATES[model]).pop()
+    return array('l', sorted([_component(i, component) for i in identifiers]))
+
+def _component(i, component):
+    """Value of one ID component without building Identifier.parts.
+    """
+    try:
+        return i._values[i._keys.index(component)]
+    except AttributeError:
+        return i.parts[component]
+    except ValueError:
+        raise KeyError(component)
+
 def max_id(model, identifiers):
     """Returns highest *existing* ID for the specied model
     
@@ -413,11 +647,48 @@ def max_id(model, identifiers):
     @returns: int
     """
     component = _field_names(ID_TEMPLATES[model]).pop()
-    existing = [i.parts[component] for i in identifiers]
-    existing.sort()
-    return existing[-1]
+    return max([_component(i, component) for i in identifiers])
 
-def add_ids(num_new, model, identifiers, startwith=None):
+def id_gaps(numbers):
+    """Unused ranges between sorted ID numbers.
+    
+    >>> id_gaps([1, 2, 5, 6, 9])
+    [(3, 4), (7, 8)]
+    
+    @param numbers: sorted list or array of int
+    @returns: list of (first, last) tuples, inclusive
+    """
+    return [
+        (a + 1, b - 1)
+        for a,b in zip(numbers, numbers[1:])
+        if b - a > 1
+    ]
+
+def _free_ids(numbers, start, num):
+    """First num numbers >= start that are not in sorted numbers.
+    
+    Walks the sorted array from bisect(start) so cost depends on num and
+    the number of taken IDs skipped, not on len(numbers).
+    
+    @param numbers: sorted array of int
+    @param start: int
+    @param num: int
+    @returns: list of int
+    """
+    free = []
+    n = bisect_left(numbers, start)
+    candidate = start
+    while len(free) < num:
+        while (n < len(numbers)) and (numbers[n] < candidate):
+            n += 1
+        if (n < len(numbers)) and (numbers[n] == candidate):
+            candidate += 1
+            continue
+        free.append(candidate)
+        candidate += 1
+    return free
+
+def add_ids(num_new, model, identifiers, startwith=None, skip_taken=False):
     """Add {num} {model} IDs to {list} starting with {n}; complain if duplicates
     
     >>> model = 'entity'
@@ -430,23 +701,28 @@ def add_ids(num_new, model, identifiers, startwith=None):
     @param model: str
     @param identifiers: list
     @param startwith: int
+    @param skip_taken: boolean Allocate the next num_new *unused* IDs,
+        filling gaps, instead of a contiguous block.
     @returns: dict {'success', 'max_id', 'new', 'taken'}
     """
-    # Get name of the ID component from the model's ID_TEMPLATE
-    # e.g. for Entity we want 'eid'
     # This is the part we will increment
-    component = _field_names(ID_TEMPLATES[model]).pop()
-    # then get {component} from each Identifier.parts
-    existing = sorted([i.parts[component] for i in identifiers])
+    existing = _id_numbers(model, identifiers)
     max_id = existing[-1] + 1
     
     if startwith:
         start = startwith
     else:
         start = max_id + 1
-    new = range(start, start + num_new)
     
-    taken = [x for x in set(new).intersection(existing)]
+    if skip_taken:
+        new = _free_ids(existing, start, num_new)
+        taken = []
+    else:
+        new = range(start, start + num_new)
+        # only existing IDs inside [start, start+num_new) can clash
+        lo = bisect_left(existing, start)
+        hi = bisect_left(existing, start + num_new)
+        taken = sorted(set(existing[lo:hi]))
     return {
         'max_id': max_id,
         'new': new,
@@ -461,8 +737,9 @@ def available(existing, new):
     @param new: list 
     @returns: {'new': list, 'taken': list, 'success': boolean}
     """
+    existing = set(existing)
     data = {
-        'overlap': [x for x in set(new).intersection(existing)],
+        'overlap': sorted(set([x for x in new if x in existing])),
     }
     data['success'] = data['overlap'] == []
     return data
@@ -483,6 +760,59 @@ class MalformedPathException(Exception):
 class MalformedURLException(Exception):
     pass
 
+def _parse(method, text, base_path=None):
+    """Split ID, path, or URL into model, parts, basepath, and ID.
+    
+    @param method: str 'id', 'path', or 'url'
+    @param text: str ID, normalized absolute path, or URL
+    @param base_path: str Normalized absolute path to Store's parent dir
+    @returns: (model, keys, values, basepath, id) where keys,values are
+        tuples of ID component names and values (see _split_parts)
+    """
+    if method == 'id':
+        patterns = ID_PATTERNS
+        target = text
+        error = MalformedIDException('Malformed ID: "%s"' % text)
+    elif method == 'path':
+        patterns = PATH_PATTERNS
+        target = text
+        error = MalformedPathException('Malformed path: "%s"' % text)
+    elif method == 'url':
+        patterns = URL_PATTERNS
+        target = os.path.normpath(urlparse(text).path)  # ignore domain and queries
+        error = MalformedURLException('Malformed URL: "%s"' % text)
+    model,memo,groupdict = identify_object(target, patterns)
+    if not groupdict:
+        raise error
+    basepath,parts = _idparts(groupdict)
+    if method == 'id':
+        object_id = text
+    else:
+        object_id = ID_FORMATTERS[model](dict(parts))
+    # paths keep only the basepath found in the path itself
+    if base_path and (method != 'path') and not basepath:
+        basepath = base_path
+    keys,values = _split_parts(parts)
+    return _intern(model),keys,values,_intern(basepath),object_id
+
+def _parse_cached(method, text, base_path=None, cache=True):
+    """Memoized _parse; Malformed* exceptions are not cached.
+    
+    @param method: str 'id', 'path', or 'url'
+    @param text: str
+    @param base_path: str
+    @param cache: boolean Set False to bypass the parse cache.
+    @returns: (model, keys, values, basepath, id)
+    """
+    if not cache:
+        return _parse(method, text, base_path)
+    key = (method, text, base_path)
+    parsed = _PARSE_CACHE.get(key)
+    if parsed is None:
+        parsed = _parse(method, text, base_path)
+        _PARSE_CACHE.set(key, parsed)
+    return parsed
+
 KWARG_KEYS = [
     'id',
     'parts',
@@ -492,12 +822,18 @@ KWARG_KEYS = [
 ]
 
 class Identifier(object):
-    raw = None
-    method = None
-    model = None
-    parts = OrderedDict()
-    basepath = None
-    id = None
+    """Identifies an object by its ID, parts, path, or URL.
+    
+    Slotted, with ID parts kept as a tuple of component names shared by
+    all Identifiers with the same components and a tuple of (interned)
+    values; Identifier.parts builds an OrderedDict from them on demand.
+    Identifiers hash and compare equal by model, ID, and basepath.
+    
+    Derived values (parent and collection IDs, lineage, paths) are cached
+    on the instance the first time they are requested.
+    """
+    # _cache must stay last; it is not pickled
+    __slots__ = ('raw', 'method', 'model', 'basepath', 'id', '_keys', '_values', '_cache')
     
     @staticmethod
     def wellformed(idtype, text, models=MODELS):
@@ -535,14 +871,57 @@ class Identifier(object):
     def __init__(self, *args, **kwargs):
         """
         NOTE: You will get faster performance with kwargs
+        
+        IDs, paths, and URLs are parsed once and memoized (see
+        configure_parse_cache); pass cache=False to bypass the cache.
         """
+        self.raw = None
+        self.method = None
+        self.model = None
+        self.basepath = None
+        self.id = None
+        self._keys = ()
+        self._values = ()
+        self._cache = None
+        cache = kwargs.pop('cache', True)
         blargs = _parse_args_kwargs(KWARG_KEYS, args, kwargs)
-        if blargs['id']: self._from_id(blargs['id'], blargs['base_path'])
+        if blargs['id']: self._from_id(blargs['id'], blargs['base_path'], cache)
         elif blargs['parts']: self._from_idparts(blargs['parts'], blargs['base_path'])
-        elif blargs['path']: self._from_path(blargs['path'], blargs['base_path'])
-        elif blargs['url']: self._from_url(blargs['url'], blargs['base_path'])
+        elif blargs['path']: self._from_path(blargs['path'], blargs['base_path'], cache)
+        elif blargs['url']: self._from_url(blargs['url'], blargs['base_path'], cache)
+    
+    def _set_parsed(self, parsed):
+        """Assign (model, keys, values, basepath, id) from _parse_cached.
+        """
+        self.model,self._keys,self._values,self.basepath,self.id = parsed
+        self._cache = None
+    
+    @property
+    def parts(self):
+        """ID components as an OrderedDict (a new copy on each access).
+        """
+        return OrderedDict(zip(self._keys, self._values))
+    
+    @parts.setter
+    def parts(self, parts):
+        self._keys,self._values = _split_parts(parts)
+        self._cache = None
+    
+    def _cached(self, key, func, *args):
+        """Returns func(*args), computing it only once per key.
+        
+        Keys for values that depend on basepath must include it, since
+        basepath may be assigned after the value was cached.
+        """
+        if self._cache is None:
+            self._cache = {}
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = func(*args)
+            return value
 
-    def _from_id(self, object_id, base_path=None):
+    def _from_id(self, object_id, base_path=None, cache=True):
         """Make Identifier from object ID.
         
         >>> Identifier(id='ddr-testing-123-456')
@@ -558,14 +937,7 @@ class Identifier(object):
             base_path = os.path.normpath(base_path)
         self.method = 'id'
         self.raw = object_id
-        self.id = object_id
-        model,memo,groupdict = identify_object(object_id, ID_PATTERNS)
-        if not groupdict:
-            raise MalformedIDException('Malformed ID: "%s"' % object_id)
-        self.model = model
-        set_idparts(self, groupdict)
-        if base_path and not self.basepath:
-            self.basepath = base_path
+        self._set_parsed(_parse_cached('id', object_id, base_path, cache))
     
     def _from_idparts(self, idparts, base_path=None):
         """Make Identifier from dict of parts.
@@ -584,7 +956,7 @@ class Identifier(object):
             base_path = os.path.normpath(base_path)
         self.method = 'parts'
         self.raw = idparts
-        self.model = idparts['model']
+        self.model = _intern(idparts['model'])
         self.parts = OrderedDict([
             (key, idparts[key])
             for key in ID_COMPONENTS
@@ -592,9 +964,9 @@ class Identifier(object):
         ])
         self.id = format_id(self, self.model)
         if base_path and not self.basepath:
-            self.basepath = base_path
+            self.basepath = _intern(base_path)
     
-    def _from_path(self, path_abs, base_path=None):
+    def _from_path(self, path_abs, base_path=None, cache=True):
         """Make Identifier from absolute path.
         
         >>> path = '/tmp/ddr-testing-123/files/ddr-testing-123-456/entity.json
@@ -612,14 +984,9 @@ class Identifier(object):
             base_path = os.path.normpath(base_path)
         self.method = 'path'
         self.raw = path_abs
-        model,memo,groupdict = identify_object(path_abs, PATH_PATTERNS)
-        if not groupdict:
-            raise MalformedPathException('Malformed path: "%s"' % path_abs)
-        self.model = model
-        set_idparts(self, groupdict)
-        self.id = format_id(self, self.model)
+        self._set_parsed(_parse_cached('path', path_abs, base_path, cache))
     
-    def _from_url(self, url, base_path=None):
+    def _from_url(self, url, base_path=None, cache=True):
         """Make Identifier from URL or URI.
         
         >>> Identifier(url='http://ddr.densho.org/ddr/testing/123/456')
@@ -641,25 +1008,40 @@ class Identifier(object):
             base_path = os.path.normpath(base_path)
         self.method = 'url'
         self.raw = url
-        urlpath = urlparse(url).path  # ignore domain and queries
-        urlpath = os.path.normpath(urlpath)
-        model,memo,groupdict = identify_object(urlpath, URL_PATTERNS)
-        if not groupdict:
-            raise MalformedURLException('Malformed URL: "%s"' % url)
-        self.model = model
-        set_idparts(self, groupdict)
-        self.id = format_id(self, self.model)
-        if base_path and not self.basepath:
-            self.basepath = base_path
+        self._set_parsed(_parse_cached('url', url, base_path, cache))
     
     def __repr__(self):
         return "<%s.%s %s:%s>" % (self.__module__, self.__class__.__name__, self.model, self.id)
     
+    def __eq__(self, other):
+        if not isinstance(other, Identifier):
+            return NotImplemented
+        return (self.model == other.model) \
+            and (self.id == other.id) \
+            and (self.basepath == other.basepath)
+    
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+    
+    def __hash__(self):
+        return hash((self.model, self.id))
+    
+    def __getstate__(self):
+        return tuple([getattr(self, key) for key in self.__slots__[:-1]])
+    
+    def __setstate__(self, state):
+        for key,val in zip(self.__slots__[:-1], state):
+            setattr(self, key, val)
+        self._cache = None
+    
     def _key(self):
         """Key for Pythonic object sorting.
         Integer components are returned as ints, enabling natural sorting.
         """
-        return self.parts.values()
+        return list(self._values)
     
     def __lt__(self, other):
         """Enables Pythonic sorting; see Identifier._key.
@@ -689,7 +1071,7 @@ class Identifier(object):
     def components(self):
         """Model and parts of the ID as a list.
         """
-        parts = [val for val in self.parts.itervalues()]
+        parts = list(self._values)
         parts.insert(0, self.model)
         return parts
 
@@ -718,7 +1100,7 @@ class Identifier(object):
         """
         if not self.model in COLLECTION_MODELS:
             raise Exception('%s objects do not have collection IDs' % self.model.capitalize())
-        return format_id(self, 'collection')
+        return self._cached('collection_id', format_id, self, 'collection')
     
     def collection_path(self):
         """Absolute path of the collection to which the Identifier belongs, if any.
@@ -739,6 +1121,9 @@ class Identifier(object):
         
         @param stubs: boolean Whether or not to include Stub objects.
         """
+        return self._cached(('parent_id', stubs), self._parent_id, stubs)
+    
+    def _parent_id(self, stubs):
         if stubs:
             parent_model = PARENTS_ALL.get(self.model, None)
         else:
@@ -800,12 +1185,15 @@ class Identifier(object):
         
         @param stubs: boolean Whether or not to include Stub objects.
         """
-        i = self
-        identifiers = [i]
-        while(i.parent(stubs=stubs)):
-            i = i.parent(stubs=stubs)
-            identifiers.append(i)
-        return identifiers
+        return list(self._cached(
+            ('lineage', stubs, self.basepath), self._lineage, stubs
+        ))
+    
+    def _lineage(self, stubs):
+        parent = self.parent(stubs=stubs)
+        if parent:
+            return tuple([self] + parent.lineage(stubs=stubs))
+        return (self,)
 
     def path_abs(self, append=None):
         """Return absolute path to object with optional file appended.
@@ -815,6 +1203,11 @@ class Identifier(object):
         """
         if not self.basepath:
             raise MissingBasepathException('%s basepath not set.'% self)
+        return self._cached(
+            ('path_abs', append, self.basepath), self._path_abs, append
+        )
+    
+    def _path_abs(self, append):
         path = format_path(self, self.model, 'abs')
         if append:
             filename = ADDITIONAL_PATHS.get(self.model,None).get(append,None)
@@ -861,3 +1254,146 @@ class Identifier(object):
         @returns: str
         """
         return format_url(self, self.model, url_type)
+
+
+# batch parsing --------------------------------------------------------
+
+def _batch_groups(texts, method, chunksize=BATCH_CHUNKSIZE):
+    """Unique texts grouped by directory and split into chunks.
+    
+    Paths in the same directory end up in the same chunk so they share
+    the worker's parse cache and interned strings.
+    
+    @param texts: list of unique str
+    @param method: str 'id', 'path', or 'url'
+    @param chunksize: int Approximate number of texts per chunk
+    @returns: list of lists of str
+    """
+    if method == 'path':
+        groups = OrderedDict()
+        for text in texts:
+            groups.setdefault(os.path.dirname(text), []).append(text)
+        groups = groups.values()
+    else:
+        groups = [texts]
+    chunks = []
+    chunk = []
+    for group in groups:
+        chunk.extend(group)
+        while len(chunk) >= chunksize:
+            chunks.append(chunk[:chunksize])
+            chunk = chunk[chunksize:]
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _parse_chunk(args):
+    """Parse a chunk of texts; see parse_batch.
+    
+    @param args: (method, texts, base_path)
+    @returns: parsed,errors dict of text:parsed, list of (text, message)
+    """
+    method,texts,base_path = args
+    parsed = {}
+    errors = []
+    for text in texts:
+        try:
+            if (method == 'path') and not os.path.isabs(text):
+                raise BadPathException('Path is not absolute: %s' % text)
+            parsed[text] = _parse_cached(method, text, base_path)
+        except (BadPathException, MalformedIDException,
+                MalformedPathException, MalformedURLException) as err:
+            errors.append((text, str(err)))
+    return parsed,errors
+
+def _share_parsed(parsed):
+    """Re-intern a parsed tuple that came back from another process.
+    """
+    model,keys,values,basepath,object_id = parsed
+    keys = _PARTS_KEYS.setdefault(keys, keys)
+    values = tuple([_intern(val) for val in values])
+    return _intern(model),keys,values,_intern(basepath),object_id
+
+def parse_batch(texts, method='path', base_path=None, processes=None, strict=True):
+    """Parse many IDs, paths, or URLs at once into columns.
+    
+    Each distinct text is parsed once.  Texts are grouped by directory and
+    can be fanned out to a multiprocessing.Pool for very long lists (at
+    least BATCH_POOL_MIN texts).
+    
+    >>> batch = parse_batch(util.find_meta_files('/tmp/ddr-testing-123', recursive=True))
+    >>> batch['model'][:2], batch['id'][:2]
+    (['collection', 'entity'], ['ddr-testing-123', 'ddr-testing-123-1'])
+    
+    @param texts: iterable of str IDs, absolute paths, or URLs
+    @param method: str 'id', 'path', or 'url'
+    @param base_path: str Absolute path to Store's parent dir
+    @param processes: int Number of worker processes (optional)
+    @param strict: boolean Raise on the first malformed text; if False they
+        are omitted from the columns and listed in 'errors'.
+    @returns: OrderedDict of lists keyed by BATCH_COLUMNS, in the order
+        of texts; keys and values are tuples as in Identifier; 'errors'
+        is a list of (text, message).
+    """
+    if base_path and not os.path.isabs(base_path):
+        raise BadPathException('Base path is not absolute: %s' % base_path)
+    if base_path:
+        base_path = os.path.normpath(base_path)
+    if method == 'path':
+        texts = [os.path.normpath(text) for text in texts]
+    else:
+        texts = list(texts)
+    unique = list(OrderedDict.fromkeys(texts))
+    chunks = [
+        (method, chunk, base_path)
+        for chunk in _batch_groups(unique, method)
+    ]
+    parsed = {}
+    errors = []
+    if processes and (processes > 1) and (len(unique) >= BATCH_POOL_MIN):
+        pool = multiprocessing.Pool(processes)
+        try:
+            for chunk_parsed,chunk_errors in pool.imap(_parse_chunk, chunks):
+                for text,result in chunk_parsed.iteritems():
+                    parsed[text] = _share_parsed(result)
+                errors.extend(chunk_errors)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for chunk in chunks:
+            chunk_parsed,chunk_errors = _parse_chunk(chunk)
+            parsed.update(chunk_parsed)
+            errors.extend(chunk_errors)
+    if errors and strict:
+        text,message = errors[0]
+        raise {
+            'id': MalformedIDException,
+            'path': MalformedPathException,
+            'url': MalformedURLException,
+        }[method](message)
+    batch = OrderedDict([(column, []) for column in BATCH_COLUMNS])
+    for text in texts:
+        result = parsed.get(text)
+        if result:
+            batch['raw'].append(text)
+            for column,val in zip(BATCH_COLUMNS[1:], result):
+                batch[column].append(val)
+    batch['errors'] = errors
+    return batch
+
+def batch_identifiers(batch, method='path'):
+    """Identifiers for each row of a parse_batch result.
+    
+    @param batch: OrderedDict from parse_batch
+    @param method: str Method used to make the batch
+    @returns: list of Identifiers
+    """
+    identifiers = []
+    for row in zip(*[batch[column] for column in BATCH_COLUMNS]):
+        i = Identifier()
+        i.method = method
+        i.raw = row[0]
+        i._set_parsed(row[1:])
+        identifiers.append(i)
+    return identifiers
@@ -94,9 +94,10 @@ def check_dir(label, path, log, mkdir=False, perm=os.W_OK):
     return True
 
 def checksums(src_path, log):
-    md5    = util.file_hash(src_path, 'md5');    log.ok('| md5: %s' % md5)
-    sha1   = util.file_hash(src_path, 'sha1');   log.ok('| sha1: %s' % sha1)
-    sha256 = util.file_hash(src_path, 'sha256'); log.ok('| sha256: %s' % sha256)
+    hashes = util.file_hashes(src_path, ['md5', 'sha1', 'sha256'])
+    md5    = hashes['md5'];    log.ok('| md5: %s' % md5)
+    sha1   = hashes['sha1'];   log.ok('| sha1: %s' % sha1)
+    sha256 = hashes['sha256']; log.ok('| sha256: %s' % sha256)
     if not (sha1 and md5 and sha256):
         log.crash('Could not calculate checksums')
     return md5,sha1,sha256
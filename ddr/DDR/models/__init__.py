@@ -28,6 +28,7 @@ for things like cmp_model_definition_fields.
 """
 
 from datetime import datetime
+from distutils.spawn import find_executable
 import json
 import logging
 logger = logging.getLogger(__name__)
@@ -46,7 +47,7 @@ from DDR.control import CollectionControlFile, EntityControlFile
 from DDR import docstore
 from DDR import dvcs
 from DDR import fileio
-from DDR.identifier import Identifier, MODULES
+from DDR.identifier import Identifier, MODULES, batch_identifiers, parse_batch
 from DDR import imaging
 from DDR import ingest
 from DDR import inheritance
@@ -131,13 +132,64 @@ def create_object(identifier):
             setattr(obj, f['name'], f['initial'])
     return obj
 
+# object_metadata results, keyed by _object_metadata_key
+OBJECT_METADATA_CACHE_SIZE = 64
+_OBJECT_METADATA_CACHE = util.LRUCache(OBJECT_METADATA_CACHE_SIZE)
+
+def _executable_fingerprint(name):
+    """Identifies the executable that would run for name, without running it.
+    
+    @param name: str Command name e.g. 'git'
+    @returns: tuple (path, inode, size, mtime), or None if not found
+    """
+    path = find_executable(name)
+    if not path:
+        return None
+    st = os.stat(path)
+    return (path, st.st_ino, st.st_size, st.st_mtime)
+
+def _object_metadata_key(module, repo_path):
+    """Everything object_metadata depends on, found without running git.
+    
+    HEADs of the ddr-cmdln install and of the models repo; the models
+    module; the git and git-annex executables; the annex repository
+    version of the object's repo.
+    
+    @param module: collection, entity, files model definitions module
+    @param repo_path: Absolute path to root of object's repo
+    @returns: tuple, or None if a repository could not be identified
+    """
+    module_path = modules.Module(module).path
+    if not module_path:
+        return None
+    install_head = dvcs.head_fingerprint(config.INSTALL_PATH)
+    models_head = dvcs.head_fingerprint(module_path)
+    if not (install_head and models_head and dvcs.git_dir(repo_path)):
+        return None
+    return (
+        install_head,
+        module_path, models_head,
+        _executable_fingerprint('git'),
+        _executable_fingerprint('git-annex'),
+        dvcs.annex_repo_version(repo_path),
+    )
+
 def object_metadata(module, repo_path):
     """Metadata for the ddrlocal/ddrcmdln and models definitions used.
     
+    Gathering this runs git four times, so results are remembered for the
+    life of the process and recomputed only when something they describe
+    changes (see _object_metadata_key).
+    
     @param module: collection, entity, files model definitions module
     @param repo_path: Absolute path to root of object's repo
     @returns: dict
     """
+    key = _object_metadata_key(module, repo_path)
+    if key:
+        data = _OBJECT_METADATA_CACHE.get(key)
+        if data:
+            return dict(data)
     repo = dvcs.repository(repo_path)
     gitversion = '; '.join([dvcs.git_version(repo), dvcs.annex_version(repo)])
     data = {
@@ -147,6 +199,8 @@ def object_metadata(module, repo_path):
         'models_commit': dvcs.latest_commit(modules.Module(module).path),
         'git_version': gitversion,
     }
+    if key:
+        _OBJECT_METADATA_CACHE.set(key, dict(data))
     return data
 
 def is_object_metadata(data):
@@ -160,15 +214,21 @@ def is_object_metadata(data):
             return True
     return False
 
-def load_json(document, module, json_text):
+def load_json(document, module, json_text, lazy=False):
     """Populates object from JSON-formatted text.
     
     Goes through module.FIELDS turning data in the JSON file into
     object attributes.
     
+    If lazy, field values are kept in document._lazy_fields and only become
+    attributes when first accessed (see materialize).  Fields whose names
+    are already attributes (e.g. id) are set right away.
+    Values pass through document._field_loaders, if any, as they are set.
+    
     @param document: Collection/Entity/File object.
     @param module: collection/entity/file module from 'ddr' repo.
     @param json_text: JSON-formatted text
+    @param lazy: boolean
     @returns: dict
     """
     try:
@@ -178,23 +238,75 @@ def load_json(document, module, json_text):
             {'title': 'ERROR: COULD NOT READ DATA (.JSON) FILE!'},
             {'_error': 'Error: ValueError during read load_json.'},
         ]
+    # reloading: earlier fields must not be mistaken for existing attributes
+    materialize_all(document)
     # software and commit metadata
     for field in json_data:
         if is_object_metadata(field):
             setattr(document, 'object_metadata', field)
             break
     # field values from JSON
+    values = {}
+    for f in json_data:
+        if hasattr(f, 'keys') and f:
+            key = f.keys()[0]
+            values[key] = f[key]
+    loaders = getattr(document, '_field_loaders', {})
+    lazy_fields = {}
     for mf in module.FIELDS:
-        for f in json_data:
-            if hasattr(f, 'keys') and (f.keys()[0] == mf['name']):
-                setattr(document, f.keys()[0], f.values()[0])
-    # Fill in missing fields with default values from module.FIELDS.
-    # Note: should not replace fields that are just empty.
-    for mf in module.FIELDS:
-        if not hasattr(document, mf['name']):
-            setattr(document, mf['name'], mf.get('default',None))
+        name = mf['name']
+        if name in values:
+            value = values[name]
+        # Fill in missing fields with default values from module.FIELDS.
+        # Note: should not replace fields that are just empty.
+        elif not hasattr(document, name):
+            value = mf.get('default',None)
+        else:
+            continue
+        if lazy and not hasattr(document, name):
+            lazy_fields[name] = value
+        elif name in loaders:
+            setattr(document, name, loaders[name](value))
+        else:
+            setattr(document, name, value)
+    if lazy_fields:
+        document._lazy_fields = lazy_fields
     return json_data
 
+def materialize(document, name):
+    """Turns a lazily-loaded field value into an attribute.
+    
+    Called from the __getattr__ of Collection/Entity/File, i.e. only when
+    normal attribute lookup fails.
+    
+    @param document: Collection/Entity/File object.
+    @param name: str Field name
+    @returns: field value
+    @raises: AttributeError if name is not a pending field
+    """
+    # __dict__ not getattr, which would recurse
+    fields = document.__dict__.get('_lazy_fields')
+    if not (fields and (name in fields)):
+        raise AttributeError(
+            "'%s' object has no attribute '%s'" % (document.__class__.__name__, name)
+        )
+    value = fields.pop(name)
+    if not fields:
+        del document.__dict__['_lazy_fields']
+    loaders = getattr(document, '_field_loaders', {})
+    if name in loaders:
+        value = loaders[name](value)
+    setattr(document, name, value)
+    return value
+
+def materialize_all(document):
+    """Turns all lazily-loaded field values into attributes.
+    
+    @param document: Collection/Entity/File object.
+    """
+    for name in document.__dict__.get('_lazy_fields', {}).keys():
+        materialize(document, name)
+
 def prep_json(obj, module, template=False,
               template_passthru=['id', 'record_created', 'record_lastmod'],
               exceptions=[]):
@@ -243,12 +355,13 @@ def prep_json(obj, module, template=False,
             data.append(item)
     return data
 
-def from_json(model, json_path, identifier):
+def from_json(model, json_path, identifier, lazy=False):
     """Read the specified JSON file and properly instantiate object.
     
     @param model: LocalCollection, LocalEntity, or File
     @param json_path: absolute path to the object's .json file
     @param identifier: [optional] Identifier
+    @param lazy: boolean Load field values on first access (see load_json).
     @returns: object
     """
     document = None
@@ -261,7 +374,7 @@ def from_json(model, json_path, identifier):
             # object_id is in object directory
             document = model(os.path.dirname(json_path), identifier=identifier)
         document_id = document.id  # save this just in case
-        document.load_json(fileio.read_text(json_path))
+        document.load_json(fileio.read_text(json_path), lazy=lazy)
         if not document.id:
             # id gets overwritten if document.json is blank
             document.id = document_id
@@ -418,6 +531,11 @@ class Collection( object ):
     
     git_url = None
     _status = ''
+    # field name: function applied to the value from JSON
+    _field_loaders = {
+        'record_created': lambda txt: datetime.strptime(txt, config.DATETIME_FORMAT) if txt else txt,
+        'record_lastmod': lambda txt: datetime.strptime(txt, config.DATETIME_FORMAT) if txt else txt,
+    }
     _astatus = ''
     _states = []
     _unsynced = 0
@@ -481,6 +599,9 @@ class Collection( object ):
         """
         return "<%s.%s '%s'>" % (self.__module__, self.__class__.__name__, self.id)
     
+    def __getattr__(self, name):
+        return materialize(self, name)
+    
     @staticmethod
     def create(path_abs, identifier=None):
         """Creates a new Collection with initial values from module.FIELDS.
@@ -494,23 +615,25 @@ class Collection( object ):
         return create_object(identifier)
     
     @staticmethod
-    def from_json(path_abs, identifier=None):
+    def from_json(path_abs, identifier=None, lazy=False):
         """Instantiates a Collection object from specified collection.json.
         
         @param path_abs: Absolute path to .json file.
         @param identifier: [optional] Identifier
+        @param lazy: boolean Load field values on first access.
         @returns: Collection
         """
-        return from_json(Collection, path_abs, identifier)
+        return from_json(Collection, path_abs, identifier, lazy)
     
     @staticmethod
-    def from_identifier(identifier):
+    def from_identifier(identifier, lazy=False):
         """Instantiates a Collection object using data from Identidier.
         
         @param identifier: Identifier
+        @param lazy: boolean Load field values on first access.
         @returns: Collection
         """
-        return from_json(Collection, identifier.path_abs('json'), identifier)
+        return from_json(Collection, identifier.path_abs('json'), identifier, lazy)
 
     def parent( self ):
         """Returns Collection's parent object.
@@ -553,7 +676,7 @@ class Collection( object ):
                             e.title = json.loads('{%s}' % line)['title']
                             entities.append(e)
             else:
-                entity = Entity.from_identifier(Identifier(path=path))
+                entity = Entity.from_identifier(Identifier(path=path), lazy=True)
                 for lv in entity.labels_values():
                     if lv['label'] == 'title':
                         entity.title = lv['value']
@@ -570,12 +693,13 @@ class Collection( object ):
         @param model: str Restrict list to model.
         @returns: list of Identifiers
         """
-        return [
-            Identifier(path)
-            for path in util.find_meta_files(
-                self.path, recursive=1, model=model, force_read=force_read
+        return batch_identifiers(
+            parse_batch(
+                util.find_meta_files(
+                    self.path, recursive=1, model=model, force_read=force_read
+                )
             )
-        ]
+        )
     
     def labels_values(self):
         """Apply display_{field} functions to prep object data for the UI.
@@ -613,25 +737,21 @@ class Collection( object ):
         """
         return inheritance.update_inheritables(self, 'collection', inheritables, cleaned_data)
     
-    def load_json(self, json_text):
+    def load_json(self, json_text, lazy=False):
         """Populates Collection from JSON-formatted text.
         
         Goes through COLLECTION_FIELDS, turning data in the JSON file into
         object attributes.
         
         @param json_text: JSON-formatted text
+        @param lazy: boolean Load field values on first access.
         """
         module = self.identifier.fields_module()
-        load_json(self, module, json_text)
+        load_json(self, module, json_text, lazy)
         # special cases
-        if hasattr(self, 'record_created') and self.record_created:
-            self.record_created = datetime.strptime(self.record_created, config.DATETIME_FORMAT)
-        else:
-            self.record_created = datetime.now()
-        if hasattr(self, 'record_lastmod') and self.record_lastmod:
-            self.record_lastmod = datetime.strptime(self.record_lastmod, config.DATETIME_FORMAT)
-        else:
-            self.record_lastmod = datetime.now()
+        for name in ['record_created', 'record_lastmod']:
+            if not (hasattr(self, name) and getattr(self, name)):
+                setattr(self, name, datetime.now())
     
     def dump_json(self, template=False, doc_metadata=False, obj_metadata={}):
         """Dump Collection data to JSON-formatted text.
@@ -799,6 +919,34 @@ ENTITY_FILE_KEYS = ['path_rel',
                     'md5',
                     'public',]
 
+def _parsedt(txt):
+    """Parses Entity datetimes, which may be in either of two formats.
+    
+    @param txt: str
+    @returns: datetime (now if txt could not be parsed)
+    """
+    d = datetime.now()
+    try:
+        d = datetime.strptime(txt, config.DATETIME_FORMAT)
+    except:
+        try:
+            d = datetime.strptime(txt, config.TIME_FORMAT)
+        except:
+            pass
+    return d
+
+def _unique_files(files):
+    """Entity.files list of dicts without duplicates, in order.
+    
+    @param files: list of dicts
+    @returns: list of dicts
+    """
+    new_files = []
+    for f in files:
+        if f not in new_files:
+            new_files.append(f)
+    return new_files
+
 class Entity( object ):
     root = None
     id = None
@@ -820,8 +968,14 @@ class Entity( object ):
     control_path_rel = None
     mets_path_rel = None
     files_path_rel = None
-    _file_objects = 0
+    _file_objects_list = None
     _file_objects_loaded = 0
+    # field name: function applied to the value from JSON
+    _field_loaders = {
+        'record_created': lambda txt: _parsedt(txt) if txt else txt,
+        'record_lastmod': lambda txt: _parsedt(txt) if txt else txt,
+        'files': _unique_files,
+    }
     
     def __init__( self, path_abs, id=None, identifier=None ):
         path_abs = os.path.normpath(path_abs)
@@ -862,6 +1016,21 @@ class Entity( object ):
     def __repr__(self):
         return "<%s.%s '%s'>" % (self.__module__, self.__class__.__name__, self.id)
     
+    def __getattr__(self, name):
+        return materialize(self, name)
+    
+    @property
+    def _file_objects(self):
+        """File objects for Entity.files, loaded on first access if lazy.
+        """
+        if self._file_objects_list is None:
+            self.load_file_objects()
+        return self._file_objects_list
+    
+    @_file_objects.setter
+    def _file_objects(self, value):
+        self._file_objects_list = value
+    
     @staticmethod
     def create(path_abs, identifier=None):
         """Creates a new Entity with initial values from module.FIELDS.
@@ -877,14 +1046,15 @@ class Entity( object ):
         return obj
     
     @staticmethod
-    def from_json(path_abs, identifier=None):
+    def from_json(path_abs, identifier=None, lazy=False):
         """Instantiates an Entity object from specified entity.json.
         
         @param path_abs: Absolute path to .json file.
         @param identifier: [optional] Identifier
+        @param lazy: boolean Load field values and File objects on first access.
         @returns: Entity
         """
-        return from_json(Entity, path_abs, identifier)
+        return from_json(Entity, path_abs, identifier, lazy)
     
     @staticmethod
     def from_csv(identifier, rowd):
@@ -897,13 +1067,14 @@ class Entity( object ):
         return from_csv(identifier, rowd)
     
     @staticmethod
-    def from_identifier(identifier):
+    def from_identifier(identifier, lazy=False):
         """Instantiates an Entity object, loads data from entity.json.
         
         @param identifier: Identifier
+        @param lazy: boolean Load field values and File objects on first access.
         @returns: Entity
         """
-        return from_json(Entity, identifier.path_abs('json'), identifier)
+        return from_json(Entity, identifier.path_abs('json'), identifier, lazy)
     
 #    def parent( self ):
 #        """
@@ -960,27 +1131,21 @@ class Entity( object ):
     def unlock( self, text ): return locking.unlock(self.lock_path, text)
     def locked( self ): return locking.locked(self.lock_path)
 
-    def load_json(self, json_text):
+    def load_json(self, json_text, lazy=False):
         """Populate Entity data from JSON-formatted text.
         
+        Datetimes are parsed and duplicate files removed by _field_loaders.
+        
         @param json_text: JSON-formatted text
+        @param lazy: boolean Load field values and File objects on first access.
         """
         module = self.identifier.fields_module()
-        load_json(self, module, json_text)
-        # special cases
-        def parsedt(txt):
-            d = datetime.now()
-            try:
-                d = datetime.strptime(txt, config.DATETIME_FORMAT)
-            except:
-                try:
-                    d = datetime.strptime(txt, config.TIME_FORMAT)
-                except:
-                    pass
-            return d
-        if hasattr(self, 'record_created') and self.record_created: self.record_created = parsedt(self.record_created)
-        if hasattr(self, 'record_lastmod') and self.record_lastmod: self.record_lastmod = parsedt(self.record_lastmod)
-        self.rm_file_duplicates()
+        load_json(self, module, json_text, lazy)
+        if lazy:
+            # see Entity._file_objects
+            self._file_objects_list = None
+        else:
+            self.load_file_objects()
 
     def dump_json(self, template=False, doc_metadata=False, obj_metadata={}):
         """Dump Entity data to JSON-formatted text.
@@ -1144,12 +1309,20 @@ class Entity( object ):
         checksums = []
         if algo not in self.checksum_algorithms():
             raise Error('BAD ALGORITHM CHOICE: {}'.format(algo))
-        for f in self._file_paths():
+        fpaths = [os.path.join(self.files_path, f) for f in self._file_paths()]
+        # hash present files all at once; the collection's checksum cache
+        # (util.CHECKSUM_CACHE) serves repeat calls for other algorithms
+        present,errors = util.hash_files([
+            fpath for fpath in fpaths
+            if os.path.exists(fpath) and not os.path.islink(fpath)
+        ], [algo], repo_path=self.collection_path)
+        if errors:
+            raise IOError('Could not hash %s: %s' % errors[0])
+        for fpath in fpaths:
             cs = None
-            fpath = os.path.join(self.files_path, f)
             # git-annex files are present
-            if os.path.exists(fpath) and not os.path.islink(fpath):
-                cs = util.file_hash(fpath, algo)
+            if fpath in present:
+                cs = present[fpath][algo]
             # git-annex files NOT present - get checksum from entity._files
             # WARNING: THIS MODULE SHOULD NOT KNOW ANYTHING ABOUT HIGHER-LEVEL CODE!
             elif os.path.islink(fpath) and hasattr(self, '_files'):
@@ -1210,11 +1383,7 @@ class Entity( object ):
         NOTE: See note for detect_file_duplicates().
         """
         # regenerate files list
-        new_files = []
-        for f in self.files:
-            if f not in new_files:
-                new_files.append(f)
-        self.files = new_files
+        self.files = _unique_files(self.files)
         # reload objects
         self.load_file_objects()
     
@@ -1389,6 +1558,9 @@ class File( object ):
     def __repr__(self):
         return "<%s.%s '%s'>" % (self.__module__, self.__class__.__name__, self.id)
     
+    def __getattr__(self, name):
+        return materialize(self, name)
+    
     @staticmethod
     def create(path_abs, identifier=None):
         """Creates a new File with initial values from module.FIELDS.
@@ -1409,17 +1581,18 @@ class File( object ):
     # create(path)
     
     @staticmethod
-    def from_json(path_abs, identifier=None):
+    def from_json(path_abs, identifier=None, lazy=False):
         """Instantiates a File object from specified *.json.
         
         @param path_abs: Absolute path to .json file.
         @param identifier: [optional] Identifier
+        @param lazy: boolean Load field values on first access.
         @returns: DDRFile
         """
         #file_ = File(path_abs=path_abs)
         #file_.load_json(fileio.read_text(file_.json_path))
         #return file_
-        return from_json(File, path_abs, identifier)
+        return from_json(File, path_abs, identifier, lazy)
     
     @staticmethod
     def from_csv(identifier, rowd):
@@ -1432,13 +1605,14 @@ class File( object ):
         return from_csv(identifier, rowd)
     
     @staticmethod
-    def from_identifier(identifier):
+    def from_identifier(identifier, lazy=False):
         """Instantiates a File object, loads data from FILE.json.
         
         @param identifier: Identifier
+        @param lazy: boolean Load field values on first access.
         @returns: File
         """
-        return File.from_json(identifier.path_abs('json'), identifier)
+        return File.from_json(identifier.path_abs('json'), identifier, lazy)
     
     def parent( self ):
         i = Identifier(id=self.parent_id, base_path=self.identifier.basepath)
@@ -1482,13 +1656,14 @@ class File( object ):
     def inherit( self, parent ):
         inheritance.inherit( parent, self )
     
-    def load_json(self, json_text):
+    def load_json(self, json_text, lazy=False):
         """Populate File data from JSON-formatted text.
         
         @param json_text: JSON-formatted text
+        @param lazy: boolean Load field values on first access.
         """
         module = self.identifier.fields_module()
-        json_data = load_json(self, module, json_text)
+        json_data = load_json(self, module, json_text, lazy)
         # fill in the blanks
         if self.access_rel:
             access_abs = os.path.join(self.entity_files_path, self.access_rel)
@@ -1658,6 +1833,7 @@ class File( object ):
         return f
         
     def dict( self ):
+        materialize_all(self)
         return self.__dict__
         
     @staticmethod
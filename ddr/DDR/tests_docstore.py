@@ -1,5 +1,7 @@
 from datetime import datetime
 import json
+import os
+import shutil
 
 from nose.tools import assert_raises
 from nose.plugins.attrib import attr
@@ -25,6 +27,24 @@ def test_get_connection():
     assert es
     assert es.cat.client.ping() == True
 
+def test_hosts_key():
+    hosts0 = [{'host':'127.0.0.1', 'port':9200}]
+    hosts1 = [{'port':'9200', 'host':'127.0.0.1'}]
+    assert docstore._hosts_key(hosts0) == docstore._hosts_key(hosts1)
+    assert docstore._hosts_key(hosts0) != docstore._hosts_key([{'host':'127.0.0.1', 'port':9201}])
+
+def test_shared_connection():
+    es0 = docstore._get_connection(HOSTS)
+    es1 = docstore._get_connection([{'host':'127.0.0.1', 'port':'9200'}])
+    assert es0 is es1
+    assert docstore._get_connection(es0) is es0
+    docstore.configure_connections(timeout=30)
+    es2 = docstore._get_connection(HOSTS)
+    assert es2 is not es0
+    docstore.set_connection(HOSTS, es0)
+    assert docstore._get_connection(HOSTS) is es0
+    docstore.configure_connections(timeout=10)
+
 def test_make_index_name():
     assert docstore.make_index_name('abc-def_ghi.jkl/mno\\pqr stu') == 'abc-def_ghi.jkl-mno-pqrstu'
     assert docstore.make_index_name('qnfs/kinkura/gold') == 'qnfs-kinkura-gold'
@@ -66,6 +86,90 @@ def test_parse_cataliases():
 # list_facets
 # facet_terms
 
+class FakeCat(object):
+    lookups = 0
+    def aliases(self, h):
+        self.lookups += 1
+        return u'fakeindex fakealias \n'
+
+class FakeFacetES(object):
+    def __init__(self):
+        self.searches = 0
+        self.cat = FakeCat()
+    def search(self, index, doc_type, body):
+        self.searches += 1
+        return {'facets': {'results': {'terms': [{'term': 'photograph', 'count': self.searches}]}}}
+    def index(self, index, doc_type, id, body):
+        return {'_id': id, 'created': True}
+
+def test_facet_names():
+    pairs = [('ddr-1','ddr'), ('ddr-1','public'), ('ddr-2','staging')]
+    assert docstore._facet_names(pairs, 'ddr-1') == ['ddr', 'ddr-1', 'public']
+    # writes through an alias reach the index and its other aliases
+    assert docstore._facet_names(pairs, 'ddr') == ['ddr', 'ddr-1', 'public']
+    assert docstore._facet_names(pairs, 'other') == ['other']
+
+def test_facet_cache():
+    hosts = [{'host':'fakehost', 'port':9999}]
+    es = FakeFacetES()
+    docstore.set_connection(hosts, es)
+    docstore._forget_alias_map(hosts)
+    for cache_dir in [None, '/tmp/test-ddr-docstore-facets']:
+        if cache_dir and os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        docstore.configure_facet_cache(path=cache_dir)
+        es.searches = 0
+        terms0 = docstore.facet_terms(hosts, 'fakealias', 'genre')
+        terms1 = docstore.facet_terms(hosts, 'fakealias', 'genre')
+        assert terms0 == terms1
+        assert es.searches == 1
+        # callers get copies
+        terms1['terms'].pop()
+        assert len(docstore.facet_terms(hosts, 'fakealias', 'genre')['terms']) == 1
+        docstore.facet_terms(hosts, 'fakealias', 'genre', model='entity')
+        docstore.facet_terms(hosts, 'fakealias', 'genre', cache=False)
+        assert es.searches == 3
+        # writing to the index behind the alias invalidates it
+        docstore.invalidate_facets(hosts, 'fakeindex')
+        terms2 = docstore.facet_terms(hosts, 'fakealias', 'genre')
+        assert es.searches == 4
+        assert terms2['terms'][0]['count'] == 4
+        if cache_dir:
+            # another process sees the on-disk cache
+            docstore.configure_facet_cache(path=cache_dir)
+            assert docstore.facet_terms(hosts, 'fakealias', 'genre') == terms2
+            assert es.searches == 4
+            shutil.rmtree(cache_dir)
+        # writing through the alias invalidates the index
+        docstore.facet_terms(hosts, 'fakeindex', 'genre')
+        docstore.invalidate_facets(hosts, 'fakealias')
+        docstore.facet_terms(hosts, 'fakeindex', 'genre')
+        assert es.searches == 6
+    # aliases were looked up once
+    assert es.cat.lookups == 1
+    # in-memory terms expire
+    docstore.configure_facet_cache(ttl=0)
+    es.searches = 0
+    docstore.facet_terms(hosts, 'fakealias', 'genre')
+    docstore.facet_terms(hosts, 'fakealias', 'genre')
+    assert es.searches == 2
+    docstore.configure_facet_cache()
+
+def test_post_invalidates_facets():
+    hosts = [{'host':'fakehost', 'port':9999}]
+    docstore.set_connection(hosts, FakeFacetES())
+    docstore._forget_alias_map(hosts)
+    generation = docstore._facet_generation('fakealias')
+    document = [{'id': 'ddr-test-123-1'}, {'public': 1}, {'status': 'completed'}]
+    docstore.post(hosts, 'fakeindex', document)
+    assert docstore._facet_generation('fakealias') == generation + 1
+    path = '/tmp/test-ddr-docstore-post.json'
+    with open(path, 'w') as f:
+        f.write('{}')
+    docstore.post_json(hosts, 'fakeindex', 'entity', 'ddr-test-123-1', path)
+    assert docstore._facet_generation('fakealias') == generation + 2
+    os.remove(path)
+
 def test_is_publishable():
     data0 = [{'id': 'ddr-testing-123-1'}]
     data1 = [{'id': 'ddr-testing-123-1'}, {'public':0}, {'status':'inprogress'}]
@@ -175,6 +279,52 @@ def test_clean_payload():
     assert data == expected
 
 # post
+
+BULK_ACTIONS = [
+    ('/tmp/a.json', 'entity', 'ddr-test-123-1', {'id':'ddr-test-123-1', 'title':'a'}),
+    ('/tmp/b.json', 'entity', 'ddr-test-123-2', {'id':'ddr-test-123-2', 'title':'b'}),
+    ('/tmp/c.json', 'entity', 'ddr-test-123-3', {'id':'ddr-test-123-3', 'title':'c'}),
+]
+
+def test_bulk_batches():
+    batches0 = list(docstore._bulk_batches(BULK_ACTIONS, max_docs=2))
+    assert [[path for path,lines in batch] for batch in batches0] == [
+        ['/tmp/a.json', '/tmp/b.json'], ['/tmp/c.json']
+    ]
+    path,lines = batches0[0][0]
+    assert json.loads(lines[0]) == {'index': {'_type':'entity', '_id':'ddr-test-123-1'}}
+    assert json.loads(lines[1]) == {'id':'ddr-test-123-1', 'title':'a'}
+    # each document is bigger than max_bytes so each gets its own batch
+    batches1 = list(docstore._bulk_batches(BULK_ACTIONS, max_bytes=10))
+    assert len(batches1) == 3
+    assert list(docstore._bulk_batches([])) == []
+
+def test_parse_bulk_response():
+    batch = [('/tmp/a.json', []), ('/tmp/b.json', []), ('/tmp/c.json', [])]
+    response = {
+        'errors': True,
+        'items': [
+            {'index': {'_id': 'ddr-test-123-1', '_version': 1, 'status': 201}},
+            {'index': {'_id': 'ddr-test-123-2', '_version': 2, 'status': 200}},
+            {'index': {'_id': 'ddr-test-123-3', 'status': 400,
+                       'error': 'MapperParsingException[failed to parse]'}},
+        ]
+    }
+    successful,bad = docstore._parse_bulk_response(batch, response)
+    assert successful == 2
+    assert bad == [('/tmp/c.json', 400, 'MapperParsingException[failed to parse]')]
+
+def test_split_prepped():
+    prepped = [
+        ('/tmp/a.json', 'entity', 'ddr-test-123-1', {'id':'ddr-test-123-1'}),
+        ('/tmp/b.json', 403, 'object not publishable'),
+        ('/tmp/c.json', 'entity', 'ddr-test-123-3', {'id':'ddr-test-123-3'}),
+    ]
+    bad = []
+    actions = list(docstore._split_prepped(prepped, bad))
+    assert [a[0] for a in actions] == ['/tmp/a.json', '/tmp/c.json']
+    assert bad == [('/tmp/b.json', 403, 'object not publishable')]
+
 # exists
 # get
 
@@ -287,6 +437,42 @@ def test_massage_query_results():
     assert objects0 == MASSAGE_EXPECTED0
     assert objects1 == MASSAGE_EXPECTED1
 
+def _massage_pages(results, page_size):
+    hits = results['hits']['hits']
+    for n in range(0, len(hits), page_size):
+        yield {'hits': {'total': results['hits']['total'], 'hits': hits[n:n+page_size]}}
+
+def test_massage_page():
+    results = json.loads(json.dumps(MASSAGE_QUERY_RESULTS))
+    total0,objects0 = docstore.massage_page(_massage_pages(results, 3), thispage=1, page_size=2)
+    results = json.loads(json.dumps(MASSAGE_QUERY_RESULTS))
+    total1,objects1 = docstore.massage_page(_massage_pages(results, 3), thispage=2, page_size=2)
+    assert total0 == total1 == 7
+    assert objects0 == MASSAGE_EXPECTED0[:2]
+    assert objects1 == MASSAGE_EXPECTED1[2:]
+    # stops consuming pages once the requested page is complete
+    results = json.loads(json.dumps(MASSAGE_QUERY_RESULTS))
+    pages = _massage_pages(results, 1)
+    docstore.massage_page(pages, thispage=1, page_size=2)
+    assert len(list(pages)) == 2
+
+def test_massage_query_page():
+    results = json.loads(json.dumps(MASSAGE_QUERY_RESULTS))
+    results['hits']['hits'] = results['hits']['hits'][2:4]
+    objects = docstore.massage_query_page(results, thispage=2, page_size=2)
+    assert len(objects) == 7
+    assert objects[2:4] == MASSAGE_EXPECTED1[2:]
+    assert objects[0] == {'placeholder': True, 'id': None, 'n': 0}
+    assert objects[-1] == {'placeholder': True, 'id': None, 'n': 6}
+    assert_raises(IndexError, lambda: objects[7])
+    assert len(list(objects)) == 7
+    assert_raises(
+        docstore.EmptyPage,
+        docstore.massage_query_page, results, thispage=5, page_size=2
+    )
+    empty = docstore.massage_query_page({'hits': {'total': 0, 'hits': []}}, 1, 2)
+    assert len(empty) == 0
+
 def test_clean_sort():
     data0 = 'whatever'
     data1 = [['a', 'asc'], ['b', 'asc'], 'whatever']
@@ -299,6 +485,36 @@ def test_clean_sort():
     assert docstore._clean_sort(data2) == expected2
 
 # search
+
+class FakeScrollES(object):
+    def __init__(self, hits, page_size):
+        self.pages = [hits[n:n+page_size] for n in range(0, len(hits), page_size)]
+        self.cleared = []
+    def _results(self):
+        hits = self.pages.pop(0) if self.pages else []
+        return {'_scroll_id': 'abc', 'hits': {'total': 5, 'hits': hits}}
+    def search(self, **kwargs):
+        assert kwargs['scroll']
+        return self._results()
+    def scroll(self, scroll_id, scroll):
+        return self._results()
+    def clear_scroll(self, scroll_id):
+        self.cleared.append(scroll_id)
+
+def test_search_iter():
+    hosts = [{'host':'fakehost', 'port':9999}]
+    hits = [{'_id': str(n)} for n in range(5)]
+    es = FakeScrollES(hits, 2)
+    docstore.set_connection(hosts, es)
+    assert list(docstore.search_iter(hosts, 'fakeindex', page_size=2)) == hits
+    assert es.cleared == ['abc']
+    # clears scroll context when abandoned early
+    es = FakeScrollES(hits, 2)
+    docstore.set_connection(hosts, es)
+    results = docstore.search_iter(hosts, 'fakeindex', page_size=2)
+    next(results)
+    results.close()
+    assert es.cleared == ['abc']
 # delete
 # _model_fields
 
@@ -386,9 +602,187 @@ def test_publishable_or_not():
     assert successful_paths == EXPECTED_SUCCESSFUL
     assert bad_paths == EXPECTED_BAD
 
+def test_unpublishable_parents():
+    PARENTS = {
+        'ddr-test-123': {'status': 'completed', 'public': '1'},
+        'ddr-test-123-1': {'status': 'completed', 'public': '1'},
+        'ddr-test-123-2': {'status': 'completed', 'public': '0'},
+    }
+    assert docstore._unpublishable_parents(['ddr-test-123', 'ddr-test-123-1'], PARENTS) == []
+    assert docstore._unpublishable_parents(['ddr-test-123', 'ddr-test-123-2'], PARENTS) == ['ddr-test-123-2']
+
+def test_record_action():
+    PARENTS = {
+        'ddr-test-123': {'status': 'completed', 'public': '1'},
+        'ddr-test-123-1': {'status': 'completed', 'public': '0'},
+    }
+    record = {
+        'path': '/tmp/ddr/ddr-test-123/collection.json',
+        'model': 'collection', 'id': 'ddr-test-123', 'parent_ids': [],
+        'publishable': True, 'data': {'id': 'ddr-test-123'},
+    }
+    expected0 = ('/tmp/ddr/ddr-test-123/collection.json', 'collection', 'ddr-test-123')
+    action = docstore._record_action(record, PARENTS)
+    assert action[:3] == expected0
+    assert action[3]['id'] == 'ddr-test-123'
+    assert action[3][docstore.CONTENT_HASH_FIELD] == docstore._content_hash({'id': 'ddr-test-123'})
+    record['publishable'] = False
+    expected1 = ('/tmp/ddr/ddr-test-123/collection.json', 403, 'object not publishable')
+    assert docstore._record_action(record, PARENTS) == expected1
+    record['parent_ids'] = ['ddr-test-123-1']
+    expected2 = ('/tmp/ddr/ddr-test-123/collection.json', 403, "parent unpublishable: ['ddr-test-123-1']")
+    assert docstore._record_action(record, PARENTS) == expected2
+
+def test_content_hash():
+    data0 = {'id': 'ddr-test-123', 'title': 'TITLE', 'topics': ['a', 'b']}
+    data1 = {'topics': ['a', 'b'], 'title': 'TITLE', 'id': 'ddr-test-123'}
+    hash0 = docstore._content_hash(data0)
+    assert hash0 == docstore._content_hash(data1)
+    data1[docstore.CONTENT_HASH_FIELD] = hash0
+    assert hash0 == docstore._content_hash(data1)
+    data1['title'] = 'NEW TITLE'
+    assert hash0 != docstore._content_hash(data1)
+
+class FakeMgetES(object):
+    def __init__(self, hashes):
+        self.hashes = hashes
+    def mget(self, index, body, _source_include):
+        docs = []
+        for doc in body['docs']:
+            found = doc['_id'] in self.hashes
+            d = {'_type': doc['_type'], '_id': doc['_id'], 'found': found}
+            if found:
+                d['_source'] = {_source_include: self.hashes[doc['_id']]}
+            docs.append(d)
+        return {'docs': docs}
+
+def test_skip_unchanged():
+    hosts = [{'host':'fakehost', 'port':9999}]
+    actions = []
+    for n in range(5):
+        data = {'id': 'ddr-test-123-%s' % n, 'title': 'TITLE'}
+        data[docstore.CONTENT_HASH_FIELD] = docstore._content_hash(data)
+        actions.append(('/tmp/%s.json' % n, 'entity', data['id'], data))
+    hashes = {
+        'ddr-test-123-0': actions[0][3][docstore.CONTENT_HASH_FIELD],
+        'ddr-test-123-1': 'outofdate',
+        'ddr-test-123-3': actions[3][3][docstore.CONTENT_HASH_FIELD],
+    }
+    docstore.set_connection(hosts, FakeMgetES(hashes))
+    skipped = []
+    changed = list(docstore._skip_unchanged(hosts, 'fakeindex', actions, skipped, chunk_size=2))
+    assert [a[0] for a in changed] == ['/tmp/1.json', '/tmp/2.json', '/tmp/4.json']
+    assert skipped == ['/tmp/0.json', '/tmp/3.json']
+
+def test_batches():
+    assert list(docstore._batches([1,2,3,4,5], 2)) == [[1,2], [3,4], [5]]
+    assert list(docstore._batches([], 2)) == []
+    assert list(docstore._batches(iter([1,2,3]), 2)) == [[1,2], [3]]
+
+INCREMENTAL_PATHS = [
+    '/tmp/ddr/ddr-test-123/files/ddr-test-123-1/files/ddr-test-123-1-master-96c.json',
+    '/tmp/ddr/ddr-test-123/files/ddr-test-123-2/files/ddr-test-123-2-master-c46.json',
+    '/tmp/ddr/ddr-test-123/files/ddr-test-123-1/entity.json',
+    '/tmp/ddr/ddr-test-123/files/ddr-test-123-2/entity.json',
+    '/tmp/ddr/ddr-test-123/collection.json',
+]
+
+def test_incremental_paths():
+    basepath = '/tmp/ddr/ddr-test-123'
+    # changed file: file, its entity, and the collection (signatures)
+    changed0 = ['files/ddr-test-123-2/files/ddr-test-123-2-master-c46.json']
+    expected0 = [
+        '/tmp/ddr/ddr-test-123/files/ddr-test-123-2/files/ddr-test-123-2-master-c46.json',
+        '/tmp/ddr/ddr-test-123/files/ddr-test-123-2/entity.json',
+        '/tmp/ddr/ddr-test-123/collection.json',
+    ]
+    assert docstore._incremental_paths(INCREMENTAL_PATHS, basepath, changed0) == expected0
+    # changed entity: entity and its files
+    changed1 = ['files/ddr-test-123-1/entity.json']
+    expected1 = [
+        '/tmp/ddr/ddr-test-123/files/ddr-test-123-1/files/ddr-test-123-1-master-96c.json',
+        '/tmp/ddr/ddr-test-123/files/ddr-test-123-1/entity.json',
+        '/tmp/ddr/ddr-test-123/collection.json',
+    ]
+    assert docstore._incremental_paths(INCREMENTAL_PATHS, basepath, changed1) == expected1
+    # new access file
+    changed2 = ['files/ddr-test-123-1/files/ddr-test-123-1-master-96c-a.jpg']
+    expected2 = [
+        '/tmp/ddr/ddr-test-123/files/ddr-test-123-1/entity.json',
+        '/tmp/ddr/ddr-test-123/collection.json',
+    ]
+    assert docstore._incremental_paths(INCREMENTAL_PATHS, basepath, changed2) == expected2
+    # changed collection: everything
+    changed3 = ['collection.json']
+    assert docstore._incremental_paths(INCREMENTAL_PATHS, basepath, changed3) == INCREMENTAL_PATHS
+    assert docstore._incremental_paths(INCREMENTAL_PATHS, basepath, []) == []
+
 # _has_access_file
-# _store_signature_file
-# _choose_signatures
+
+def test_store_signature():
+    signatures = {}
+    docstore._store_signature(signatures, 'ddr-test-123', 'ddr-test-123-10-master-a1')
+    docstore._store_signature(signatures, 'ddr-test-123', 'ddr-test-123-2-master-b2')
+    docstore._store_signature(signatures, 'ddr-test-123', 'ddr-test-123-11-master-c3')
+    docstore._store_signature(signatures, 'ddr-test-123', 'ddr-test-123-2-mezzanine-d4')
+    assert docstore._signature_files(signatures) == {'ddr-test-123': 'ddr-test-123-2-mezzanine-d4'}
+
+SIGNATURES_BASE = '/tmp/test-ddr-docstore-signatures'
+SIGNATURES_FILES = [
+    # (file json, has access file)
+    ('ddr-test-123/files/ddr-test-123-1/files/ddr-test-123-1-master-a1.json', True),
+    ('ddr-test-123/files/ddr-test-123-1/files/ddr-test-123-1-mezzanine-b2.json', True),
+    ('ddr-test-123/files/ddr-test-123-10/files/ddr-test-123-10-master-c3.json', True),
+    ('ddr-test-123/files/ddr-test-123-2/files/ddr-test-123-2-master-d4.json', False),
+    ('ddr-test-123/files/ddr-test-123-2/files/ddr-test-123-2-master-e5.json', True),
+]
+
+def test_choose_signatures():
+    if os.path.exists(SIGNATURES_BASE):
+        shutil.rmtree(SIGNATURES_BASE)
+    paths = []
+    for path_rel,access in SIGNATURES_FILES:
+        path = os.path.join(SIGNATURES_BASE, path_rel)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write('[]')
+        if access:
+            access_path = identifier.Identifier(path=path).path_abs('access')
+            with open(access_path, 'w') as f:
+                f.write('')
+        paths.append(path)
+    parents = {
+        'ddr-test-123': {'public': '1', 'status': 'completed'},
+        'ddr-test-123-1': {'public': '0', 'status': 'completed'},
+    }
+    expected = {
+        'ddr-test-123': 'ddr-test-123-2-master-e5',
+        'ddr-test-123-2': 'ddr-test-123-2-master-e5',
+        'ddr-test-123-10': 'ddr-test-123-10-master-c3',
+    }
+    signature_files,cache = docstore._choose_signatures(paths, parents)
+    assert signature_files == expected
+    # mezzanine wins once entity is public
+    access_path = identifier.Identifier(path=paths[1]).path_abs('access')
+    dirname = os.path.dirname(access_path)
+    mtime = int(os.path.getmtime(dirname)) - 100
+    os.utime(dirname, (mtime, mtime))
+    parents['ddr-test-123-1']['public'] = '1'
+    signature_files,cache = docstore._choose_signatures(paths, parents, cache)
+    assert signature_files['ddr-test-123'] == 'ddr-test-123-1-mezzanine-b2'
+    # cached picks are reused until the directory changes
+    os.remove(access_path)
+    os.utime(dirname, (mtime, mtime))
+    signature_files,cache = docstore._choose_signatures(paths, parents, cache)
+    assert signature_files['ddr-test-123'] == 'ddr-test-123-1-mezzanine-b2'
+    os.utime(dirname, (mtime + 10, mtime + 10))
+    signature_files,cache = docstore._choose_signatures(paths, parents, cache)
+    assert signature_files['ddr-test-123'] == 'ddr-test-123-1-master-a1'
+    signature_files,cache = docstore._choose_signatures(paths, parents)
+    assert signature_files['ddr-test-123'] == 'ddr-test-123-1-master-a1'
+    shutil.rmtree(SIGNATURES_BASE)
+
 # load_document_json
 
 def test_indexer():
@@ -397,3 +791,73 @@ def test_indexer():
     results = docstore.index(hosts, index, '/tmp', recursive=True, public=True)
     assert results == {'successful': 0, 'bad': [], 'total': 0}
                        
+# find_meta_files skips paths containing 'tmp'
+WORKERS_BASE = os.path.join(os.path.expanduser('~'), 'test-ddr-docstore-workers')
+WORKERS_FILES = [
+    ('ddr-test-123/collection.json', '[{"id": "ddr-test-123"}, {"public": 1}, {"status": "completed"}]'),
+    ('ddr-test-123/files/ddr-test-123-1/entity.json', '[{"id": "ddr-test-123-1"}, {"public": 1}, {"status": "completed"}]'),
+    ('ddr-test-123/files/ddr-test-123-1/files/ddr-test-123-1-master-a1.json', '[{"public": 1}]'),
+    ('ddr-test-123/files/ddr-test-123-2/entity.json', '[{"id": "ddr-test-123-2"}, {"public": 0}, {"status": "completed"}]'),
+    ('ddr-test-123/files/ddr-test-123-2/files/ddr-test-123-2-master-b2.json', '[{"public": 1}]'),
+]
+
+def test_index_workers():
+    hosts = [{'host':'fakehost', 'port':9999}]
+    docstore.set_connection(hosts, FakeFacetES())
+    if os.path.exists(WORKERS_BASE):
+        shutil.rmtree(WORKERS_BASE)
+    for path_rel,text in WORKERS_FILES:
+        path = os.path.join(WORKERS_BASE, path_rel)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+    collection_path = os.path.join(WORKERS_BASE, 'ddr-test-123')
+    try:
+        serial = docstore.index(hosts, 'fakeindex', collection_path, recursive=True, public=False)
+        parallel = docstore.index(hosts, 'fakeindex', collection_path, recursive=True, public=False, workers=2)
+        assert serial['total'] == parallel['total'] == 5
+        assert serial['successful'] == parallel['successful'] == 3
+        assert sorted(serial['bad']) == sorted(parallel['bad'])
+        assert len(serial['bad']) == 2
+        # a malformed file stops both
+        with open(os.path.join(WORKERS_BASE, WORKERS_FILES[2][0]), 'w') as f:
+            f.write('[{')
+        for workers in [1, 2]:
+            assert_raises(
+                ValueError,
+                docstore.index, hosts, 'fakeindex', collection_path,
+                recursive=True, public=False, workers=workers
+            )
+    finally:
+        shutil.rmtree(WORKERS_BASE)
+
+
+def test_generation_name():
+    timestamp = datetime(2015, 1, 2, 3, 4, 5)
+    assert docstore.generation_name('ddrpublic', timestamp) == 'ddrpublic-20150102030405'
+    assert docstore.generation_name('DDR Public', timestamp) == 'ddrpublic-20150102030405'
+
+def test_generations():
+    names = [
+        'ddrpublic-20150102030405',
+        'ddrpublic',
+        'ddrpublic-dev',
+        'ddrpublic-20140102030405',
+        'ddrpublic-dev-20140102030405',
+        'other-20150102030405',
+    ]
+    expected = ['ddrpublic-20140102030405', 'ddrpublic-20150102030405']
+    assert docstore._generations(names, 'ddrpublic') == expected
+
+def test_swap_alias_actions():
+    expected0 = {'actions': [
+        {'remove': {'index': 'ddr-1', 'alias': 'ddr'}},
+        {'add': {'index': 'ddr-2', 'alias': 'ddr'}},
+    ]}
+    expected1 = {'actions': [
+        {'add': {'index': 'ddr-2', 'alias': 'ddr'}},
+    ]}
+    assert docstore._swap_alias_actions('ddr', 'ddr-2', ['ddr-1']) == expected0
+    assert docstore._swap_alias_actions('ddr', 'ddr-2', []) == expected1
+    assert docstore._swap_alias_actions('ddr', 'ddr-2', ['ddr-2']) == expected1
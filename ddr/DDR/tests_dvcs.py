@@ -90,6 +90,35 @@ def test_latest_commit():
     assert re.match(regex, out1)
     assert re.match(regex, out2)
 
+def test_head_fingerprint():
+    basedir = '/tmp/test-ddr-dvcs'
+    path = os.path.join(basedir, 'testheadfingerprint')
+    # rm existing
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    assert dvcs.git_dir(basedir) == None
+    assert dvcs.head_fingerprint(basedir) == None
+    # set up repos
+    repo = make_repo(path, ['testing'])
+    path_to_file = os.path.join(path, 'testing')
+    assert dvcs.git_dir(path_to_file) == os.path.join(path, '.git')
+    fp1 = dvcs.head_fingerprint(path)
+    assert fp1 == dvcs.head_fingerprint(path_to_file)
+    # changes when HEAD moves
+    with open(path_to_file, 'w') as f:
+        f.write('testing')
+    repo.index.add(['testing'])
+    repo.index.commit('second commit')
+    fp2 = dvcs.head_fingerprint(path)
+    assert fp2 != fp1
+    assert fp2[2] == repo.head.commit.hexsha
+    # annex.version
+    assert dvcs.annex_repo_version(path) == None
+    with open(os.path.join(path, '.git', 'config'), 'a') as f:
+        f.write('[annex]\n\tuuid = 12345\n\tversion = 5\n')
+    assert dvcs.annex_repo_version(path) == '5'
+    cleanup_repo(path)
+
 def test_parse_cmp_commits():
     log = '\n'.join(['e3bde9b', '8adad36', 'c63ec7c', 'eefe033', 'b10b4cd'])
     A = '8adad36'
@@ -365,6 +394,38 @@ SAMPLE_CONFLICTED_0_EXPECTED = [
     'path/to/conflicted_file/03',
 ]
 SAMPLE_CONFLICTED_1_EXPECTED = []
+def test_parse_diff_name_status():
+    diff = '\n'.join([
+        'M\tcollection.json',
+        'A\tfiles/ddr-test-123-2/entity.json',
+        'D\tfiles/ddr-test-123-1/entity.json',
+        'R087\tfiles/ddr-test-123-3/a.json\tfiles/ddr-test-123-3/b.json',
+    ])
+    expected = {
+        'added': ['files/ddr-test-123-2/entity.json', 'files/ddr-test-123-3/b.json'],
+        'modified': ['collection.json'],
+        'deleted': ['files/ddr-test-123-1/entity.json', 'files/ddr-test-123-3/a.json'],
+    }
+    assert dvcs._parse_diff_name_status(diff) == expected
+    assert dvcs._parse_diff_name_status('') == {'added': [], 'modified': [], 'deleted': []}
+
+def test_diff_name_status():
+    path = '/tmp/test-ddr-dvcs/testdiffnamestatus'
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    repo = make_repo(path, ['a', 'b'])
+    first = repo.head.commit.hexsha
+    with open(os.path.join(path, 'a'), 'w') as f:
+        f.write('changed')
+    open(os.path.join(path, 'c'), 'w').close()
+    repo.index.add(['a', 'c'])
+    repo.index.remove(['b'], working_tree=True)
+    repo.index.commit('second commit')
+    changes = dvcs.diff_name_status(repo, first)
+    assert changes == {'added': ['c'], 'modified': ['a'], 'deleted': ['b']}
+    assert dvcs.is_ancestor(repo, first) == True
+    assert dvcs.is_ancestor(repo, '0123456789abcdef0123456789abcdef01234567') == False
+
 def test_parse_list_conflicted():
     assert dvcs._parse_list_conflicted(SAMPLE_CONFLICTED_0) == SAMPLE_CONFLICTED_0_EXPECTED
     assert dvcs._parse_list_conflicted(SAMPLE_CONFLICTED_1) == SAMPLE_CONFLICTED_1_EXPECTED
@@ -3,6 +3,7 @@
 from datetime import datetime
 import json
 import os
+import pickle
 
 from nose.tools import assert_raises
 
@@ -19,6 +20,23 @@ BASE_PATHS = [
 
 # TODO test_compile_patterns
 
+def test_compile_dispatcher():
+    patterns = (
+        (r'^(?P<repo>[\w]+)-(?P<org>[\w]+)-(?P<cid>[\d]+)-(?P<eid>[\d]+)$', 'entity-rel', 'entity'),
+        (r'^(?P<repo>[\w]+)-(?P<org>[\w]+)-(?P<cid>[\d]+)$', 'collection-rel', 'collection'),
+    )
+    dispatcher = identifier.compile_dispatcher(patterns)
+    assert len(dispatcher) == 1
+    # chunked to stay under group limit
+    assert len(identifier.compile_dispatcher(patterns, max_groups=6)) == 2
+    # backreferences can't be combined
+    assert identifier.compile_dispatcher([(r'(?P<a>x)(?P=a)', '', 'x')]) == None
+    for text in ['ddr-test-123', 'ddr-test-123-456', 'ddr.test.123.456']:
+        assert identifier.identify_object(text, patterns) \
+            == identifier._identify_object_loop(text, patterns)
+    for patterns in [identifier.ID_PATTERNS, identifier.PATH_PATTERNS, identifier.URL_PATTERNS]:
+        assert identifier._dispatcher(patterns) != None
+
 def test_identify_object():
     patterns = (
         (r'^(?P<repo>[\w]+)-(?P<org>[\w]+)-(?P<cid>[\d]+)-(?P<eid>[\d]+)$', 'entity-rel', 'entity'),
@@ -55,6 +73,75 @@ def test_set_idparts():
     assert i.parts['role'] == 'master'
     assert i.parts['sha1'] == 'abcde12345'
 
+def test_parse_cache():
+    identifier.configure_parse_cache(100)
+    i0 = identifier.Identifier(id='ddr-test-123-456', base_path='/tmp')
+    i1 = identifier.Identifier(id='ddr-test-123-456', base_path='/tmp')
+    stats = identifier.parse_cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['size'] == 1
+    assert i1.id == i0.id
+    assert i1.basepath == i0.basepath == '/tmp'
+    assert i1.parts == i0.parts
+    # parts are not shared between instances
+    assert i1.parts is not i0.parts
+    i1.parts['eid'] = 789
+    assert identifier.Identifier(id='ddr-test-123-456').parts['eid'] == 456
+    # base_path is part of the key
+    assert identifier.Identifier(id='ddr-test-123-456').basepath == None
+    # opt-out
+    identifier.Identifier(id='ddr-test-123-457', cache=False)
+    assert identifier.parse_cache_stats()['size'] == 2
+    # malformed input is not cached
+    assert_raises(
+        identifier.MalformedIDException,
+        identifier.Identifier, id='ddr.test.123.456'
+    )
+    assert identifier.parse_cache_stats()['size'] == 2
+    # size 0 disables
+    identifier.configure_parse_cache(0)
+    identifier.Identifier(id='ddr-test-123-456')
+    assert identifier.parse_cache_stats()['size'] == 0
+    identifier.configure_parse_cache()
+
+def test_identifier_slots():
+    i0 = identifier.Identifier(id='ddr-test-123-456', base_path='/tmp')
+    i1 = identifier.Identifier(id='ddr-test-123-456', base_path='/tmp', cache=False)
+    i2 = identifier.Identifier(id='ddr-test-123-457', base_path='/tmp')
+    assert_raises(AttributeError, setattr, i0, 'foo', 'bar')
+    assert i0 == i1
+    assert i0 != i2
+    assert hash(i0) == hash(i1)
+    assert len(set([i0, i1, i2])) == 2
+    # components share keys and interned values
+    assert i0._keys is i2._keys
+    assert i0._values[1] is i2._values[1]
+    assert pickle.loads(pickle.dumps(i0, 2)) == i0
+    assert pickle.loads(pickle.dumps(i0, 2)).parts == i0.parts
+    i3 = identifier.Identifier()
+    assert i3.id == None
+    assert i3.parts == {}
+
+def test_compile_template():
+    kwargs = {'repo':'ddr', 'org':'test', 'cid':123}
+    for template in ['{repo}-{org}-{cid}', '{repo}/{org}/{cid:05d}', '100%-{{cid}}-{cid}']:
+        assert identifier.compile_template(template)(kwargs) == template.format(**kwargs)
+    assert_raises(KeyError, identifier.compile_template('{repo}-{eid}'), kwargs)
+
+def test_identifier_cached():
+    i = identifier.Identifier(id='ddr-test-123-456', base_path='/tmp')
+    assert i.parent_id() == i.parent_id() == 'ddr-test-123'
+    assert i.collection_id() == 'ddr-test-123'
+    lineage = i.lineage()
+    lineage.append('whatever')
+    assert [x.id for x in i.lineage()] == [x.id for x in lineage[:-1]]
+    assert i.path_abs() == '/tmp/ddr-test-123/files/ddr-test-123-456'
+    # basepath changes are picked up
+    i.basepath = '/var/www'
+    assert i.path_abs() == '/var/www/ddr-test-123/files/ddr-test-123-456'
+    assert i.lineage()[1].basepath == '/var/www'
+
 def test_format_id():
     templates = {
         'entity':       '{repo}-{org}-{cid}-{eid}',
@@ -207,6 +294,29 @@ def test_identifier_max_id():
     expected1 = 3
     assert out1 == expected1
 
+def test_identifier_id_gaps():
+    assert identifier.id_gaps([1, 2, 5, 6, 9]) == [(3, 4), (7, 8)]
+    assert identifier.id_gaps([1, 2, 3]) == []
+    assert identifier.id_gaps([]) == []
+
+def test_identifier_add_ids():
+    identifiers = [
+        identifier.Identifier('ddr-testing-123-%s' % n)
+        for n in [1, 2, 3, 5, 8, 9, 12]
+    ]
+    out0 = identifier.add_ids(3, 'entity', identifiers)
+    assert out0['max_id'] == 13
+    assert out0['new'] == [14, 15, 16]
+    assert out0['success'] == True
+    out1 = identifier.add_ids(5, 'entity', identifiers, startwith=2)
+    assert out1['new'] == [2, 3, 4, 5, 6]
+    assert out1['taken'] == [2, 3, 5]
+    assert out1['success'] == False
+    out2 = identifier.add_ids(5, 'entity', identifiers, startwith=2, skip_taken=True)
+    assert out2['new'] == [4, 6, 7, 10, 11]
+    assert out2['taken'] == []
+    assert out2['success'] == True
+
 def test_identifier_available():
     assert False
 
@@ -508,6 +618,37 @@ def test_entity_from_path():
         assert i0.model    == i1.model    == i2.model    == ENTITY_MODEL
         assert i0.basepath == i1.basepath == i2.basepath == base_path
 
+def test_parse_batch():
+    paths = [
+        '/tmp/ddr-test-123/collection.json',
+        '/tmp/ddr-test-123/files/ddr-test-123-456/entity.json',
+        '/tmp/ddr-test-123/files/ddr-test-123-457/entity.json',
+        '/tmp/ddr-test-123/files/ddr-test-123-456/entity.json',
+    ]
+    batch = identifier.parse_batch(paths)
+    assert batch.keys() == identifier.BATCH_COLUMNS + ['errors']
+    assert batch['id'] == [
+        'ddr-test-123', 'ddr-test-123-456', 'ddr-test-123-457', 'ddr-test-123-456'
+    ]
+    assert batch['model'] == ['collection', 'entity', 'entity', 'entity']
+    assert batch['basepath'] == ['/tmp'] * 4
+    assert batch['values'][1] == ('ddr', 'test', 123, 456)
+    assert batch['errors'] == []
+    identifiers = identifier.batch_identifiers(batch)
+    assert identifiers == [identifier.Identifier(path=path) for path in paths]
+    assert identifiers[1].parts == identifier.Identifier(path=paths[1]).parts
+    # malformed
+    assert_raises(
+        identifier.MalformedPathException,
+        identifier.parse_batch, paths + ['/tmp/not-a-path']
+    )
+    batch = identifier.parse_batch(paths + ['/tmp/not-a-path'], strict=False)
+    assert len(batch['id']) == 4
+    assert batch['errors'][0][0] == '/tmp/not-a-path'
+    # IDs
+    batch = identifier.parse_batch(['ddr-test-123', 'ddr-test-123-456'], method='id')
+    assert batch['model'] == ['collection', 'entity']
+
 # TODO test_filerole_from_path
 
 def test_file_from_path():
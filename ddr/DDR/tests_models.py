@@ -91,6 +91,34 @@ def test_load_json():
     assert document.title == 'TITLE'
     assert document.description == 'DESCRIPTION'
 
+def test_load_json_lazy():
+    class Document(object):
+        id = None
+        _field_loaders = {'status': lambda x: x + 1}
+        def __getattr__(self, name):
+            return models.materialize(self, name)
+    
+    document = Document()
+    module = TestModule()
+    models.load_json(document, module, TEST_DOCUMENT, lazy=True)
+    # existing attributes are set right away
+    assert document.__dict__['id'] == 'ddr-test-123'
+    assert sorted(document._lazy_fields.keys()) == [
+        'description', 'status', 'timestamp', 'title'
+    ]
+    assert document.title == 'TITLE'
+    assert document.__dict__['title'] == 'TITLE'
+    assert 'title' not in document._lazy_fields
+    assert document.status == 2
+    models.materialize_all(document)
+    assert not hasattr(document, '_lazy_fields')
+    assert document.__dict__['description'] == 'DESCRIPTION'
+    assert not hasattr(document, 'nonexistent')
+    # loaders also apply when not lazy
+    document = Document()
+    models.load_json(document, module, TEST_DOCUMENT)
+    assert document.__dict__['status'] == 2
+
 # TODO prep_json
 # TODO from_json
 # TODO load_xml
@@ -2,6 +2,8 @@ from datetime import datetime
 import os
 import shutil
 
+from nose.tools import assert_raises
+
 import util
 
 
@@ -87,6 +89,151 @@ def test_find_meta_files():
     assert paths5 == META_ALL
 
 
+def test_find_meta_files_cache():
+    basedir = '/tmp/DDR_test_utils_cache'
+    if os.path.exists(basedir):
+        shutil.rmtree(basedir, ignore_errors=1)
+    sampledir = os.path.join(basedir, 'ddr-test-123')
+    for d in SAMPLE_DIRS:
+        os.makedirs(os.path.join(sampledir, d))
+    for fn in SAMPLE_FILES:
+        with open(os.path.join(sampledir, fn), 'w') as f:
+            f.write('testing')
+    # age directories so their mtimes are trusted
+    def age(seconds=3600):
+        for root,dirs,files in os.walk(sampledir):
+            mtime = os.stat(root).st_mtime - seconds
+            os.utime(root, (mtime, mtime))
+    age()
+    def clean(paths):
+        base = '%s/' % sampledir
+        return sorted([path.replace(base, '') for path in paths])
+    
+    cache_path = os.path.join(sampledir, util.META_FILES_CACHE)
+    assert clean(util.find_meta_files(sampledir, recursive=True, testing=1)) == META_ALL
+    assert os.path.exists(cache_path)
+    assert util.load_meta_files_cache(sampledir)['dirs']['.'][2] == ['collection.json']
+    
+    # unchanged directories are not listed again
+    listed = []
+    list_dir = util._list_dir
+    def counting_list_dir(path):
+        listed.append(path)
+        return list_dir(path)
+    util._list_dir = counting_list_dir
+    try:
+        assert clean(util.find_meta_files(sampledir, recursive=True, testing=1)) == META_ALL
+        assert listed == []
+        # added and removed files are noticed
+        new = os.path.join(sampledir, 'files/ddr-test-123-2/files/ddr-test-123-2-mezzanine-def456.json')
+        with open(new, 'w') as f:
+            f.write('testing')
+        os.remove(os.path.join(sampledir, 'files/ddr-test-123-1/entity.json'))
+        paths = clean(util.find_meta_files(sampledir, recursive=True, testing=1))
+        assert 'files/ddr-test-123-2/files/ddr-test-123-2-mezzanine-def456.json' in paths
+        assert 'files/ddr-test-123-1/entity.json' not in paths
+        assert len(listed) == 2
+        # force_read lists everything
+        del listed[:]
+        util.find_meta_files(sampledir, recursive=True, force_read=True, testing=1)
+        assert len(listed) == len(SAMPLE_DIRS) - 1 + 1  # minus .git, plus root
+    finally:
+        util._list_dir = list_dir
+    # corrupt cache is ignored
+    with open(cache_path, 'w') as f:
+        f.write('collection.json')
+    assert len(util.find_meta_files(sampledir, recursive=True, testing=1)) == 4
+
+def test_list_dir():
+    basedir = '/tmp/DDR_test_utils_list_dir'
+    if os.path.exists(basedir):
+        shutil.rmtree(basedir, ignore_errors=1)
+    for d in ['.git', 'files', 'dotted.dir']:
+        os.makedirs(os.path.join(basedir, d))
+    for f in ['entity.json', 'binary.jpg']:
+        open(os.path.join(basedir, f), 'w').close()
+    os.symlink(os.path.join(basedir, 'files'), os.path.join(basedir, 'link'))
+    scandir = util.scandir
+    try:
+        # same results with and without scandir
+        for util.scandir in set([scandir, None]):
+            dirs,files = util._list_dir(basedir)
+            assert sorted(dirs) == ['dotted.dir', 'files']
+            assert files == ['entity.json']
+    finally:
+        util.scandir = scandir
+    shutil.rmtree(basedir, ignore_errors=1)
+
+def test_walk_meta_files():
+    basedir = '/tmp/DDR_test_utils_walk'
+    if os.path.exists(basedir):
+        shutil.rmtree(basedir, ignore_errors=1)
+    sampledir = os.path.join(basedir, 'ddr-test-123')
+    for d in SAMPLE_DIRS:
+        os.makedirs(os.path.join(sampledir, d))
+    for fn in SAMPLE_FILES:
+        with open(os.path.join(sampledir, fn), 'w') as f:
+            f.write('testing')
+    def clean(paths):
+        base = '%s/' % sampledir
+        return sorted([path.replace(base, '') for path in paths])
+    walker = util.walk_meta_files(sampledir)
+    assert not isinstance(walker, list)
+    assert clean(walker) == META_ALL
+    # entity dirs are two levels down; their files/ dirs are never entered
+    listed = []
+    list_dir = util._list_dir
+    def counting_list_dir(path):
+        listed.append(path)
+        return list_dir(path)
+    util._list_dir = counting_list_dir
+    try:
+        paths = clean(util.walk_meta_files(sampledir, max_depth=2, force_read=True))
+    finally:
+        util._list_dir = list_dir
+    assert paths == META_MODEL['collection'] + META_MODEL['entity']
+    assert os.path.join(sampledir, 'files/ddr-test-123-2/files') not in listed
+    # pruned listings stay in the cache
+    dirs = util.load_meta_files_cache(sampledir)['dirs']
+    assert 'files/ddr-test-123-2/files' in dirs
+    assert isinstance(dirs.keys()[0], str)
+    assert clean(util.walk_meta_files(sampledir, max_depth=0)) == META_MODEL['collection']
+
+def test_discover_meta_files():
+    basedir = '/tmp/DDR_test_utils_discover'
+    if os.path.exists(basedir):
+        shutil.rmtree(basedir, ignore_errors=1)
+    cids = ['ddr-test-123', 'ddr-test-124', 'ddr-test-125']
+    for cid in cids:
+        sampledir = os.path.join(basedir, cid)
+        for d in SAMPLE_DIRS:
+            os.makedirs(os.path.join(sampledir, d))
+        for fn in SAMPLE_FILES:
+            with open(os.path.join(sampledir, fn), 'w') as f:
+                f.write('testing')
+    os.makedirs(os.path.join(basedir, 'not-a-repo'))
+    assert util.repo_dirs(basedir) == [os.path.join(basedir, cid) for cid in cids]
+    
+    found = list(util.discover_meta_files(basedir, threads=2, testing=1))
+    assert len(found) == len(cids) * len(META_ALL)
+    for cid in cids:
+        paths = sorted([
+            path.replace('%s/' % os.path.join(basedir, cid), '')
+            for c,path,model in found if c == cid
+        ])
+        assert paths == META_ALL
+    assert sorted(set([model for cid,path,model in found])) == ['collection', 'entity', 'file']
+    
+    entities = list(util.discover_meta_files(
+        [os.path.join(basedir, cid) for cid in cids[:2]], model='entity', testing=1
+    ))
+    assert len(entities) == 4
+    assert set([model for cid,path,model in entities]) == set(['entity'])
+    
+    # stopping early doesn't hang
+    for item in util.discover_meta_files(basedir, threads=3, testing=1):
+        break
+
 def test_natural_sort():
     l = ['11', '1', '12', '2', '13', '3']
     util.natural_sort(l)
@@ -110,6 +257,106 @@ def test_file_hash():
     assert util.file_hash(path, 'md5') == md5
     os.remove(path)
 
+def test_file_hashes():
+    path = '/tmp/test-hashes-%s' % datetime.now().strftime('%Y%m%dT%H%M%S')
+    with open(path, 'w') as f:
+        f.write('hash' * 1000)
+    hashes = util.file_hashes(path)
+    assert sorted(hashes.keys()) == ['md5', 'sha1', 'sha256']
+    # small buffer: many reads give the same result
+    assert util.file_hashes(path, buffer_size=7) == hashes
+    for algo in hashes.keys():
+        assert hashes[algo] == util.file_hash(path, algo)
+    assert util.file_hashes(path, ['md5']).keys() == ['md5']
+    # empty file
+    with open(path, 'w') as f:
+        pass
+    assert util.file_hashes(path, ['md5'])['md5'] == 'd41d8cd98f00b204e9800998ecf8427e'
+    os.remove(path)
+
+def test_checksum_cache():
+    basedir = '/tmp/DDR_test_utils_checksums'
+    if os.path.exists(basedir):
+        shutil.rmtree(basedir, ignore_errors=1)
+    os.makedirs(os.path.join(basedir, '.git'))
+    os.makedirs(os.path.join(basedir, 'files'))
+    path = os.path.join(basedir, 'files', 'binary')
+    with open(path, 'w') as f:
+        f.write('hash')
+    # too recent to cache
+    md5 = util.file_hash(path, 'md5', repo_path=basedir)
+    assert md5 == '0800fc577294c34e0b28ad2839435945'
+    assert not os.path.exists(os.path.join(basedir, util.CHECKSUM_CACHE_PATH))
+    mtime = os.stat(path).st_mtime - 3600
+    os.utime(path, (mtime, mtime))
+    # no repo_path, no cache
+    assert util.file_hash(path, 'md5') == md5
+    assert not os.path.exists(os.path.join(basedir, util.CHECKSUM_CACHE_PATH))
+    
+    stats0 = util.checksum_cache_stats()
+    assert util.file_hash(path, 'md5', repo_path=basedir) == md5
+    assert os.path.exists(os.path.join(basedir, util.CHECKSUM_CACHE_PATH))
+    stats1 = util.checksum_cache_stats()
+    assert stats1['misses'] == stats0['misses'] + 1
+    # all algorithms were cached
+    assert util.file_hash(path, 'sha1', repo_path=basedir) == '2346ad27d7568ba9896f1b7da6b5991251debdf2'
+    assert util.file_hashes(path, repo_path=basedir)['sha256'] == \
+        'd04b98f48e8f8bcc15c6ae5ac050801cd6dcfd428fb5f9e65c4e16e7807340fa'
+    stats2 = util.checksum_cache_stats()
+    assert stats2['hits'] == stats1['hits'] + 2
+    # verify reads the file
+    assert util.file_hash(path, 'md5', verify=True, repo_path=basedir) == md5
+    assert util.checksum_cache_stats()['hits'] == stats2['hits']
+    # files outside the repository are not cached
+    outside = os.path.join(os.path.dirname(basedir), 'DDR_test_utils_checksums_src')
+    shutil.copy(path, outside)
+    os.utime(outside, (mtime, mtime))
+    assert util.file_hash(outside, 'md5', repo_path=basedir) == md5
+    assert util.checksum_cache_stats()['misses'] == stats1['misses']
+    os.remove(outside)
+    # changed file is read again
+    with open(path, 'w') as f:
+        f.write('hash!')
+    mtime = os.stat(path).st_mtime - 3600
+    os.utime(path, (mtime, mtime))
+    assert util.file_hash(path, 'md5', repo_path=basedir) != md5
+    shutil.rmtree(basedir, ignore_errors=1)
+
+def test_hash_files():
+    basedir = '/tmp/DDR_test_utils_hash_files'
+    if os.path.exists(basedir):
+        shutil.rmtree(basedir, ignore_errors=1)
+    os.makedirs(basedir)
+    paths = []
+    for n in range(10):
+        path = os.path.join(basedir, 'file%s' % (9 - n))
+        with open(path, 'w') as f:
+            f.write('hash' * n)
+        paths.append(path)
+    missing = os.path.join(basedir, 'missing')
+    calls = []
+    hashes,errors = util.hash_files(
+        paths + [missing], ['md5', 'sha256'], max_threads=3,
+        callback=calls.append)
+    # results in input order
+    assert hashes.keys() == paths
+    for path in paths:
+        assert hashes[path] == util.file_hashes(path, ['md5', 'sha256'])
+    assert [path for path,err in errors] == [missing]
+    assert len(calls) == len(paths)
+    assert calls[-1]['files'] == calls[-1]['total_files'] == len(paths)
+    assert calls[-1]['bytes'] == calls[-1]['total_bytes'] == 4 * sum(range(10))
+    # unexpected errors are reported, not lost
+    hashes,errors = util.hash_files(paths, ['nosuchalgorithm'])
+    assert not hashes
+    assert sorted([path for path,err in errors]) == sorted(paths)
+    # exceptions from callback are raised
+    def callback(info):
+        if info['files'] == 2:
+            raise ValueError('callback')
+    assert_raises(ValueError, util.hash_files, paths, callback=callback)
+    shutil.rmtree(basedir, ignore_errors=1)
+
 def test_normalize_text():
     assert util.normalize_text('  this is a test') == 'this is a test'
     assert util.normalize_text('this is a test  ') == 'this is a test'
@@ -118,3 +365,23 @@ def test_normalize_text():
     assert util.normalize_text('this\\nis a test') == 'this\\nis a test'
     assert util.normalize_text(['this is a test']) == ['this is a test']
     assert util.normalize_text({'this': 'is a test'}) == {'this': 'is a test'}
+
+def test_lrucache():
+    c = util.LRUCache(2)
+    c.set('a', 1)
+    c.set('b', 2)
+    assert c.get('a') == 1
+    c.set('c', 3)
+    assert 'b' not in c
+    assert c.get('b') == None
+    assert c.get('a') == 1
+    assert c.get('c') == 3
+    assert len(c) == 2
+    assert c.stats() == {'hits': 3, 'misses': 1, 'size': 2, 'maxsize': 2}
+    assert c.pop('a') == 1
+    c.clear()
+    assert len(c) == 0
+    assert c.stats()['hits'] == 0
+    disabled = util.LRUCache(0)
+    disabled.set('a', 1)
+    assert disabled.get('a') == None
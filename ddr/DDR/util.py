@@ -1,22 +1,272 @@
+from collections import OrderedDict
 import hashlib
+import io
+import json
 import os
+import Queue
 import re
+import sqlite3
+import sys
+import threading
+import time
 
+# scandir: os.scandir (Python 3.5+) or the scandir backport (requirements)
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+# Per-directory listing cache for find_meta_files, inside the repo's .git
+# so it never shows up in the working tree.
+META_FILES_CACHE = '.git/ddr/metadata_files.json'
+META_FILES_CACHE_VERSION = 2
+# Directories modified this close (seconds) to the time the cache was
+# written may have changed again within the same mtime tick; always relist.
+META_FILES_RACY_WINDOW = 2.0
+
+def _list_dir( path ):
+    """Lists subdirectories and .json files in a directory, like os.walk.
+    
+    Uses scandir when available so entry types come from the directory
+    listing itself; git-annex symlinks and other files are never stat'ed.
+    Without it every non-.json entry is stat'ed; results are the same.
+    Symlinked directories are not listed so they will not be followed.
+    
+    @param path: str Absolute path
+    @returns: dirs,files lists of names
+    """
+    dirs = []
+    files = []
+    if scandir:
+        for entry in scandir(path):
+            if entry.name.endswith('.json'):
+                files.append(entry.name)
+            elif (entry.name != '.git') and entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.name)
+        return dirs,files
+    for name in os.listdir(path):
+        if name.endswith('.json'):
+            files.append(name)
+        elif name != '.git':
+            p = os.path.join(path, name)
+            if os.path.isdir(p) and not os.path.islink(p):
+                dirs.append(name)
+    return dirs,files
+
+def _meta_files_cache_path( basedir ):
+    """Absolute path to find_meta_files cache, or None if basedir isn't a repo.
+    """
+    if os.path.isdir(os.path.join(basedir, '.git')):
+        return os.path.join(basedir, META_FILES_CACHE)
+    return None
+
+def load_meta_files_cache( basedir ):
+    """Loads per-directory listing cache for basedir.
+    
+    @param basedir: str Absolute path
+    @returns: dict {'written': float, 'dirs': {relpath: [mtime, dirs, files]}}
+    """
+    path = _meta_files_cache_path(basedir)
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                data = json.loads(f.read())
+            if data.get('version') == META_FILES_CACHE_VERSION:
+                # JSON gives unicode; keep paths str like os.listdir
+                data['dirs'] = {
+                    rel.encode('utf-8'): [
+                        mtime,
+                        [d.encode('utf-8') for d in dirs],
+                        [f.encode('utf-8') for f in files],
+                    ]
+                    for rel,(mtime,dirs,files) in data['dirs'].iteritems()
+                }
+                return data
+        except (IOError, ValueError):
+            pass
+    return {'written': 0, 'dirs': {}}
+
+def save_meta_files_cache( basedir, dirs ):
+    """Writes per-directory listing cache; fails silently on read-only media.
+    
+    @param basedir: str Absolute path
+    @param dirs: dict {relpath: [mtime, dirs, files]}
+    """
+    path = _meta_files_cache_path(basedir)
+    if not path:
+        return
+    data = {
+        'version': META_FILES_CACHE_VERSION,
+        'written': time.time(),
+        'dirs': dirs,
+    }
+    tmp = '%s.%s' % (path, os.getpid())
+    try:
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(data))
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
+def walk_meta_files( basedir, max_depth=None, force_read=False ):
+    """Yields .json paths under basedir, like os.walk, reusing cached listings.
+    
+    A directory's mtime changes whenever entries are added, removed, or
+    renamed in it, so only directories whose mtime differs from the cache
+    (or is too recent to trust) are listed again; the rest cost one stat.
+    The cache (see META_FILES_CACHE) is updated when the walk finishes.
+    
+    @param basedir: str Absolute path
+    @param max_depth: int Don't descend below this many levels (0: basedir only)
+    @param force_read: boolean Ignore cached listings.
+    @returns: generator of absolute paths, in os.walk order
+    """
+    cache = load_meta_files_cache(basedir)
+    cached = cache['dirs']
+    racy = cache['written'] - META_FILES_RACY_WINDOW
+    if force_read:
+        racy = float('-inf')  # trust nothing
+    dirs = {}
+    pruned = []
+    changed = False
+    stack = [('.', 0)]
+    while stack:
+        rel,depth = stack.pop()
+        path = os.path.normpath(os.path.join(basedir, rel))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            changed = True
+            continue
+        entry = cached.get(rel)
+        if not (entry and (entry[0] == mtime) and (mtime < racy)):
+            entry = [mtime] + list(_list_dir(path))
+            changed = True
+        dirs[rel] = entry
+        for f in entry[2]:
+            yield os.path.join(path, f)
+        subdirs = [os.path.normpath(os.path.join(rel, d)) for d in entry[1]]
+        if (max_depth is not None) and (depth >= max_depth):
+            pruned.extend(subdirs)
+            continue
+        # reversed so directories are visited in listing order
+        stack.extend([(d, depth + 1) for d in reversed(subdirs)])
+    # keep (unvalidated) listings of pruned subtrees for the next walk
+    pruned = set(pruned)
+    if pruned:
+        for rel,entry in cached.iteritems():
+            if (rel not in dirs) and _in_dirs(rel, pruned):
+                dirs[rel] = entry
+    if set(dirs.keys()) != set(cached.keys()):
+        changed = True
+    if changed:
+        save_meta_files_cache(basedir, dirs)
+
+def _in_dirs( rel, dirnames ):
+    """Indicates whether rel is one of dirnames or inside one of them.
+    
+    Checks each of rel's ancestors, so cost depends on depth rather than
+    on the number of dirnames.
+    
+    @param rel: str Relative path
+    @param dirnames: set of relative paths
+    @returns: boolean
+    """
+    while rel and (rel != '.'):
+        if rel in dirnames:
+            return True
+        rel = os.path.dirname(rel)
+    return False
+
+# {model: depth below collection dir of directories holding model's .json}
+_MODEL_DEPTHS = None
+
+def model_depths():
+    """Directory depth of each model's .json files below the collection dir.
+    
+    Derived from identifier.PATH_TEMPLATES and ADDITIONAL_PATHS, e.g.
+    {'collection': 0, 'entity': 2, 'file': 3}.  Empty if the repository
+    model definitions are not available.
+    
+    @returns: dict
+    """
+    global _MODEL_DEPTHS
+    if _MODEL_DEPTHS is None:
+        try:
+            from DDR import identifier  # identifier imports util
+        except Exception:
+            return {}
+        depths = {}
+        for model in identifier.COLLECTION_MODELS:
+            template = identifier.PATH_TEMPLATES.get('%s-rel' % model)
+            jsonfile = identifier.ADDITIONAL_PATHS.get(model, {}).get('json')
+            if (template is None) and (model != 'collection'):
+                continue
+            if not jsonfile:
+                continue
+            depth = len([x for x in (template or '').split('/') if x])
+            # collection.json and entity.json live inside the object's dir,
+            # file .json files next to the binary
+            if '{' in jsonfile:
+                depth = depth - 1
+            depths[model] = depth
+        _MODEL_DEPTHS = depths
+    return _MODEL_DEPTHS
 
 def find_meta_files( basedir, recursive=False, model=None, files_first=False, force_read=False, testing=False ):
     """Lists absolute paths to .json files in basedir; saves copy if requested.
     
     Skips/excludes .git directories.
+    Recursive listings of repositories are cached in META_FILES_CACHE with
+    each directory's mtime; only directories that have changed since the
+    last call are listed again.  See walk_meta_files.
     TODO depth (go down N levels from basedir)
     
     @param basedir: Absolute path
     @param recursive: Whether or not to recurse into subdirectories.
     @param model: list Restrict to the named model ('collection','entity','file').
     @param files_first: If True, list files,entities,collections; otherwise sort.
-    @param force_read: If True, always searches for files instead of using cache.
+    @param force_read: If True, ignore the cache and list every directory.
     @param testing: boolean Allow 'tmp' in paths.
     @returns: list of paths
     """
+    paths = list(iter_meta_files(basedir, recursive, model, force_read, testing))
+    # files_first is useful for docstore.index
+    if files_first:
+        paths = files_first_order(paths)
+    return paths
+
+def files_first_order( paths ):
+    """Reorders metadata paths: files, then entities, then collections.
+    
+    @param paths: list
+    @returns: list
+    """
+    collections = []
+    entities = []
+    files = []
+    for f in paths:
+        if f.endswith('collection.json'): collections.append(f)
+        elif f.endswith('entity.json'): entities.append(f)
+        elif f.endswith('.json'): files.append(f)
+    return files + entities + collections
+
+def iter_meta_files( basedir, recursive=False, model=None, force_read=False, testing=False ):
+    """Generator version of find_meta_files (without files_first).
+    
+    @param basedir: Absolute path
+    @param recursive: Whether or not to recurse into subdirectories.
+    @param model: list Restrict to the named model ('collection','entity','file').
+    @param force_read: If True, ignore the cache and list every directory.
+    @param testing: boolean Allow 'tmp' in paths.
+    @returns: generator of paths
+    """
     def model_exclude(m, p):
         # TODO pass in list of regexes to exclude instead of hard-coding
         exclude = 0
@@ -28,54 +278,149 @@ def find_meta_files( basedir, recursive=False, model=None, files_first=False, fo
             elif (m == 'file') and not (('master' in p.lower()) or ('mezz' in p.lower())):
                 exclude = 1
         return exclude
-    CACHE_FILENAME = '.metadata_files'
-    CACHE_PATH = os.path.join(basedir, CACHE_FILENAME)
-    paths = []
-    if os.path.exists(CACHE_PATH) and not force_read:
-        with open(CACHE_PATH, 'r') as f:
-            paths = [line.strip() for line in f.readlines() if '#' not in line]
+    excludes = ['.git', '*~']
+    if not testing:
+        excludes.append('tmp')
+    if recursive:
+        # Don't descend below the requested model, e.g. into entities'
+        # files/ dirs when listing entities.  Depths are relative to the
+        # collection dir so only prune from there.
+        max_depth = None
+        if model and os.path.exists(os.path.join(basedir, 'collection.json')):
+            max_depth = model_depths().get(model)
+        for path in walk_meta_files(basedir, max_depth, force_read):
+            exclude = [1 for x in excludes if x in path]
+            modexclude = model_exclude(model, path)
+            if not (exclude or modexclude):
+                yield path
     else:
-        excludes = ['.git', '*~']
-        if not testing:
-            excludes.append('tmp')
-        if recursive:
-            for root, dirs, files in os.walk(basedir):
-                # don't go down into .git directory
-                if '.git' in dirs:
-                    dirs.remove('.git')
-                for f in files:
-                    if f.endswith('.json'):
-                        path = os.path.join(root, f)
-                        exclude = [1 for x in excludes if x in path]
-                        modexclude = model_exclude(model, path)
-                        if not (exclude or modexclude):
-                            paths.append(path)
-        else:
-            for f in os.listdir(basedir):
-                if f.endswith('.json'):
-                    path = os.path.join(basedir, f)
-                    exclude = [1 for x in excludes if x in path]
-                    if not exclude:
-                        paths.append(path)
-    # files_first is useful for docstore.index
-    if files_first:
-        collections = []
-        entities = []
-        files = []
-        for f in paths:
-            if f.endswith('collection.json'): collections.append(f)
-            elif f.endswith('entity.json'): entities.append(f)
-            elif f.endswith('.json'): files.append(f)
-        paths = files + entities + collections
-    return paths
+        for f in os.listdir(basedir):
+            if f.endswith('.json'):
+                path = os.path.join(basedir, f)
+                exclude = [1 for x in excludes if x in path]
+                if not exclude:
+                    yield path
+
+def meta_file_model( path ):
+    """Guesses model of a metadata file from its name.
+    
+    @param path: str
+    @returns: str 'repository', 'organization', 'collection', 'entity', or 'file'
+    """
+    basename = os.path.basename(path)
+    for model in ['collection', 'entity', 'organization', 'repository']:
+        if basename == '%s.json' % model:
+            return model
+    return 'file'
+
+def repo_dirs( path ):
+    """Lists Git repository directories directly inside path.
+    
+    @param path: str Absolute path e.g. to a Store
+    @returns: list of absolute paths, sorted
+    """
+    return sorted([
+        os.path.join(path, d)
+        for d in os.listdir(path)
+        if os.path.isdir(os.path.join(path, d, '.git'))
+    ])
+
+# discover_meta_files: worker threads and max results waiting to be consumed
+DISCOVER_THREADS = 8
+DISCOVER_QUEUE_SIZE = 10000
+
+def discover_meta_files( paths, model=None, threads=DISCOVER_THREADS, force_read=False, testing=False ):
+    """Finds metadata files in many repositories at once.
+    
+    Repositories are walked concurrently by a bounded pool of threads
+    (walking is I/O-bound, so threads keep the disk queue full) using
+    iter_meta_files, so each repository's listing cache is used.  Results
+    are yielded as soon as they are found, in no particular order.
+    
+    >>> for cid,path,model in discover_meta_files('/var/www/media/ddr', model='entity'):
+    ...     print cid,path
+    
+    @param paths: str Absolute path to a Store, or list of repository paths.
+    @param model: str Restrict to the named model ('collection','entity','file').
+    @param threads: int Number of repositories walked at once.
+    @param force_read: If True, ignore the caches and list every directory.
+    @param testing: boolean Allow 'tmp' in paths.
+    @returns: generator of (collection_id, path, model) tuples
+    """
+    if isinstance(paths, basestring):
+        paths = repo_dirs(paths)
+    todo = Queue.Queue()
+    for path in paths:
+        todo.put(path)
+    results = Queue.Queue(DISCOVER_QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except Queue.Full:
+                pass
+    
+    def worker():
+        try:
+            while not stop.is_set():
+                try:
+                    repo_path = todo.get_nowait()
+                except Queue.Empty:
+                    break
+                cid = os.path.basename(os.path.normpath(repo_path))
+                for path in iter_meta_files(
+                        repo_path, recursive=True, model=model,
+                        force_read=force_read, testing=testing):
+                    if stop.is_set():
+                        break
+                    put((cid, path, meta_file_model(path)))
+        except Exception as err:
+            put(err)
+        finally:
+            put(done)
+    
+    workers = [
+        threading.Thread(target=worker)
+        for n in range(max(1, min(threads, len(paths))))
+    ]
+    for t in workers:
+        t.daemon = True
+        t.start()
+    try:
+        running = len(workers)
+        while running:
+            item = results.get()
+            if item is done:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        for t in workers:
+            t.join()
+
+def natural_sort_key( text ):
+    """Key for sorting strings in the way that humans expect.
+    
+    >>> natural_sort_key('ddr-test-123-10')
+    ('ddr-test-', 123, '-', 10, '')
+    """
+    return tuple(
+        int(c) if c.isdigit() else c
+        for c in re.split('([0-9]+)', text)
+    )
 
 def natural_sort( l ):
     """Sort the given list in the way that humans expect.
     src: http://www.codinghorror.com/blog/2007/12/sorting-for-humans-natural-sort-order.html
     """
-    convert = lambda text: int(text) if text.isdigit() else text
-    alphanum_key = lambda key: [ convert(c) for c in re.split('([0-9]+)', key) ]
-    l.sort( key=alphanum_key )
+    l.sort( key=natural_sort_key )
     return l
 
 def natural_order_string( id ):
@@ -88,22 +433,279 @@ def natural_order_string( id ):
         raise Exception('Valid DDR ID required.')
     return alnum.pop()
 
-def file_hash(path, algo='sha1'):
-    if algo == 'sha256':
-        h = hashlib.sha256()
-    elif algo == 'md5':
-        h = hashlib.md5()
-    else:
-        h = hashlib.sha1()
-    block_size=1024
-    f = open(path, 'rb')
-    while True:
-        data = f.read(block_size)
-        if not data:
-            break
-        h.update(data)
-    f.close()
-    return h.hexdigest()
+# Hash algorithms used for binaries, and bytes read per system call
+HASH_ALGORITHMS = ['md5', 'sha1', 'sha256']
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# one reusable read buffer per thread
+_HASH_BUFFERS = threading.local()
+
+def _hash_buffer(size):
+    buf = getattr(_HASH_BUFFERS, 'buf', None)
+    if (buf is None) or (len(buf) != size):
+        buf = _HASH_BUFFERS.buf = bytearray(size)
+    return buf
+
+def file_hashes(path, algos=HASH_ALGORITHMS, buffer_size=HASH_BUFFER_SIZE, verify=False, repo_path=None):
+    """Calculates several hash digests of a file in a single pass.
+    
+    The file is read with readinto() into a preallocated buffer, so a
+    large file costs one read per buffer_size bytes and no copies.
+    If repo_path is given, digests of files inside it are remembered in
+    its checksum cache (see CHECKSUM_CACHE) and the file is not read
+    again until its inode, size, or mtime change.
+    
+    >>> file_hashes('/tmp/hash', ['md5','sha1'])
+    {'md5': '0800fc577294c34e0b28ad2839435945', 'sha1': '2346ad27d7568ba9896f1b7da6b5991251debdf2'}
+    
+    @param path: str Absolute path
+    @param algos: list Names of hashlib algorithms
+    @param buffer_size: int Bytes per read
+    @param verify: boolean Always read the file (and refresh the cache).
+    @param repo_path: str (optional) Absolute path to the collection repository.
+    @returns: dict {algo: hexdigest}
+    """
+    cached = None
+    if repo_path and CHECKSUM_CACHE and set(algos).issubset(HASH_ALGORITHMS):
+        cached = _cached_checksums(path, algos, repo_path, verify)
+        if cached and cached[0]:
+            return cached[0]
+    hashes = _file_hashes(path, HASH_ALGORITHMS if cached else algos, buffer_size)
+    if cached:
+        _store_checksums(cached[1], cached[2], hashes)
+    return {algo: hashes[algo] for algo in algos}
+
+def _file_hashes(path, algos, buffer_size):
+    hashes = [(algo, hashlib.new(algo)) for algo in algos]
+    buf = _hash_buffer(buffer_size)
+    view = memoryview(buf)
+    with io.open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            chunk = view[:n]
+            for algo,h in hashes:
+                h.update(chunk)
+    return {algo: h.hexdigest() for algo,h in hashes}
+
+def file_hash(path, algo='sha1', verify=False, repo_path=None):
+    if algo not in ['sha256', 'md5']:
+        algo = 'sha1'
+    return file_hashes(path, [algo], verify=verify, repo_path=repo_path)[algo]
+
+# hash_files: concurrent reads per physical device (1 keeps a spinning
+# disk from seeking back and forth), and max threads overall
+HASH_THREADS_PER_DEVICE = 1
+HASH_MAX_THREADS = 8
+
+def hash_files(paths, algos=HASH_ALGORITHMS, threads_per_device=HASH_THREADS_PER_DEVICE, max_threads=HASH_MAX_THREADS, verify=False, callback=None, repo_path=None):
+    """Hashes many files concurrently, scheduled by device.
+    
+    Files are grouped by the device they live on and each device gets its
+    own worker thread(s), so separate disks are read in parallel while no
+    single disk gets competing readers.  Each device's files are read in
+    inode order, roughly their order on disk.  hashlib releases the GIL
+    while hashing large buffers, so threads also use several CPUs.
+    
+    callback(info) is called after each file with a dict: path, files,
+    total_files, bytes, total_bytes, bytes_per_second.  If it raises,
+    hashing stops and the exception is re-raised.  Every other problem
+    with a file is reported in errors.
+    
+    >>> hashes,errors = hash_files(paths, ['sha256'], callback=print_progress)
+    
+    @param paths: list of absolute paths
+    @param algos: list Names of hashlib algorithms
+    @param threads_per_device: int
+    @param max_threads: int
+    @param verify: boolean Ignore the checksum cache (see file_hashes)
+    @param callback: function (optional)
+    @param repo_path: str (optional) Use this repository's checksum cache.
+    @returns: hashes,errors: OrderedDict {path: {algo: hexdigest}} in order
+        of paths (minus errors); list of (path, message)
+    """
+    devices = OrderedDict()
+    errors = []
+    total_bytes = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError as err:
+            errors.append((path, str(err)))
+            continue
+        devices.setdefault(st.st_dev, []).append((st.st_ino, st.st_size, path))
+        total_bytes += st.st_size
+    queues = []
+    for dev,files in devices.iteritems():
+        files.sort()
+        q = Queue.Queue()
+        for f in files:
+            q.put(f)
+        queues.extend([q] * threads_per_device)
+    
+    results = {}
+    lock = threading.Lock()
+    progress = {'files': 0, 'bytes': 0}
+    total_files = sum([len(files) for files in devices.itervalues()])
+    started = time.time()
+    
+    failed = []  # exc_info from callback
+    
+    def worker(q):
+        while not failed:
+            try:
+                ino,size,path = q.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                hashes = file_hashes(path, algos, verify=verify, repo_path=repo_path)
+                error = None
+            except Exception as err:
+                # whatever happened, the file must not silently go missing
+                hashes = None
+                error = str(err) or err.__class__.__name__
+            with lock:
+                if error:
+                    errors.append((path, error))
+                else:
+                    results[path] = hashes
+                progress['files'] += 1
+                progress['bytes'] += size
+                info = {
+                    'path': path,
+                    'files': progress['files'],
+                    'total_files': total_files,
+                    'bytes': progress['bytes'],
+                    'total_bytes': total_bytes,
+                    'bytes_per_second': progress['bytes'] / max(time.time() - started, 0.001),
+                }
+                if callback and not failed:
+                    try:
+                        callback(info)
+                    except Exception:
+                        failed.append(sys.exc_info())
+    
+    # no more threads than max_threads: threads beyond that share queues
+    # round-robin so every device still gets read
+    threads = [
+        threading.Thread(target=_hash_worker_loop, args=(worker, queues[n::max_threads]))
+        for n in range(min(len(queues), max_threads))
+    ]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    if failed:
+        raise failed[0][0], failed[0][1], failed[0][2]
+    hashes = OrderedDict([
+        (path, results[path]) for path in paths if path in results
+    ])
+    return hashes,errors
+
+def _hash_worker_loop(worker, queues):
+    for q in queues:
+        worker(q)
+
+# Checksums of files in a collection repository, keyed by device, inode,
+# size, and mtime, in an SQLite database inside the repo's .git.  Used only
+# when callers pass repo_path.  Set CHECKSUM_CACHE to False to always read
+# files.
+CHECKSUM_CACHE = True
+CHECKSUM_CACHE_PATH = '.git/ddr/checksums.sqlite3'
+# Files modified this recently (seconds) might change again within the
+# same mtime tick; don't cache them.
+CHECKSUM_CACHE_RACY_WINDOW = 2.0
+_CHECKSUM_SCHEMA = """CREATE TABLE IF NOT EXISTS checksums (
+    dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,
+    path TEXT, md5 TEXT, sha1 TEXT, sha256 TEXT,
+    PRIMARY KEY (dev, ino, size, mtime_ns)
+)"""
+_CHECKSUM_CONNECTIONS = threading.local()
+_CHECKSUM_STATS = {'hits': 0, 'misses': 0, 'errors': 0}
+_CHECKSUM_LOCK = threading.Lock()
+
+def checksum_cache_stats():
+    """Hit/miss counts for the checksum cache since the process started.
+    
+    @returns: dict {'hits', 'misses', 'errors'}
+    """
+    return dict(_CHECKSUM_STATS)
+
+def _checksum_count(key):
+    with _CHECKSUM_LOCK:
+        _CHECKSUM_STATS[key] += 1
+
+def _checksum_db_path(path, repo_path):
+    """Checksum cache database for repo_path, if path is inside it.
+    """
+    repo_path = os.path.abspath(repo_path)
+    if not os.path.abspath(path).startswith(repo_path + os.sep):
+        return None
+    if not os.path.isdir(os.path.join(repo_path, '.git')):
+        return None
+    return os.path.join(repo_path, CHECKSUM_CACHE_PATH)
+
+def _checksum_db(db_path):
+    """SQLite connection to checksum cache (one per thread per database).
+    """
+    connections = getattr(_CHECKSUM_CONNECTIONS, 'connections', None)
+    if connections is None:
+        connections = _CHECKSUM_CONNECTIONS.connections = {}
+    if db_path not in connections:
+        if not os.path.exists(os.path.dirname(db_path)):
+            os.makedirs(os.path.dirname(db_path))
+        db = sqlite3.connect(db_path, timeout=30)
+        db.execute(_CHECKSUM_SCHEMA)
+        db.commit()
+        connections[db_path] = db
+    return connections[db_path]
+
+def _cached_checksums(path, algos, repo_path, verify=False):
+    """Looks up file's checksums in its repository's cache.
+    
+    @param path: str
+    @param algos: list
+    @param repo_path: str
+    @param verify: boolean Skip lookup (but still return db,key for storing)
+    @returns: None if uncacheable, else (hashes or None, db_path, key)
+    """
+    db_path = _checksum_db_path(path, repo_path)
+    if not db_path:
+        return None
+    st = os.stat(path)
+    if time.time() - st.st_mtime < CHECKSUM_CACHE_RACY_WINDOW:
+        return None
+    key = (st.st_dev, st.st_ino, st.st_size, int(st.st_mtime * 1000000000), path)
+    if verify:
+        return None,db_path,key
+    try:
+        row = _checksum_db(db_path).execute(
+            'SELECT md5, sha1, sha256 FROM checksums'
+            ' WHERE dev=? AND ino=? AND size=? AND mtime_ns=?',
+            key[:4]
+        ).fetchone()
+    except (sqlite3.Error, OSError):
+        _checksum_count('errors')
+        return None
+    if row:
+        _checksum_count('hits')
+        hashes = dict(zip(HASH_ALGORITHMS, row))
+        return {algo: str(hashes[algo]) for algo in algos},db_path,key
+    _checksum_count('misses')
+    return None,db_path,key
+
+def _store_checksums(db_path, key, hashes):
+    try:
+        db = _checksum_db(db_path)
+        db.execute(
+            'INSERT OR REPLACE INTO checksums VALUES (?,?,?,?,?,?,?,?)',
+            key + tuple([hashes[algo] for algo in HASH_ALGORITHMS])
+        )
+        db.commit()
+    except (sqlite3.Error, OSError):
+        _checksum_count('errors')
 
 def normalize_text(text):
     """Strip text, convert line endings, etc.
@@ -136,3 +738,69 @@ def normalize_text(text):
     if isinstance(text, basestring):
         return process(text)
     return text
+
+
+class LRUCache(object):
+    """Thread-safe dict that forgets its least-recently-used items.
+    
+    >>> c = LRUCache(2)
+    >>> c.set('a', 1); c.set('b', 2); c.get('a'); c.set('c', 3)
+    1
+    >>> c.get('b')
+    >>> c.stats()['hits'], c.stats()['misses']
+    (1, 1)
+    """
+    
+    def __init__( self, maxsize=128 ):
+        """
+        @param maxsize: int Maximum number of items; 0 disables the cache.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__( self ):
+        return len(self._data)
+    
+    def __contains__( self, key ):
+        return key in self._data
+    
+    def get( self, key, default=None ):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+    
+    def set( self, key, value ):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop( self, key, default=None ):
+        with self._lock:
+            return self._data.pop(key, default)
+    
+    def clear( self ):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats( self ):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+#
+# bench_add_ids.py
+#
+
+description = """Time identifier.max_id, add_ids, and available against a large collection."""
+
+epilog = """
+Makes a collection of N existing entity Identifiers (with a few gaps) and
+times allocating a block of new IDs, with and without skip_taken.
+
+    python benchmarks/bench_add_ids.py
+    python benchmarks/bench_add_ids.py -e 100000 -n 5000
+
+---"""
+
+import argparse
+import random
+import time
+
+from DDR import identifier
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    print('%-32s %8.2f ms' % (label, (time.time() - start) * 1000))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('-e', '--existing', type=int, default=100000, help='Number of existing IDs.')
+    parser.add_argument('-n', '--num', type=int, default=10000, help='Number of new IDs.')
+    parser.add_argument('-g', '--gaps', type=float, default=0.05, help='Fraction of IDs missing.')
+    args = parser.parse_args()
+    
+    random.seed(0)
+    numbers = [
+        n for n in xrange(1, int(args.existing * (1 + args.gaps)) + 1)
+        if random.random() > args.gaps
+    ]
+    identifiers = identifier.batch_identifiers(
+        identifier.parse_batch(
+            ['ddr-testing-123-%s' % n for n in numbers], method='id'
+        ),
+        method='id'
+    )
+    print('%s existing IDs, %s new' % (len(identifiers), args.num))
+    
+    timed('max_id', identifier.max_id, 'entity', identifiers)
+    timed('add_ids', identifier.add_ids, args.num, 'entity', identifiers)
+    timed('add_ids startwith=1',
+          identifier.add_ids, args.num, 'entity', identifiers, startwith=1)
+    timed('add_ids startwith=1 skip_taken',
+          identifier.add_ids, args.num, 'entity', identifiers, startwith=1, skip_taken=True)
+    timed('id_gaps',
+          identifier.id_gaps, identifier._id_numbers('entity', identifiers))
+    timed('available',
+          identifier.available, numbers, range(1, args.num + 1))
+
+
+if __name__ == '__main__':
+    main()
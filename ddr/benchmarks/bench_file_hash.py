@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+#
+# bench_file_hash.py
+#
+
+description = """Throughput of util.file_hashes vs. one util.file_hash pass per algorithm."""
+
+epilog = """
+Writes a file of random data (or uses the given file) and computes md5,
+sha1, and sha256 of it two ways: three passes in 1 KB reads (the old
+util.file_hash), and a single util.file_hashes pass.
+
+    python benchmarks/bench_file_hash.py
+    python benchmarks/bench_file_hash.py -s 1024
+    python benchmarks/bench_file_hash.py -f /PATH/TO/master.tif
+
+---"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from DDR import util
+
+ALGORITHMS = ['md5', 'sha1', 'sha256']
+
+
+def file_hash_1k(path, algo='sha1'):
+    """util.file_hash as it was: one algorithm per pass, 1 KB reads.
+    """
+    h = hashlib.new(algo)
+    block_size=1024
+    f = open(path, 'rb')
+    while True:
+        data = f.read(block_size)
+        if not data:
+            break
+        h.update(data)
+    f.close()
+    return h.hexdigest()
+
+def timed(label, size, func):
+    start = time.time()
+    result = func()
+    elapsed = time.time() - start
+    print('%-28s %7.2fs  %7.1f MB/s' % (label, elapsed, size / elapsed / 1024 / 1024))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('-f', '--file', help='Hash this file instead of a temporary one.')
+    parser.add_argument('-s', '--size', type=int, default=256, help='Size of temporary file in MB.')
+    parser.add_argument('-b', '--buffer', type=int, default=util.HASH_BUFFER_SIZE, help='file_hashes buffer size.')
+    args = parser.parse_args()
+    
+    path = args.file
+    if not path:
+        fd,path = tempfile.mkstemp(prefix='bench_file_hash-')
+        with os.fdopen(fd, 'wb') as f:
+            for n in range(args.size):
+                f.write(os.urandom(1024 * 1024))
+    size = os.path.getsize(path)
+    try:
+        print('%s (%.1f MB)' % (path, size / 1024.0 / 1024))
+        old = timed('file_hash x3 (1 KB reads)', size, lambda: {
+            algo: file_hash_1k(path, algo) for algo in ALGORITHMS
+        })
+        new = timed('file_hashes (%s KB reads)' % (args.buffer / 1024), size, lambda:
+            util.file_hashes(path, ALGORITHMS, args.buffer)
+        )
+        assert old == new
+    finally:
+        if not args.file:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
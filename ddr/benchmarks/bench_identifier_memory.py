@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+#
+# bench_identifier_memory.py
+#
+
+description = """Memory used by Identifiers compared with the old dict-based layout."""
+
+epilog = """
+Builds N entity Identifiers in a child process and reports the growth in
+peak resident memory, then does the same for objects laid out the way
+Identifier used to be (instance __dict__ plus an OrderedDict of parts).
+The parse cache is disabled so every Identifier is built from scratch.
+
+    python benchmarks/bench_identifier_memory.py
+    python benchmarks/bench_identifier_memory.py -n 300000
+
+---"""
+
+import argparse
+from collections import OrderedDict
+import multiprocessing
+import resource
+import time
+
+from DDR import identifier
+
+
+class DictIdentifier(object):
+    """Identifier attributes stored the way they were before __slots__.
+    """
+    def __init__(self, i):
+        self.raw = i.raw
+        self.method = i.method
+        self.model = i.model
+        self.parts = OrderedDict(i.parts)
+        self.basepath = i.basepath
+        self.id = i.id
+
+def maxrss():
+    """Peak resident set size of this process in KB (Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def object_ids(num):
+    """Synthetic entity IDs, 1000 entities per collection.
+    """
+    template = identifier.ID_TEMPLATES['entity']
+    return [
+        template.format(repo='ddr', org='densho', cid=n / 1000 + 1, eid=n % 1000 + 1)
+        for n in xrange(num)
+    ]
+
+def build(layout, ids, base_path, queue):
+    before = maxrss()
+    start = time.time()
+    if layout == 'dict':
+        objects = [
+            DictIdentifier(identifier.Identifier(id=oid, base_path=base_path))
+            for oid in ids
+        ]
+    else:
+        objects = [
+            identifier.Identifier(id=oid, base_path=base_path)
+            for oid in ids
+        ]
+    queue.put((maxrss() - before, time.time() - start, len(objects)))
+
+def measure(layout, ids, base_path):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=build, args=(layout, ids, base_path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('-n', '--num', type=int, default=300000, help='Number of Identifiers.')
+    parser.add_argument('-b', '--basepath', default='/var/www/media/ddr', help='Base path.')
+    args = parser.parse_args()
+    
+    identifier.configure_parse_cache(0)
+    ids = object_ids(args.num)
+    print('%s Identifiers' % args.num)
+    results = {}
+    for layout in ['dict', 'slots']:
+        kb,elapsed,num = measure(layout, ids, args.basepath)
+        results[layout] = kb
+        print('%-6s %8.1f MB  %5d bytes/object  %.2fs' % (
+            layout, kb / 1024.0, kb * 1024 / num, elapsed
+        ))
+    if results['slots']:
+        print('ratio  %.2fx' % (float(results['dict']) / results['slots']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+#
+# bench_identify_object.py
+#
+
+description = """Compare identify_object's combined-regex dispatcher with the per-pattern loop."""
+
+epilog = """
+Builds synthetic IDs, paths, and URLs for every model from the templates
+in repo_models.identifier, checks that both methods return identical
+results, then times each method over the same texts.
+
+    python benchmarks/bench_identify_object.py
+    python benchmarks/bench_identify_object.py -n 100000
+
+---"""
+
+import argparse
+import random
+import sys
+import time
+
+from DDR import identifier
+
+
+def field_value(name):
+    """Plausible value for an ID template field.
+    
+    @param name: str Template field name
+    @returns: str
+    """
+    if name == 'basepath':
+        return '/var/www/media/ddr'
+    if identifier.VALID_COMPONENTS.get(name):
+        return random.choice(identifier.VALID_COMPONENTS[name])
+    if name == 'sha1':
+        return '%010x' % random.getrandbits(40)
+    if name == 'ext':
+        return 'jpg'
+    if name in ['repo', 'org']:
+        return random.choice(['ddr', 'densho', 'testing'])
+    return str(random.randint(1, 9999))
+
+def fill(template):
+    return template.format(**{
+        name: field_value(name)
+        for name in identifier._field_names(template)
+    })
+
+def synthetic_texts(num):
+    """Generate num texts for each of ID_PATTERNS, PATH_PATTERNS, URL_PATTERNS.
+    
+    @param num: int Total number of texts
+    @returns: list of (text, patterns) tuples
+    """
+    templates = [
+        (template, identifier.ID_PATTERNS)
+        for template in identifier.ID_TEMPLATES.itervalues()
+    ] + [
+        (template, identifier.PATH_PATTERNS)
+        for key,template in identifier.PATH_TEMPLATES.iteritems()
+        if key.endswith('-abs')
+    ] + [
+        (template, identifier.URL_PATTERNS)
+        for models in identifier.URL_TEMPLATES.itervalues()
+        for template in models.itervalues()
+    ]
+    return [
+        (fill(template), patterns)
+        for template,patterns in [
+            random.choice(templates) for n in xrange(num)
+        ]
+    ]
+
+def timed(func, texts):
+    start = time.time()
+    for text,patterns in texts:
+        func(text, patterns)
+    return time.time() - start
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('-n', '--num', type=int, default=1000000, help='Number of texts.')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Random seed.')
+    args = parser.parse_args()
+    
+    random.seed(args.seed)
+    texts = synthetic_texts(args.num)
+    
+    mismatches = [
+        text for text,patterns in texts[:10000]
+        if identifier.identify_object(text, patterns) \
+        != identifier._identify_object_loop(text, patterns)
+    ]
+    if mismatches:
+        print('Results differ for %s texts, e.g. %s' % (len(mismatches), mismatches[0]))
+        sys.exit(1)
+    
+    models = len(identifier.MODELS)
+    patterns = sum([
+        len(p) for p in [
+            identifier.ID_PATTERNS, identifier.PATH_PATTERNS, identifier.URL_PATTERNS
+        ]
+    ])
+    print('%s texts, %s models, %s patterns' % (len(texts), models, patterns))
+    loop = timed(identifier._identify_object_loop, texts)
+    print('loop:       %.2fs  %.2f us/text' % (loop, loop / len(texts) * 1000000))
+    dispatch = timed(identifier.identify_object, texts)
+    print('dispatcher: %.2fs  %.2f us/text' % (dispatch, dispatch / len(texts) * 1000000))
+    print('speedup:    %.2fx' % (loop / dispatch))
+
+
+if __name__ == '__main__':
+    main()